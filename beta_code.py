@@ -0,0 +1,271 @@
+"""
+Use beta2unicode to convert Greek in the CATSS variant of Beta Code to
+Unicode, and beta2unicode_batch to convert many strings at once.
+
+Letters are written as capitals, preceded by * for upper case, and are
+followed by their diacritics: breathing ) (, accents / \\ =, diaeresis +
+and iota subscript |. A / after one of BGDVZQK is a prime, i.e. the
+numeral sign.
+
+The conversion is done in a single left-to-right scan, looking up the
+longest Beta Code sequence at every position in a table of precomposed
+characters. The table is built from the Unicode character names and
+reproduces the conversion of greekutils.beta2unicode followed by the
+prime and final sigma substitutions which the pipeline used to apply;
+run this module to verify this on the corpus.
+"""
+
+import unicodedata
+from pathlib import Path
+
+# Beta Code letters and their Unicode names
+letters = {
+    'A': 'ALPHA',
+    'B': 'BETA',
+    'G': 'GAMMA',
+    'D': 'DELTA',
+    'E': 'EPSILON',
+    'V': 'STIGMA',
+    'Z': 'ZETA',
+    'H': 'ETA',
+    'Q': 'THETA',
+    'I': 'IOTA',
+    'K': 'KAPPA',
+    'L': 'LAMDA',
+    'M': 'MU',
+    'N': 'NU',
+    'C': 'XI',
+    'O': 'OMICRON',
+    'P': 'PI',
+    'R': 'RHO',
+    'S': 'SIGMA',
+    'T': 'TAU',
+    'U': 'UPSILON',
+    'F': 'PHI',
+    'X': 'CHI',
+    'Y': 'PSI',
+    'W': 'OMEGA',
+}
+
+# diacritics, grouped in the order of the Unicode names; the iota
+# subscript is named PROSGEGRAMMENI on capitals
+breathings = {')': 'PSILI', '(': 'DASIA'}
+diaereses = {'+': 'DIALYTIKA'}
+accents = {'/': 'OXIA', '\\': 'VARIA', '=': 'PERISPOMENI'}
+iotas = {'|': 'YPOGEGRAMMENI'}
+
+# characters which are kept as they are
+punctuation = "0123456789 .,':;_[]~-&@$"
+
+# as in greekutils, a sigma before a space or newline is final and
+# swallows it; before other punctuation it is final and the punctuation kept
+final_sigmas = {
+    'S\n': 'ς',
+    'S ': 'ς',
+    'S,': 'ς,',
+    'S.': 'ς.',
+    'S:': 'ς:',
+    'S;': 'ς;',
+    'S]': 'ς]',
+    'S@': 'ς@',
+    'S_': 'ς_',
+}
+
+# a / after these letters is a prime
+prime_letters = set('BGDVZQK')
+numeral_sign = 'ʹ'
+
+def permutations(chars):
+    """Return all orderings of a string of diacritics."""
+    if len(chars) <= 1:
+        return [chars]
+    return [
+        c + rest for i, c in enumerate(chars)
+            for rest in permutations(chars[:i] + chars[i+1:])
+    ]
+
+def lookup(name):
+    try:
+        return unicodedata.lookup(name)
+    except KeyError:
+        return None
+
+def build_table():
+    """Build the table of Beta Code sequences to Unicode characters.
+
+    Every letter is combined with every group of diacritics for which
+    Unicode has a precomposed character. The diacritics may be given in
+    any order; on capitals they may precede or follow the letter.
+    """
+    table = {c: c for c in punctuation}
+    table.update(final_sigmas)
+    table['#'] = numeral_sign
+    table['(null)'] = '(null)'
+
+    combinations = [('', [])]
+    for group in (breathings, diaereses, accents, iotas):
+        combinations += [
+            (marks + mark, names + [name]) for marks, names in combinations
+                for mark, name in group.items()
+        ]
+
+    for beta, name in letters.items():
+        for marks, names in combinations:
+            small = f'GREEK SMALL LETTER {name}'
+            capital = f'GREEK CAPITAL LETTER {name}'
+            if names:
+                small += ' WITH ' + ' AND '.join(names)
+                capital += ' WITH ' + ' AND '.join(names).replace('YPOGEGRAMMENI', 'PROSGEGRAMMENI')
+            elif beta == 'V':
+                capital = f'GREEK LETTER {name}'
+
+            if char := lookup(small):
+                for order in permutations(marks):
+                    table[beta + order] = char
+
+            if char := lookup(capital):
+                for order in permutations(marks):
+                    table['*' + beta + order] = char
+                    table['*' + order + beta] = char
+                    table[order + '*' + beta] = char
+    return table
+
+table = build_table()
+
+# all beginnings of the sequences in the table, to know when to stop looking
+prefixes = {key[:i] for key in table for i in range(1, len(key)+1)}
+
+# characters which never begin a longer sequence
+singles = {
+    c: table[c] for c in table
+        if len(c) == 1 and not any(len(k) > 1 and k[0] == c for k in table)
+}
+
+def beta2unicode(string, primes=True):
+    """Convert CATSS Beta Code to Unicode Greek.
+
+    Args:
+        string: Beta Code string
+        primes: convert a / after one of BGDVZQK to the numeral sign;
+            without it such a / cannot be converted, as in greekutils
+
+    Raises:
+        KeyError if part of the string cannot be converted
+    """
+    output = []
+    i = 0
+    n = len(string)
+    while i < n:
+        char = string[i]
+
+        # fast path for characters which are complete by themselves
+        if char in singles:
+            output.append(singles[char])
+            i += 1
+            continue
+
+        # a / after certain consonants is a prime
+        if primes and char == '/' and i and string[i-1] in prime_letters:
+            output.append(numeral_sign)
+            i += 1
+            continue
+
+        # find the longest sequence in the table
+        end = 0
+        j = i
+        while j < n and string[i:j+1] in prefixes:
+            j += 1
+            if string[i:j] in table:
+                end = j
+        if not end:
+            raise KeyError(
+                f'attempted to convert {string} but could only convert '
+                f'{string[:i]} to {"".join(output)} leaving {string[i:]}'
+            )
+
+        value = table[string[i:end]]
+
+        # a sigma at the end of the string or before whitespace is final
+        if value == 'σ' and (end == n or string[end].isspace()):
+            value = 'ς'
+
+        output.append(value)
+        i = end
+
+    return ''.join(output)
+
+def beta2unicode_batch(strings):
+    """Convert a sequence of Beta Code strings, converting each distinct string once.
+
+    Returns:
+        list of the converted strings
+    """
+    converted = {}
+    output = []
+    for string in strings:
+        if string not in converted:
+            converted[string] = beta2unicode(string)
+        output.append(converted[string])
+    return output
+
+def corpus_strings(data_dir='source/patched'):
+    """Collect the distinct Greek words of the patched parallel and morphology files."""
+    from regex_patterns import gchars, ref_string
+    import regex
+    word = regex.compile(f'[{gchars}]+')
+    strings = set()
+    for file in Path(data_dir).glob('*.par'):
+        for line in file.read_text().split('\n'):
+            if '\t' in line and not ref_string.match(line):
+                strings.update(word.findall(line.split('\t', 1)[1]))
+    for file in Path(data_dir).glob('*.mlxx'):
+        for line in file.read_text().split('\n'):
+            line_data = line.split()
+            if len(line_data) > 2:
+                strings.add(line_data[0])
+    return strings
+
+def verify(strings):
+    """Compare the conversion with the greekutils based conversion.
+
+    greekutils (pip install greek-utils==0.2) is only needed here.
+
+    Strings which greekutils cannot convert are skipped, since the
+    table of beta2unicode also covers combinations which greekutils lacks.
+
+    Returns:
+        list of (string, expected, converted) for every difference
+    """
+    import regex
+    from greekutils import beta2unicode as greekutils_b2u
+
+    prime_re = regex.compile(r"(?<=[BGDVZQK])/")
+    final_re = regex.compile(r'σ(?=\s|$)')
+
+    def convert(function, string):
+        try:
+            return function(string)
+        except KeyError:
+            return None
+
+    def expected(string):
+        converted = greekutils_b2u.convert(prime_re.sub('#', string))
+        return final_re.sub('ς', converted)
+
+    differences = []
+    for string in strings:
+        old = convert(expected, string)
+        new = convert(beta2unicode, string)
+        if old is not None and old != new:
+            differences.append((string, old, new))
+    return differences
+
+if __name__ == '__main__':
+    strings = corpus_strings()
+    print(f'verifying the conversion of {len(strings)} strings...')
+    differences = verify(strings)
+    for string, old, new in differences:
+        print(f'\t{string}: expected {old}, got {new}')
+    if differences:
+        raise Exception(f'{len(differences)} strings are converted differently!')
+    print('all strings match')
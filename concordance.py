@@ -0,0 +1,347 @@
+"""
+Use build_concordances to index the JSON exports for concordance
+queries, and the lookup, kwic and counts methods of the returned
+Concordance objects to query them.
+
+A concordance is built for each of the following layers:
+    greek       Greek column of the parallel files
+    hebrew      Hebrew column of the parallel files
+    surface     Greek words of the morphology files
+    lexeme      lexemes of the morphology files
+
+The tokens of a layer are interned as integer ids and a suffix array is
+built over the sequence of ids. Ids are assigned in the sorted order of
+the tokens, so that all tokens beginning with a prefix form a range of
+ids. An exact phrase or a phrase whose last word is a prefix can thus be
+looked up with two binary searches over the suffix array, i.e. in
+O(m log n) for a phrase of m words. Books are separated by id 0, so
+that phrases never run across two books.
+
+Every token also has a folded search key, e.g. Greek without accents,
+breathings and iota subscript, or Hebrew without final letters; see the
+fold functions in transcription.py. The keys are computed once per
+distinct token when the index is built and interned as ids next to the
+ids of the tokens, with a second suffix array over the folded ids, so that
+a folded lookup (folded=True) is as fast as an exact one.
+
+Use save_concordances and load_concordances to persist the indexes.
+"""
+
+import sys
+import json
+import collections
+from array import array
+from pathlib import Path
+import transcription
+from transcription import fold_greek, fold_hebrew, fold_beta
+
+# id separating the books in the token sequences
+separator = 0
+
+# search key of the tokens of every layer; lexemes are in Beta Code
+layer_folds = {
+    'greek': fold_greek,
+    'hebrew': fold_hebrew,
+    'surface': fold_greek,
+    'lexeme': fold_beta,
+}
+
+def verse_tokens(json_dir='JSON'):
+    """Collect the tokens of every verse of every layer from the JSON exports.
+
+    Returns:
+        dict of layer to a list of (ref, tokens) in the order of the exports
+    """
+    layers = collections.defaultdict(list)
+
+    for file in sorted(Path(json_dir).joinpath('parallel').glob('*.json')):
+        with open(file, encoding='UTF8') as infile:
+            book_data = json.load(infile)
+        for ref, *rows in book_data:
+            hebrew, greek = [], []
+            for row in rows:
+                heb_a, heb_b, grk = row
+                # skip the text and markup pairs of lines with parsing errors
+                hebrew.extend(e[0] for e in heb_a if isinstance(e, list) and e[0])
+                greek.extend(e[0] for e in grk if isinstance(e, list) and e[0])
+            layers['hebrew'].append((ref, hebrew))
+            layers['greek'].append((ref, greek))
+
+    for file in sorted(Path(json_dir).joinpath('morphology').glob('*.json')):
+        with open(file, encoding='UTF8') as infile:
+            book_data = json.load(infile)
+        for ref, *words in book_data:
+            layers['surface'].append((ref, [w['utf8'] for w in words if w.get('utf8')]))
+            layers['lexeme'].append((ref, [w['lexeme'] for w in words if w.get('lexeme')]))
+
+    return dict(layers)
+
+def suffix_array(text):
+    """Sort the suffixes of a sequence of integers by prefix doubling.
+
+    The ranks of the suffixes by their first k items are doubled to
+    2k items in every round by sorting on the pair of the rank of the
+    suffix and the rank of the suffix k items later, until all ranks
+    are distinct. A suffix which ends early sorts before its extensions.
+    """
+    n = len(text)
+    sa = list(range(n))
+    if n < 2:
+        return sa
+    rank = list(text)
+    base = max(max(text), n) + 2
+    k = 1
+    while True:
+        key = [
+            rank[i] * base + (rank[i+k] + 1 if i + k < n else 0)
+                for i in range(n)
+        ]
+        sa.sort(key=key.__getitem__)
+        new_rank = [0] * n
+        r = 0
+        for j in range(1, n):
+            if key[sa[j]] != key[sa[j-1]]:
+                r += 1
+            new_rank[sa[j]] = r
+        rank = new_rank
+        if r == n - 1 or k >= n:
+            return sa
+        k *= 2
+
+class Concordance:
+    """Suffix array index over the tokens of one layer."""
+
+    def __init__(self, vocab, refs, text, verses, sa, fold=None, fold_vocab=None,
+                 folds=None, fold_sa=None):
+        self.vocab = vocab      # tokens, sorted; the id of a token is its index + 1
+        self.refs = refs        # refs of the verses
+        self.text = text        # token ids, with books separated by 0
+        self.verses = verses    # index into refs of every token
+        self.sa = sa            # suffix array over text
+        self.ids = {token: i + 1 for i, token in enumerate(vocab)}
+
+        # folded search keys, if any
+        self.fold = fold                # function folding a token to its key
+        self.fold_vocab = fold_vocab    # keys, sorted; the id of a key is its index + 1
+        self.folds = folds              # key id of every token id
+        self.fold_sa = fold_sa          # suffix array over fold_text
+        if fold:
+            self.fold_ids = {key: i + 1 for i, key in enumerate(fold_vocab)}
+            self.fold_text = array('I', (folds[t] for t in text))
+
+    @classmethod
+    def build(cls, verses, fold=None):
+        """Build a concordance from a list of (ref, tokens).
+
+        Args:
+            verses: list of (ref, tokens)
+            fold: optional function folding a token to its search key,
+                to index the tokens for folded lookups as well
+        """
+        vocab = sorted({t for ref, tokens in verses for t in tokens})
+        ids = {token: i + 1 for i, token in enumerate(vocab)}
+        refs = []
+        text = array('I')
+        verse_index = array('I')
+        book = None
+        for ref, tokens in verses:
+            if ref.split()[0] != book:
+                if book is not None:
+                    text.append(separator)
+                    verse_index.append(len(refs) - 1)
+                book = ref.split()[0]
+            refs.append(ref)
+            text.extend(ids[t] for t in tokens)
+            verse_index.extend(len(refs) - 1 for t in tokens)
+        sa = array('I', suffix_array(text))
+        if not fold:
+            return cls(vocab, refs, text, verse_index, sa)
+
+        fold_vocab = sorted({fold(t) for t in vocab})
+        fold_ids = {key: i + 1 for i, key in enumerate(fold_vocab)}
+        folds = array('I', [separator] + [fold_ids[fold(t)] for t in vocab])
+        fold_sa = array('I', suffix_array([folds[t] for t in text]))
+        return cls(vocab, refs, text, verse_index, sa, fold, fold_vocab, folds, fold_sa)
+
+    def view(self, folded=False):
+        """Return the (vocab, ids, text, suffix array) of the exact or folded tokens."""
+        if not folded:
+            return self.vocab, self.ids, self.text, self.sa
+        if not self.fold:
+            raise ValueError('this concordance has no folded search keys')
+        return self.fold_vocab, self.fold_ids, self.fold_text, self.fold_sa
+
+    def id_ranges(self, phrase, prefix=False, folded=False):
+        """Return the range of ids of every word of a phrase, or None if a word is unknown."""
+        words = phrase.split() if isinstance(phrase, str) else list(phrase)
+        vocab, ids, text, sa = self.view(folded)
+        if folded:
+            words = [self.fold(word) for word in words]
+        ranges = []
+        for i, word in enumerate(words):
+            if prefix and i == len(words) - 1:
+                lo = bisect(vocab, word)
+                hi = bisect(vocab, word + chr(sys.maxunicode))
+                if lo == hi:
+                    return None
+                ranges.append((lo + 1, hi + 1))
+            elif word in ids:
+                ranges.append((ids[word], ids[word] + 1))
+            else:
+                return None
+        return ranges
+
+    def bound(self, key, folded=False):
+        """Return the first suffix array index whose suffix is not below key."""
+        vocab, ids, text, sa = self.view(folded)
+        m = len(key)
+        lo, hi = 0, len(sa)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = sa[mid]
+            if list(text[start:start+m]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, phrase, prefix=False, folded=False):
+        """Find all occurrences of a phrase.
+
+        Args:
+            phrase: string of space-separated words, or a list of words
+            prefix: boolean, True to match the last word as a prefix
+            folded: boolean, True to match the search keys of the words,
+                e.g. to find Greek words regardless of their diacritics
+
+        Returns:
+            sorted list of the token positions where the phrase begins
+        """
+        ranges = self.id_ranges(phrase, prefix, folded)
+        if not ranges:
+            return []
+        sa = self.view(folded)[3]
+        exact = [lo for lo, hi in ranges[:-1]]
+        first = self.bound(exact + [ranges[-1][0]], folded)
+        last = self.bound(exact + [ranges[-1][1]], folded)
+        return sorted(sa[first:last])
+
+    def kwic(self, phrase, window=5, prefix=False, folded=False):
+        """Return every occurrence of a phrase as keyword-in-context.
+
+        Args:
+            phrase: see lookup
+            window: number of words of context on either side
+            prefix: see lookup
+            folded: see lookup
+
+        Returns:
+            list of (ref, left context, match, right context) with the
+            context and match given as strings of words
+        """
+        size = len(phrase.split() if isinstance(phrase, str) else phrase)
+        lines = []
+        for start in self.lookup(phrase, prefix, folded):
+            end = start + size
+            left = list(self.text[max(0, start-window):start])
+            right = list(self.text[end:end+window])
+            # don't show context from other books
+            if separator in left:
+                left = left[len(left) - left[::-1].index(separator):]
+            if separator in right:
+                right = right[:right.index(separator)]
+            lines.append((
+                self.refs[self.verses[start]],
+                self.words(left),
+                self.words(self.text[start:end]),
+                self.words(right),
+            ))
+        return lines
+
+    def counts(self, phrase, prefix=False, folded=False):
+        """Return a Counter of the occurrences of a phrase per book."""
+        return collections.Counter(
+            self.refs[self.verses[start]].split()[0]
+                for start in self.lookup(phrase, prefix, folded)
+        )
+
+    def words(self, ids):
+        return ' '.join(self.vocab[i-1] for i in ids)
+
+    def save(self, path):
+        """Write the index to path (binary) and path.json (vocabulary and refs)."""
+        path = Path(path)
+        meta = {'vocab': self.vocab, 'refs': self.refs}
+        parts = [self.text, self.verses, self.sa]
+        if self.fold:
+            meta.update(fold=self.fold.__name__, fold_vocab=self.fold_vocab)
+            parts += [self.fold_sa, self.folds]
+        with open(path.with_suffix('.json'), 'w', encoding='UTF8') as outfile:
+            json.dump(meta, outfile, ensure_ascii=False)
+        data = array('I', [len(self.text)])
+        for part in parts:
+            data.extend(part)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        path.write_bytes(data.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save."""
+        path = Path(path)
+        with open(path.with_suffix('.json'), encoding='UTF8') as infile:
+            meta = json.load(infile)
+        data = array('I')
+        data.frombytes(path.read_bytes())
+        if sys.byteorder == 'big':
+            data.byteswap()
+        n = data[0]
+        text, verses, sa = (data[1+i*n:1+(i+1)*n] for i in range(3))
+        if 'fold' not in meta:
+            return cls(meta['vocab'], meta['refs'], text, verses, sa)
+        fold_sa = data[1+3*n:1+4*n]
+        folds = data[1+4*n:]
+        fold = getattr(transcription, meta['fold'])
+        return cls(meta['vocab'], meta['refs'], text, verses, sa, fold, meta['fold_vocab'], folds, fold_sa)
+
+def bisect(strings, string):
+    """Return the index of the first string which is not below string."""
+    lo, hi = 0, len(strings)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if strings[mid] < string:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def build_concordances(json_dir='JSON', silent=False):
+    """Build the concordance of every layer of the JSON exports.
+
+    Returns:
+        dict of layer to Concordance
+    """
+    concordances = {}
+    for layer, verses in verse_tokens(json_dir).items():
+        if not silent:
+            print(f'indexing {layer}...')
+        concordances[layer] = Concordance.build(verses, layer_folds.get(layer))
+    return concordances
+
+def save_concordances(concordances, output_dir='JSON/concordance'):
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for layer, concordance in concordances.items():
+        concordance.save(out_dir.joinpath(layer + '.idx'))
+
+def load_concordances(output_dir='JSON/concordance'):
+    return {
+        file.stem: Concordance.load(file)
+            for file in sorted(Path(output_dir).glob('*.idx'))
+    }
+
+def show_kwic(lines):
+    """Print keyword-in-context lines with the matches aligned."""
+    width = max((len(left) for ref, left, match, right in lines), default=0)
+    for ref, left, match, right in lines:
+        print(f'{ref:<12} {left:>{width}} [{match}] {right}')
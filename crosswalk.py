@@ -0,0 +1,171 @@
+"""
+Use build_crosswalk to collect the MT / LXX versification differences
+noted in the parsed parallel data, save_crosswalk and load_crosswalk to
+persist them with the JSON exports, and the to_lxx and to_mt methods of
+a Crosswalk to move between the numberings.
+
+The verses of the parallel files follow the Hebrew (MT). Differences are
+noted in two ways, which the parser keeps as tags of the elements:
+
+    Greek column    [118.127], [2.46k,10.26a] or [[30:11]] give the
+                    verse of the Greek (LXX), e.g. [6] is verse 6 of
+                    the same chapter
+    Hebrew columns  <...> notes with a reference, e.g. <31.28>, give
+                    the Hebrew verse of text aligned at a different place
+
+Both directions are kept in dicts keyed by the integer verse keys of
+references.py, so that a lookup is a single dict access. Greek verses
+with a letter, e.g. 2:46k, are keyed by their verse number and keep the
+letter in their label. Notes which look like references but can't be
+resolved are kept in Crosswalk.unresolved.
+"""
+
+import json
+import regex
+import collections
+from pathlib import Path
+from references import ref_key, key_ref, book_code, book_ids, pack_key
+
+# bump when the format of the saved crosswalk changes
+version = 1
+
+column_names = ('heb_a', 'heb_b', 'grk')
+
+# a note is a comma-separated list of items like 118.127, 30:11, 2.46k,
+# 6 or 12-13, optionally preceded by a book, e.g. Ps 18.3
+note_item = regex.compile(
+    r'^(?:([A-Za-z1-9/]+) )?(?:(\d+)[.:])?(\d+)([a-z]*)(?:-(\d+)([a-z]*))?$'
+)
+note_like = regex.compile(r'\d')
+
+def note_refs(note, book, chapter):
+    """Parse a note into references, e.g. 2.46k,10.26a.
+
+    Args:
+        note: text of the note, without its brackets
+        book: book code of the verse of the note, for items without a book
+        chapter: chapter of the verse of the note, for items without a chapter
+
+    Returns:
+        list of (key, label) of the referenced verses, or None if the
+        note isn't (entirely) a list of references
+    """
+    refs = []
+    for item in note.split(','):
+        match = note_item.match(item.strip())
+        if not match:
+            return None
+        item_book, item_chapter, start, suffix, end, end_suffix = match.groups()
+        code = book_code(item_book) if item_book else book
+        if code is None:
+            return None
+        item_chapter = int(item_chapter) if item_chapter else chapter
+        for verse in range(int(start), int(end or start) + 1):
+            label_suffix = suffix if verse == int(start) else end_suffix if verse == int(end) else ''
+            key = pack_key(book_ids[code], item_chapter, verse)
+            refs.append((key, f'{code} {item_chapter}:{verse}{label_suffix or ""}'))
+    return refs
+
+class Crosswalk:
+    """Bidirectional lookup between MT and LXX verses."""
+
+    def __init__(self, links, unresolved=()):
+        self.links = links              # list of (mt key, lxx key, mt label, lxx label, column)
+        self.unresolved = list(unresolved)   # list of (ref, column, note)
+        self.mt_to_lxx = collections.defaultdict(list)
+        self.lxx_to_mt = collections.defaultdict(list)
+        for mt_key, lxx_key, mt_label, lxx_label, column in links:
+            self.mt_to_lxx[mt_key].append(lxx_label)
+            self.lxx_to_mt[lxx_key].append(mt_label)
+        self.mt_to_lxx = dict(self.mt_to_lxx)
+        self.lxx_to_mt = dict(self.lxx_to_mt)
+
+    @staticmethod
+    def key(ref):
+        return ref if isinstance(ref, int) else ref_key(ref)
+
+    def to_lxx(self, ref):
+        """Return the LXX verses of an MT verse, given as a ref or integer key.
+
+        Verses without a noted difference are the same in both numberings.
+        """
+        key = self.key(ref)
+        return self.mt_to_lxx.get(key) or [key_ref(key)]
+
+    def to_mt(self, ref):
+        """Return the MT verses of an LXX verse; see to_lxx."""
+        key = self.key(ref)
+        return self.lxx_to_mt.get(key) or [key_ref(key)]
+
+    def lookup(self, ref):
+        """Return both directions of a ref as a dict."""
+        return {'ref': key_ref(self.key(ref)), 'lxx': self.to_lxx(ref), 'mt': self.to_mt(ref)}
+
+def build_crosswalk(para_data, tags=None):
+    """Collect the versification notes of parsed parallel data.
+
+    Args:
+        para_data: books as returned by parse_parallel.parse_parallel
+        tags: the TagRegistry of the tokens, if their tags are codes
+
+    Returns:
+        Crosswalk
+    """
+    links = []
+    seen = set()
+    unresolved = []
+    for book_data in para_data:
+        for verse in book_data[1:]:
+            if not verse or not isinstance(verse[0], str):
+                continue
+            ref = verse[0]
+            try:
+                mt_key = ref_key(ref)
+            except ValueError:
+                continue
+            book = ref.split()[0]
+            chapter = int(ref.split()[1].split(':')[0])
+            for row in verse[1:]:
+                for column_name, column in zip(column_names, row):
+                    notes = {
+                        tag for element in column if not isinstance(element, str)
+                            for tag in (tags.decode(element[1]) if tags else element[1])
+                                if note_like.search(tag)
+                    }
+                    for note in sorted(notes):
+                        refs = note_refs(note, book, chapter)
+                        if refs is None:
+                            unresolved.append((ref, column_name, note))
+                            continue
+                        for note_key, label in refs:
+                            # Greek notes give the LXX verse of this MT verse,
+                            # Hebrew notes the MT verse of this place
+                            if column_name == 'grk':
+                                link = (mt_key, note_key, ref, label, column_name)
+                            else:
+                                link = (note_key, mt_key, label, ref, column_name)
+                            # a link noted in both Hebrew columns is kept once
+                            if link[:2] not in seen:
+                                seen.add(link[:2])
+                                links.append(link)
+    return Crosswalk(links, unresolved)
+
+def save_crosswalk(crosswalk, path='JSON/crosswalk.json'):
+    data = {
+        'version': version,
+        'links': [list(link) for link in crosswalk.links],
+        'unresolved': [list(note) for note in crosswalk.unresolved],
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='UTF8') as outfile:
+        json.dump(data, outfile, ensure_ascii=False)
+
+def load_crosswalk(path='JSON/crosswalk.json'):
+    with open(path, encoding='UTF8') as infile:
+        data = json.load(infile)
+    if data['version'] != version:
+        raise Exception(f'{path} has version {data["version"]}; rebuild it with build_crosswalk')
+    return Crosswalk(
+        [tuple(link) for link in data['links']],
+        [tuple(note) for note in data['unresolved']],
+    )
@@ -0,0 +1,242 @@
+"""
+Use compute_divergences to compare the Hebrew column A (MT) with column B
+(the retroverted Vorlage) of every line of the parsed parallel data, and
+the summary and candidates methods of the returned table to analyse them.
+
+The consonants of both columns are encoded as integers, with final
+letters and shin / sin folded and word division kept as a symbol, and
+aligned with an edit distance which also counts the transposition of
+neighbouring letters (metathesis). The distance is computed within a
+band around the diagonal, which is widened until it holds the distance,
+since the columns rarely differ in more than a few letters.
+
+The results are kept as a table of integer columns, one row per line
+which has a column B, together with the edit operations as a compact
+string, e.g. 3=1X2=1T: 3 matches, 1 substitution, 2 matches and 1
+transposition. The other operations are I (insertion in B) and D
+(deletion from A).
+"""
+
+import sys
+import json
+import collections
+from array import array
+from pathlib import Path
+from references import ref_key
+from transcription import fold_hebrew
+
+consonants = 'אבגדהוזחטיכלמנסעפצקרשת'
+codes = {c: i + 1 for i, c in enumerate(consonants)}
+word_break = len(consonants) + 1
+
+# integer columns of the table
+columns = ('verse', 'row', 'len_a', 'len_b', 'distance', 'substitutions',
+           'insertions', 'deletions', 'transpositions')
+
+op_counts = {'X': 'substitutions', 'I': 'insertions', 'D': 'deletions', 'T': 'transpositions'}
+
+def encode(column):
+    """Encode the consonants of the tokens of a parsed Hebrew column as integers."""
+    words = [fold_hebrew(element[0]) for element in column if not isinstance(element, str)]
+    encoded = []
+    for word in ' '.join(words).split():
+        if encoded:
+            encoded.append(word_break)
+        encoded.extend(codes[c] for c in word if c in codes)
+    return encoded
+
+def banded_alignment(a, b, band):
+    """Align a and b with an edit distance of at most band.
+
+    Returns:
+        tuple of (distance, ops), where ops is a list of the operations
+        =, X, I, D and T; or None if the distance exceeds the band
+    """
+    n, m = len(a), len(b)
+    if abs(n - m) > band:
+        return None
+    inf = band + 1
+    width = 2 * band + 1
+    # cost[i][j - i + band] is the distance of a[:i] and b[:j]
+    cost = [[inf] * width for i in range(n + 1)]
+    for j in range(min(m, band) + 1):
+        cost[0][j + band] = j
+    for i in range(1, n + 1):
+        row, prev = cost[i], cost[i-1]
+        for j in range(max(0, i - band), min(m, i + band) + 1):
+            k = j - i + band
+            if j == 0:
+                row[k] = i
+                continue
+            best = prev[k] + (a[i-1] != b[j-1])        # match or substitution
+            if k + 1 < width and prev[k+1] + 1 < best:  # deletion from a
+                best = prev[k+1] + 1
+            if k and row[k-1] + 1 < best:               # insertion into b
+                best = row[k-1] + 1
+            if (i > 1 and j > 1 and a[i-1] == b[j-2] and a[i-2] == b[j-1]
+                    and a[i-1] != b[j-1] and cost[i-2][k] + 1 < best):
+                best = cost[i-2][k] + 1                  # transposition
+            row[k] = min(best, inf)
+    distance = cost[n][m - n + band]
+    if distance > band:
+        return None
+
+    # trace the operations back from the end
+    ops = []
+    i, j = n, m
+    while i or j:
+        k = j - i + band
+        here = cost[i][k]
+        if i and j and cost[i-1][k] + (a[i-1] != b[j-1]) == here:
+            ops.append('=' if a[i-1] == b[j-1] else 'X')
+            i, j = i - 1, j - 1
+        elif i > 1 and j > 1 and a[i-1] == b[j-2] and a[i-2] == b[j-1] and cost[i-2][k] + 1 == here:
+            ops.append('T')
+            i, j = i - 2, j - 2
+        elif i and k + 1 < width and cost[i-1][k+1] + 1 == here:
+            ops.append('D')
+            i -= 1
+        else:
+            ops.append('I')
+            j -= 1
+    ops.reverse()
+    return distance, ops
+
+def alignment(a, b):
+    """Align a and b, doubling the band until it holds the distance; see banded_alignment."""
+    band = max(2, abs(len(a) - len(b)))
+    while True:
+        result = banded_alignment(a, b, band)
+        if result:
+            return result
+        band *= 2
+
+def compress_ops(ops):
+    """Run-length encode operations, e.g. ==X== to 2=1X2=."""
+    runs = []
+    for op in ops:
+        if runs and runs[-1][1] == op:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, op])
+    return ''.join(f'{n}{op}' for n, op in runs)
+
+class DivergenceTable:
+    """Edit distances between the Hebrew columns of every line with a column B."""
+
+    def __init__(self, data, refs, ops, sigla):
+        self.data = data        # column name -> array of unsigned ints
+        self.refs = refs        # ref of every line
+        self.ops = ops          # compressed edit operations of every line
+        self.sigla = sigla      # tags of column B of every line
+
+    def __len__(self):
+        return len(self.refs)
+
+    def save(self, path):
+        """Write the integer columns to path and the rest to path.json."""
+        path = Path(path)
+        data = array('I', [len(self)])
+        for name in columns:
+            data.extend(self.data[name])
+        if sys.byteorder == 'big':
+            data.byteswap()
+        path.write_bytes(data.tobytes())
+        meta = {'columns': columns, 'refs': self.refs, 'ops': self.ops, 'sigla': self.sigla}
+        with open(path.with_suffix('.json'), 'w', encoding='UTF8') as outfile:
+            json.dump(meta, outfile, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        with open(path.with_suffix('.json'), encoding='UTF8') as infile:
+            meta = json.load(infile)
+        data = array('I')
+        data.frombytes(path.read_bytes())
+        if sys.byteorder == 'big':
+            data.byteswap()
+        n = data[0]
+        table = {name: data[1+i*n:1+(i+1)*n] for i, name in enumerate(meta['columns'])}
+        return cls(table, meta['refs'], meta['ops'], meta['sigla'])
+
+    def summary(self):
+        """Return the distribution of the distances, overall and per siglum.
+
+        Returns:
+            dict with the number of lines, the mean distance, a Counter of
+            the distances, and per siglum the number of lines, their mean
+            distance and the totals of every kind of operation
+        """
+        distances = self.data['distance']
+        per_siglum = collections.defaultdict(collections.Counter)
+        for i, sigla in enumerate(self.sigla):
+            for siglum in sigla or ['']:
+                counts = per_siglum[siglum]
+                counts['lines'] += 1
+                counts['distance'] += distances[i]
+                for name in op_counts.values():
+                    counts[name] += self.data[name][i]
+        for counts in per_siglum.values():
+            counts['mean_distance'] = counts['distance'] / counts['lines']
+        return {
+            'lines': len(self),
+            'mean_distance': sum(distances) / len(self) if len(self) else 0.0,
+            'distances': collections.Counter(distances),
+            'sigla': dict(per_siglum),
+        }
+
+    def candidates(self, min_distance=1, max_ratio=0.5):
+        """Return lines which may contain errors, as (index, ref, ops, reason).
+
+        These are lines whose columns differ without a siglum describing
+        the difference, or whose columns differ in more than max_ratio of
+        their letters.
+        """
+        found = []
+        for i, ref in enumerate(self.refs):
+            distance = self.data['distance'][i]
+            length = max(self.data['len_a'][i], self.data['len_b'][i], 1)
+            if distance >= min_distance and not self.sigla[i]:
+                found.append((i, ref, self.ops[i], 'difference without siglum'))
+            elif distance / length > max_ratio:
+                found.append((i, ref, self.ops[i], f'distance {distance} of {length} letters'))
+        return found
+
+def compute_divergences(para_data):
+    """Compare the Hebrew columns A and B of all lines of parsed parallel data.
+
+    Args:
+        para_data: books as returned by parse_parallel.parse_parallel,
+            without tag codes
+
+    Returns:
+        DivergenceTable
+    """
+    data = {name: array('I') for name in columns}
+    refs, ops, sigla = [], [], []
+    for book_data in para_data:
+        for verse in book_data[1:]:
+            if not verse or not isinstance(verse[0], str):
+                continue
+            ref = verse[0]
+            try:
+                key = ref_key(ref)
+            except ValueError:
+                continue
+            for row_index, row in enumerate(verse[1:]):
+                heb_a, heb_b = row[0], row[1]
+                # skip lines without a column B and lines with parsing errors
+                if not heb_b or isinstance(heb_b[0], str):
+                    continue
+                a, b = encode(heb_a), encode(heb_b)
+                distance, line_ops = alignment(a, b)
+                counts = collections.Counter(line_ops)
+                values = (key, row_index, len(a), len(b), distance) + tuple(
+                    counts[op] for op in op_counts
+                )
+                for name, value in zip(columns, values):
+                    data[name].append(value)
+                refs.append(ref)
+                ops.append(compress_ops(line_ops))
+                sigla.append(sorted({tag for element in heb_b for tag in element[1]}))
+    return DivergenceTable(data, refs, ops, sigla)
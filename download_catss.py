@@ -3,9 +3,15 @@ Use the download_catss function to download all of the
 text files for the CATSS database to disk.
 """
 
-import requests
+import os
 import time
+import shutil
+import argparse
 from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from metrics import StageMetrics
+from references import book_selection, selects
 
 # Before writing the download function, we compile a series of 
 # urls and filenames which will be used to download and output 
@@ -14,8 +20,9 @@ from pathlib import Path
 # to filenames for the download function
 
 # base URL, which is formatted for each book that is retrieved
-morph_url = 'http://ccat.sas.upenn.edu/gopher/text/religion/biblical/lxxmorph/{}'
-paral_url = 'http://ccat.sas.upenn.edu/gopher/text/religion/biblical/parallel/{}'
+upstream_url = 'http://ccat.sas.upenn.edu/gopher/text/religion/biblical'
+morph_url = upstream_url + '/lxxmorph/{}'
+paral_url = upstream_url + '/parallel/{}'
 
 # names of the morphology book files; for formatting the URLs
 # pasted from http://ccat.sas.upenn.edu/gopher/text/religion/biblical/lxxmorph
@@ -143,52 +150,205 @@ morph_books = [book.split('\t')[1] for book in morph_books.split('\n')
 paral_books = [book.split('\t')[1] for book in paral_books.split('\n')
                   if book]
 
+def make_urls(morph_base=morph_url, paral_base=paral_url):
+    """Return a dict of the URLs of all books mapped to their file names.
+
+    The base URLs are formatted with the file name of every book; see
+    base_urls for other servers.
+    """
+    urls = {}
+    for dataset, base_url in [(morph_books, morph_base), (paral_books, paral_base)]:
+        for book in dataset:
+            urls[base_url.format(book)] = book
+    return urls
+
 # assemble URLs for both morph and parallel data
-all_urls = {}
-for dataset, base_url in [(morph_books, morph_url), (paral_books, paral_url)]:
-    for book in dataset:
-        all_urls[base_url.format(book)] = book
+all_urls = make_urls()
+
+def base_urls(base_url=None):
+    """Return the URLs of all books under another base URL.
+
+    The base has the layout of the upstream server, i.e. the files in
+    lxxmorph/ and parallel/ directories below it, e.g. a stand-in server
+    at http://localhost:8000 or a copy of it at file:///srv/catss.
+
+    Args:
+        base_url: defaults to the CATSS_BASE_URL environment variable,
+            or the upstream server if it isn't set
+    """
+    base_url = (base_url or os.environ.get('CATSS_BASE_URL') or upstream_url).rstrip('/')
+    return make_urls(base_url + '/lxxmorph/{}', base_url + '/parallel/{}')
+
+# Fetchers get the data of a URL as bytes. Which one download_catss uses
+# is configured with a string, see get_fetcher, so that builders can
+# bootstrap from a local or shared mirror instead of the upstream server.
+
+class HTTPFetcher:
+    """Fetch URLs over HTTP, pausing between requests to be nice to the server."""
+
+    def __init__(self, sleeptime=1):
+        self.sleeptime = sleeptime
+
+    def fetch(self, url, filename):
+        import requests
+        response = requests.get(url)
+        response.raise_for_status()
+        time.sleep(self.sleeptime)
+        return response.content
+
+class FileFetcher:
+    """Fetch file:// URLs from the local filesystem."""
+
+    def fetch(self, url, filename):
+        parsed = urlparse(url)
+        if parsed.scheme != 'file':
+            raise ValueError(f'{url} is not a file:// URL; give a file:// base URL, see base_urls')
+        return Path(url2pathname(parsed.path)).read_bytes()
+
+class MirrorFetcher:
+    """Fetch the files of URLs from a directory holding them by file name;
+    see populate_mirror."""
+
+    def __init__(self, mirror_dir):
+        self.mirror_dir = Path(mirror_dir)
+
+    def fetch(self, url, filename):
+        path = self.mirror_dir.joinpath(filename)
+        if not path.exists():
+            raise FileNotFoundError(f'{filename} is missing from the mirror {self.mirror_dir}')
+        return path.read_bytes()
+
+def get_fetcher(config=None, sleeptime=1):
+    """Return the fetcher of a configuration string.
 
-def download_catss(urls=all_urls, output_dir='source', silent=False, sleeptime=1):
+    Args:
+        config: 'http', 'file' or 'mirror:<directory>'; defaults to the
+            CATSS_FETCH environment variable, or 'http' if it isn't set
+        sleeptime: number of seconds the HTTP fetcher waits after each download
+
+    Returns:
+        HTTPFetcher, FileFetcher or MirrorFetcher
+    """
+    config = config or os.environ.get('CATSS_FETCH') or 'http'
+    if config == 'http':
+        return HTTPFetcher(sleeptime)
+    elif config == 'file':
+        return FileFetcher()
+    elif config.startswith('mirror:'):
+        return MirrorFetcher(config[len('mirror:'):])
+    raise ValueError(f'unknown fetch configuration {config}')
+
+def download_catss(urls=None, output_dir='source', silent=False, sleeptime=1,
+                   metrics_dir=None, fetcher=None, books=None):
     """Download all of CATSS morphology and parallels as plain text files
 
     Args:
         urls: a dict where each key is a url address and each value is a 
             corresponding file name (e.g. the book name) to output the page's
-            data to.
+            data to; defaults to base_urls(), i.e. the upstream server
+            unless CATSS_BASE_URL is set
         output_dir: the directory where the files should be output to
         silent: boolean, False if you want to print status updates
-        sleeptime: number of seconds to wait between each download
+        sleeptime: number of seconds to wait between each HTTP download
+        metrics_dir: optional directory to write the metrics of the run to;
+            see metrics.py
+        fetcher: a fetcher or configuration string, see get_fetcher;
+            defaults to the CATSS_FETCH environment variable or HTTP
+        books: optional book code or list of codes, e.g. ['GEN', 'PSA'],
+            to download only their files; see references.book_selection
     
     Returns:
         True if task finishes. Files are output to output_dir.
     """
 
+    metrics = StageMetrics('download')
+    if urls is None:
+        urls = base_urls()
+    if fetcher is None or isinstance(fetcher, str):
+        fetcher = get_fetcher(fetcher, sleeptime)
+
     # check for output directory and create if necessary
     out_dir = Path(output_dir)
     if not out_dir.exists():
         out_dir.mkdir()
 
     # walk the URLs, download each one, and output as a file
+    books = book_selection(books)
     for url, filename in urls.items():
 
+        if not selects(filename, books):
+            continue
+
         if not silent:
             print(f'retrieving {url}...')
 
         # path to output data
         out_path = out_dir.joinpath(filename)
 
-        # download the data
-        download_data = requests.get(url).text
-        
-        # write to disk
-        with open(out_path, 'w') as outfile:
-            outfile.write(download_data) # output here
+        # download the data and write it to disk as it is
+        download_data = fetcher.fetch(url, filename)
+        out_path.write_bytes(download_data)
+
+        metrics.count('bytes_read_total', len(download_data))
+        metrics.count('bytes_written_total', out_path.stat().st_size)
+        metrics.count('lines_processed_total', download_data.count(b'\n') + 1)
+        metrics.count('files_written_total')
         
         if not silent:
             print(f'\t|data written to {out_path}')
 
-        # pause between each download to be nice to server
-        time.sleep(sleeptime)
+    if metrics_dir:
+        metrics.write(metrics_dir)
 
     return True
+
+def populate_mirror(mirror_dir, source_dir='source', urls=all_urls, silent=False, books=None):
+    """Copy the downloaded files of source_dir into a mirror directory.
+
+    Args:
+        mirror_dir: directory of the mirror, created if necessary
+        source_dir: directory of a previous download_catss run
+        urls: the dict of URLs to file names of the files to copy
+        silent: boolean, False if you want to print status updates
+        books: optional book code or list of codes to mirror only their files
+
+    Returns:
+        list of the file names which are missing from source_dir
+    """
+    mirror_dir = Path(mirror_dir)
+    mirror_dir.mkdir(parents=True, exist_ok=True)
+    books = book_selection(books)
+    urls = {url: filename for url, filename in urls.items() if selects(filename, books)}
+    missing = []
+    for filename in urls.values():
+        source = Path(source_dir).joinpath(filename)
+        if not source.exists():
+            missing.append(filename)
+            continue
+        # write to a temporary file first, so that a shared mirror
+        # never holds a partial file
+        tmp_path = mirror_dir.joinpath(filename + '.tmp')
+        shutil.copyfile(source, tmp_path)
+        tmp_path.replace(mirror_dir.joinpath(filename))
+    if not silent:
+        print(f'mirrored {len(urls) - len(missing)} files to {mirror_dir}')
+        for filename in missing:
+            print(f'\t|missing {filename}')
+    return missing
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='download the CATSS files or mirror them')
+    parser.add_argument('--output-dir', default='source')
+    parser.add_argument('--fetch', help="'http', 'file' or 'mirror:<directory>'")
+    parser.add_argument('--base-url', help='server or file:// directory with the layout of '
+                                           'the upstream server; see base_urls')
+    parser.add_argument('--populate-mirror', metavar='MIRROR_DIR',
+                        help='copy the files of --output-dir to a mirror instead of downloading')
+    parser.add_argument('--books', nargs='+', metavar='CODE', help='only these books, e.g. GEN PSA')
+    parser.add_argument('--silent', action='store_true')
+    args = parser.parse_args()
+    if args.populate_mirror:
+        populate_mirror(args.populate_mirror, args.output_dir, silent=args.silent, books=args.books)
+    else:
+        download_catss(base_urls(args.base_url), output_dir=args.output_dir, silent=args.silent,
+                       fetcher=args.fetch, books=args.books)
@@ -0,0 +1,144 @@
+"""
+Collect operational metrics of the pipeline stages and write them as a
+Prometheus textfile and as JSON.
+
+Every stage (download_catss, patch_morpho, patch_parallel, parse_parallel
+and export_parallel) takes a metrics_dir argument. When given, the stage
+writes its metrics to metrics_dir/catss_<stage>.prom, which can be picked
+up by the textfile collector of the Prometheus node exporter, and to
+metrics_dir/catss_<stage>.json.
+"""
+
+import sys
+import json
+import time
+import collections
+from pathlib import Path
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+# the metrics which are written, as (name, type, help); all metrics are
+# labeled with their stage, some with a further label given to count
+metric_types = (
+    ('lines_processed_total', 'counter', 'lines of data processed'),
+    ('lines_per_second', 'gauge', 'lines of data processed per second'),
+    ('bytes_read_total', 'counter', 'bytes of data read'),
+    ('bytes_written_total', 'counter', 'bytes of data written'),
+    ('files_written_total', 'counter', 'files written'),
+    ('verses_total', 'counter', 'verses parsed or exported'),
+    ('verses_reparsed_total', 'counter', 'verses parsed anew rather than taken from the cache'),
+    ('column_cache_hits_total', 'counter', 'column strings whose parse was taken from the column cache'),
+    ('column_cache_misses_total', 'counter', 'column strings parsed anew'),
+    ('edits_applied_total', 'counter', 'edits applied to the data'),
+    ('edits_unconfirmed_total', 'counter', 'edits skipped because their target was not confirmed'),
+    ('rule_hits_total', 'counter', 'lines changed by each rule'),
+    ('patterns_not_found_total', 'counter', 'normalization patterns which matched no line'),
+    ('lines_quarantined_total', 'counter', 'lines quarantined after a regex timeout'),
+    ('parse_errors_total', 'counter', 'lines which failed to parse, per book'),
+    ('stage_duration_seconds', 'gauge', 'duration of the stage'),
+    ('peak_rss_bytes', 'gauge', 'peak resident set size of the process and of its children'),
+    ('last_run_timestamp_seconds', 'gauge', 'time the stage finished'),
+)
+
+prefix = 'catss_'
+
+def peak_rss():
+    """Return the peak resident set size in bytes of this process and of its children.
+
+    Returns:
+        dict of 'self' and 'children' to bytes, empty where
+        the resource module is unavailable
+    """
+    if resource is None:
+        return {}
+    # ru_maxrss is given in bytes on macOS but in kilobytes elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class StageMetrics:
+    """Counters and gauges of a single run of a pipeline stage."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.started = time.time()
+        self.clock = time.perf_counter()
+        # name -> {(label name, label value) or (): value}
+        self.values = collections.defaultdict(collections.Counter)
+
+    def count(self, name, n=1, **labels):
+        """Add n to a counter, optionally with a single label, e.g. book='01.Genesis.par'."""
+        self.values[name][tuple(labels.items())] += n
+
+    def set(self, name, value, **labels):
+        self.values[name][tuple(labels.items())] = value
+
+    def finish(self):
+        """Record the duration, throughput, peak memory and time of the run."""
+        duration = time.perf_counter() - self.clock
+        self.set('stage_duration_seconds', duration)
+        if 'lines_processed_total' in self.values:
+            lines = sum(self.values['lines_processed_total'].values())
+            self.set('lines_per_second', lines / duration if duration else 0.0)
+        for process, rss in peak_rss().items():
+            self.set('peak_rss_bytes', rss, process=process)
+        self.set('last_run_timestamp_seconds', time.time())
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, kind, help_text in metric_types:
+            if name not in self.values:
+                continue
+            lines.append(f'# HELP {prefix}{name} {help_text}')
+            lines.append(f'# TYPE {prefix}{name} {kind}')
+            for labels, value in sorted(self.values[name].items()):
+                labels = (('stage', self.stage),) + labels
+                label_text = ','.join(f'{k}="{escape(v)}"' for k, v in labels)
+                lines.append(f'{prefix}{name}{{{label_text}}} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def json(self):
+        """Return the metrics as a dict; labeled metrics are dicts of label value to value."""
+        data = {'stage': self.stage, 'started': self.started}
+        for name, kind, help_text in metric_types:
+            if name not in self.values:
+                continue
+            values = self.values[name]
+            if list(values) == [()]:
+                data[name] = values[()]
+            else:
+                data[name] = {labels[0][1]: value for labels, value in sorted(values.items())}
+        return data
+
+    def write(self, metrics_dir):
+        """Finish the run and write catss_<stage>.prom and catss_<stage>.json to metrics_dir.
+
+        The files are written to a temporary file first and then renamed,
+        so that collectors never read a partly written file.
+        """
+        self.finish()
+        metrics_dir = Path(metrics_dir)
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        outputs = (
+            ('.prom', self.prometheus()),
+            ('.json', json.dumps(self.json(), indent=1, ensure_ascii=False)),
+        )
+        for suffix, text in outputs:
+            path = metrics_dir.joinpath(f'{prefix}{self.stage}{suffix}')
+            tmp_path = path.with_name(path.name + '.tmp')
+            tmp_path.write_text(text, encoding='UTF8')
+            tmp_path.replace(path)
@@ -0,0 +1,195 @@
+"""
+Use MorphIndex.build to index the morphology exports, and its query,
+find and count methods to search them by their features, e.g.
+
+    index = MorphIndex.build()
+    index.count(tense='aorist', voice='passsive', mood='ptcp', books='pentateuch')
+    index.find(case='gen', number='pl', gender='f', typ='noun', books='ISA')
+
+The tokens of all books are numbered in the order of the exports. For
+every value of a feature the ids of its tokens are kept, and for the
+features with few values also a bitset: a Python int with bit i set for
+token i. A query is answered by AND-ing the bitsets of the features and
+OR-ing the bitsets of alternative values, and restricting the result to
+the token ranges of books or verses. Bitsets of rare values, e.g. of
+lexemes, are made from their ids when first queried.
+"""
+
+import json
+import regex
+import collections
+from array import array
+from pathlib import Path
+from references import ref_key
+
+# features for which a bitset of every value is built up front
+bitset_features = ('typ', 'styp', 'case', 'number', 'gender', 'degree', 'tense', 'voice', 'mood', 'person')
+
+# features for which only the ids of the tokens are kept
+posting_features = ('lexeme', 'morph_code')
+
+# names for groups of books
+book_groups = {
+    'pentateuch': ('GEN', 'EXO', 'LEV', 'NUM', 'DEU'),
+}
+
+nonzero_byte = regex.compile(b'[^\x00]')
+
+def bitset(ids, n):
+    """Return the bitset of token ids, for n tokens."""
+    data = bytearray((n + 7) // 8)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, 'little')
+
+def span(start, end):
+    """Return the bitset of the tokens start to end (exclusive)."""
+    return (1 << end) - (1 << start)
+
+def bitset_ids(mask):
+    """Return the token ids of a bitset, in order."""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    ids = []
+    # skip the empty stretches of the bitset a byte at a time
+    for match in nonzero_byte.finditer(data):
+        i = match.start()
+        byte = data[i]
+        ids.extend(i * 8 + bit for bit in range(8) if byte >> bit & 1)
+    return ids
+
+class MorphIndex:
+    """Bitset index over the features of the morphology tokens."""
+
+    def __init__(self, words, refs, verse_starts, postings):
+        self.words = words                  # feature dict of every token
+        self.refs = refs                    # ref of every verse
+        self.verse_starts = verse_starts    # id of the first token of every verse, plus the end
+        self.postings = postings            # (feature, value) -> token ids
+        self.n = len(words)
+
+        self.verse_index = {ref: i for i, ref in enumerate(refs)}
+        self.books = {}     # book -> (first token, end token)
+        self.book_verses = collections.defaultdict(list)    # book -> [(key, verse index)]
+        for i, ref in enumerate(refs):
+            book = ref.split()[0]
+            start, end = self.verse_starts[i], self.verse_starts[i+1]
+            first, last = self.books.get(book, (start, end))
+            self.books[book] = (min(first, start), max(last, end))
+            try:
+                self.book_verses[book].append((ref_key(ref, 'mlxx'), i))
+            except ValueError:
+                continue
+        for verses in self.book_verses.values():
+            verses.sort()
+
+        self.bitsets = {
+            key: bitset(ids, self.n) for key, ids in postings.items()
+                if key[0] in bitset_features
+        }
+
+    @classmethod
+    def build(cls, json_dir='JSON'):
+        """Index the morphology exports in json_dir/morphology."""
+        words = []
+        refs = []
+        verse_starts = array('I')
+        postings = collections.defaultdict(lambda: array('I'))
+        features = bitset_features + posting_features
+        for file in sorted(Path(json_dir).joinpath('morphology').glob('*.json')):
+            with open(file, encoding='UTF8') as infile:
+                book_data = json.load(infile)
+            for ref, *verse_words in book_data:
+                refs.append(ref)
+                verse_starts.append(len(words))
+                for word in verse_words:
+                    for feature in features:
+                        if feature in word:
+                            postings[(feature, word[feature])].append(len(words))
+                    words.append(word)
+        verse_starts.append(len(words))
+        return cls(words, refs, verse_starts, dict(postings))
+
+    def values(self, feature):
+        """Return a Counter of the values of a feature."""
+        return collections.Counter({
+            value: len(ids) for (f, value), ids in self.postings.items() if f == feature
+        })
+
+    def value_bitset(self, feature, value):
+        key = (feature, value)
+        if key not in self.bitsets:
+            self.bitsets[key] = bitset(self.postings.get(key, ()), self.n)
+        return self.bitsets[key]
+
+    def books_bitset(self, books):
+        """Return the bitset of the tokens of a book, a group of books or a list of them."""
+        if isinstance(books, str):
+            books = book_groups.get(books, (books,))
+        mask = 0
+        for book in books:
+            if book not in self.books:
+                raise KeyError(f'no morphology for book {book}')
+            mask |= span(*self.books[book])
+        return mask
+
+    def range_bitset(self, start, end):
+        """Return the bitset of the tokens of the verses start to end, e.g. ISA 1:1 to ISA 5:7."""
+        book = start.split()[0]
+        if end.split()[0] != book:
+            raise ValueError(f'{start} and {end} are in different books')
+        first, last = ref_key(start, 'mlxx'), ref_key(end, 'mlxx')
+        mask = 0
+        for key, i in self.book_verses[book]:
+            if first <= key <= last:
+                mask |= span(self.verse_starts[i], self.verse_starts[i+1])
+        return mask
+
+    def query(self, books=None, start=None, end=None, **features):
+        """Return the bitset of the tokens which match all features.
+
+        Args:
+            books: optional book, name of a group of books (see
+                book_groups) or list of books to restrict to
+            start, end: optional refs of the first and last verse to restrict to
+            features: feature values, e.g. tense='aorist'; a tuple, list or
+                set of values matches any of them, e.g. case=('gen', 'dat')
+
+        Returns:
+            int bitset of token ids; see find and count
+        """
+        mask = span(0, self.n)
+        for feature, values in features.items():
+            if isinstance(values, str):
+                values = (values,)
+            alternatives = 0
+            for value in values:
+                alternatives |= self.value_bitset(feature, value)
+            mask &= alternatives
+        if books is not None:
+            mask &= self.books_bitset(books)
+        if start is not None:
+            mask &= self.range_bitset(start, end or start)
+        return mask
+
+    def find(self, books=None, start=None, end=None, **features):
+        """Return the ids of the tokens matching a query; see query."""
+        return bitset_ids(self.query(books, start, end, **features))
+
+    def count(self, books=None, start=None, end=None, **features):
+        """Return the number of tokens matching a query; see query."""
+        return bin(self.query(books, start, end, **features)).count('1')
+
+    def token_ref(self, i):
+        """Return the ref of the verse of a token."""
+        lo, hi = 0, len(self.refs)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.verse_starts[mid+1] <= i:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.refs[lo]
+
+    def tokens(self, ids):
+        """Return (ref, word) of token ids."""
+        return [(self.token_ref(i), self.words[i]) for i in ids]
@@ -0,0 +1,711 @@
+"""
+Use the parse_parallel function to parse the patched CATSS parallel
+files into structured data, and export_parallel to write it out as JSON.
+
+Each line contains 2-3 columns of data. Those columns contain original
+language text and markup. The parser draws a strong distinction between
+text and markup, and seeks to separate the two. See the notebook in
+dev/generate_parallel.ipynb for a fuller description of the strategy.
+"""
+
+import sys
+import json
+import hashlib
+import inspect
+import regex
+import functools
+import collections
+from multiprocessing import Pool
+from pathlib import Path
+import regex_patterns as repatts
+import beta_code
+import references
+import transcription
+from pattern_registry import get_patterns, pattern_hash
+from metrics import StageMetrics
+from references import normalize_ref, book_selection, selects
+from tag_registry import encode_verses, decode_verses
+from transcription import utf8_hebrew, utf8_greek
+
+# compile the patterns for matching
+
+# original language text
+hchars = repatts.hchars
+gchars = repatts.gchars
+hb_patt = regex.compile(f' *[{hchars}]+ *')
+grk_patt = regex.compile(f' *[{gchars}]+ *')
+discard = regex.compile(repatts.discard)
+
+# markup text
+common_tc_patts = get_patterns('common_tc')
+hb_tc_patts = get_patterns('hebrew')
+gk_tc_patts = get_patterns('greek')
+
+def normalize_element(element):
+    return element.strip()
+
+def parse_context(context, markup_patts, text_patt, position=0, column_list=[], markups=set(),
+                  ident='', debug=[], timeout=None):
+    """Parse a context of text and markup in structured JSON.
+
+    A timeout in seconds can be given to bound each individual match;
+    a pathological context then raises a TimeoutError instead of hanging.
+    """
+
+    elements = []
+
+    def report(*messages):
+        debug.extend(ident+m for m in messages)
+
+    report(f'analyzing context: `{context}`')
+
+    while context and (position < len(context)):
+
+        matched = False # track matches in the loop
+
+        for patt, kind, tag, desc, indices in markup_patts:
+
+            # process markup
+            if match := patt.match(context, position, timeout=timeout):
+
+                # run any optional formats on tag
+                tag = tag.format(**{k:(match.groups()[i] or '') for k, i in indices.items()})
+
+                # tag markup within the context
+                if kind == 'con':
+                    report(f'  markup pattern match @ {position}: {patt.pattern}', f'    match: `{match.group(0)}`')
+                    markups.add(tag)
+
+                # run parser recursively for captured sub-contexts
+                elif kind == 'cap':
+                    report(f'  markup pattern match @ {position}: {patt.pattern}')
+                    subcontext = match.groups()[indices['txt']]
+                    elements.extend(
+                            parse_context(
+                                subcontext, markup_patts, text_patt, markups={tag}, column_list=[],
+                                ident=ident+'    ', debug=debug, timeout=timeout,
+                            )
+                    )
+
+                # deal with substitution markups
+                elif kind == 'sub':
+                    elements.append(('', {tag}))
+
+                else:
+                    raise Exception(f'PATTERN ERROR for {patt}: NO KIND')
+
+                # advance the position
+                position = match.end()
+                matched = True
+                break
+
+        if not matched:
+
+            # process original language text
+            if match := text_patt.match(context, position, timeout=timeout):
+                elements.append((match.group(), set()))
+                report(f'  text match @ {position}: `{match.group(0)}`')
+                position = match.end()
+
+            # process discard strings
+            elif match := discard.match(context, position, timeout=timeout):
+                report(f'  discarding string @ {position}: `{match.group(0)}`')
+                position = match.end()
+
+            # no match found, raise a syntax error
+            elif position < len(context):
+                error = f'SYNTAX ERROR AT POSITION {position} `{context[position]}` i.e. `{context[position-1:position+2]}` in `{context}`'
+                raise Exception(error)
+
+    # we're done
+    # apply contextual markup to all elements
+    # and return the goods
+    if elements:
+        for element, markup_set in elements:
+            markup_set |= markups
+            column_list.append((normalize_element(element), markup_set))
+    elif markups:
+        column_list.append(('', markups))
+
+    # recursion depth limit
+    if len(column_list) >= 100:
+        error = 'RECURSION DEPTH LIMIT REACHED!'
+        report('\n'.join('\t'+c for c in column_list))
+        raise Exception(error)
+
+    return column_list
+
+# -- regex patterns --
+continued_column = regex.compile(r'[^\s]+.*#\s*$') # '#' at end of col preceded by some non-space char
+content = regex.compile(r'.*[^\s].*') # string has some non-space char (content)
+
+def line_is_continued(col1, col2):
+    """Return boolean whether any column in a line is continued in next line"""
+    if continued_column.match(col1) or continued_column.match(col2):
+        return True
+    else:
+        return False
+
+def is_dataline(line):
+    """Return boolean on whether a line contains data content"""
+    return all([
+        content.match(line),
+        not repatts.ref_string.match(line)
+    ])
+
+def get_continued_columns(lines, counter):
+    """Recursively retrieve data-lines continued on next line (marked with #).
+
+    The function recursively retrieves subsequent lines if a starting line
+    is marked with a continuation marker (#). Each line that is retrieved
+    must be split into its columns, and those columns in turn must be
+    checked for continuation markers. This is done recursively until there
+    is no continuation marker found. The function retrieves the lines using
+    the current index position; it advances the index by adding 1 each time.
+    It yields all additional columns it finds as 2-tuples.
+    """
+    line = lines[counter]
+    if is_dataline(line):
+        heb_col, grk_col = line.split('\t')
+        if line_is_continued(heb_col, grk_col):
+            counter += 1
+            next_cols = lines[counter].split('\t')
+            yield next_cols
+            yield from get_continued_columns(lines, counter) # recursive call here
+
+def convert_transcriptions(columns):
+    """Convert transcription text to utf8"""
+    heba, hebb, grk = columns
+    heba = [(utf8_hebrew(t),tuple(sorted(m))) for t,m in heba]
+    hebb = [(utf8_hebrew(t),tuple(sorted(m))) for t,m in hebb]
+    grk =  [(utf8_greek(t),tuple(sorted(m))) for t,m in grk]
+    return [heba, hebb, grk]
+
+# grammar and transcription of each kind of column
+column_kinds = {
+    'hebrew': (hb_tc_patts, hb_patt, utf8_hebrew),
+    'greek': (gk_tc_patts, grk_patt, utf8_greek),
+}
+
+# maximum number of distinct column strings kept by parse_column
+column_cache_size = 2**16
+
+@functools.lru_cache(maxsize=column_cache_size)
+def parse_column(kind, context, timeout=None):
+    """Parse a column string and convert it to utf8, memoized.
+
+    Many column strings, e.g. KAI\\ or --- '', recur throughout the
+    corpus, so their parse is kept in a bounded cache. The parse is
+    returned as a tuple of (text, tags) tuples, which is safe to share;
+    the tags are sorted, so that the parse doesn't depend on the hash
+    seed of the process.
+    Failures aren't cached; see trace_columns for the debug trace of a
+    failing line. See column_cache_info for the hit rate of the cache.
+
+    Args:
+        kind: 'hebrew' or 'greek'
+        context: the raw column string
+        timeout: optional number of seconds allowed for any single regex match
+    """
+    markup_patts, text_patt, convert = column_kinds[kind]
+    elements = parse_context(
+        context, markup_patts, text_patt, column_list=[], markups=set(),
+        debug=[], timeout=timeout,
+    )
+    return tuple((convert(text), tuple(sorted(markups))) for text, markups in elements)
+
+def column_cache_info():
+    """Return the hits, misses and size of the cache of parse_column."""
+    return parse_column.cache_info()
+
+def trace_columns(file_name, position, line, columns, timeout=None):
+    """Parse the columns of a line with a debug trace of the parser.
+
+    Args:
+        file_name, position, line: the line, for the head of the trace
+        columns: list of (context, kind) of the columns; see column_kinds
+        timeout: optional number of seconds allowed for any single regex match
+
+    Returns:
+        tuple of (column_parsings, debug, message). column_parsings is
+        None if a column failed to parse, in which case debug is the
+        trace; message is a warning to report if a match timed out.
+    """
+    debug = [file_name, str(position), f'line: {line}', '-'*30]
+    column_parsings = []
+    for context, kind in columns:
+        markup_patts, text_patt, convert = column_kinds[kind]
+        try:
+            this_parse = parse_context(
+                context,
+                markup_patts,
+                text_patt,
+                debug=debug,
+                column_list=[],
+                markups=set(),
+                timeout=timeout,
+            )
+            column_parsings.append(this_parse)
+        except TimeoutError:
+            debug.append(f'TIMEOUT: a match exceeded {timeout}s; line quarantined')
+            return None, debug, f'\t**WARNING: QUARANTINED LINE {position} AFTER TIMEOUT**: {line}'
+        except:
+            einfo = ' '.join(str(e) for e in list(sys.exc_info())[:2])
+            debug.append(einfo)
+            return None, debug, None
+    return convert_transcriptions(column_parsings), None, None
+
+# books which are not parsed
+non_canon = {'17.1Esdras.par', '22.Ps151.par', '27.Sirach.par'}
+
+def verse_chunks(lines, chunk_size=None):
+    """Split the lines of a book into (start, end) ranges of whole verses.
+
+    A new range is started at the first verse reference after every
+    chunk_size lines; without a chunk_size the book is a single range.
+    """
+    bounds = [0]
+    if chunk_size:
+        for i, line in enumerate(lines):
+            if i - bounds[-1] >= chunk_size and repatts.ref_string.match(line):
+                bounds.append(i)
+    bounds.append(len(lines))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def parse_lines(file_name, lines, start=0, end=None, timeout=None):
+    """Parse a range of lines of a .par file into verses
+
+    Args:
+        file_name: name of the file, for the debug traces
+        lines: all lines of the file; positions in the traces refer to these
+        start: index of the first line to parse
+        end: index after the last line to parse, defaults to all lines
+        timeout: optional number of seconds allowed for any single regex match
+
+    Returns:
+        tuple of (verses, errors, n_parsed, messages). The last verse is
+        the one still open at the end of the range, which may be empty.
+        The messages are warnings to report.
+    """
+    verses = []
+    verse_data = []
+    errors = []
+    messages = []
+    n_parsed = 0
+    position = start
+    end = len(lines) if end is None else end
+
+    while position < end:
+
+        line = lines[position]
+
+        # detect a new verse at verse reference string
+        if repatts.ref_string.match(line):
+
+            # normalize ref
+            line = normalize_ref(line)
+
+            # store last verse, make space for new one, store new one
+            if verse_data:
+                verses.append(verse_data)
+                verse_data = []
+            verse_data.append(line)
+
+        elif line:
+
+            # extract the two columns
+            heb_col, grk_col = line.split('\t')
+
+            # NB: that for Sirach the Hebrew columns can sometimes
+            # be split several ways since there are numerous Hebrew
+            # sources, deriving from various manuscripts
+            # the sources are indicated by a following number;
+            # thus, it may be possible to split along stand-alone integers
+            # to divide up the text
+
+            # collect parts of the columns continued on next line(s) in doc
+            # this is done recursively to ensure all lines are retrieved
+            cont_cols = list(get_continued_columns(lines, position))
+            for hb_cc, gk_cc in cont_cols:
+                position += 1
+                heb_col += hb_cc
+                grk_col += gk_cc
+
+            # seperate heb col a and b (optional)
+            if '=' in heb_col:
+                heb_colA, heb_colB = heb_col.split('=', 1)
+            else:
+                heb_colA = heb_col
+                heb_colB = ''
+
+            # remove column continuation marker since it's already been handled
+            heb_colA = heb_colA.replace('#', '')
+            heb_colB = heb_colB.replace('#', '')
+            grk_col = grk_col.replace('#', '')
+
+            # columns are now ready for the parser
+            # feed into the parser, and if there is a problem
+            # record it and move on
+            columns = [(heb_colA, 'hebrew'), (heb_colB, 'hebrew'), (grk_col, 'greek')]
+            try:
+                column_parsings = [list(parse_column(kind, context, timeout)) for context, kind in columns]
+            except Exception:
+                # parse the failing line again without the cache,
+                # to record the debug trace of its columns
+                column_parsings, debug, message = trace_columns(
+                    file_name, position, line, columns, timeout
+                )
+                if debug:
+                    errors.append(debug)
+                if message:
+                    messages.append(message)
+
+            if column_parsings:
+                verse_data.append(column_parsings)
+                n_parsed += 1
+            else:
+                verse_data.append([['PARSING_ERROR'], ['PARSING_ERROR'], ['PARSING_ERROR']])
+
+        # it's an empty line; move on
+        else:
+            pass
+
+        position += 1
+
+    verses.append(verse_data)
+    return verses, errors, n_parsed, messages
+
+def read_lines(path):
+    """Read the lines of a file, cached until the file changes."""
+    stat = Path(path).stat()
+    return _read_lines(str(path), stat.st_mtime_ns, stat.st_size)
+
+@functools.lru_cache(maxsize=4)
+def _read_lines(path, mtime, size):
+    return Path(path).read_text().split('\n')
+
+class LineSpan:
+    """The lines start to end of a book, indexed by their line numbers in
+    the book; for sending only the lines of a batch to a worker."""
+
+    def __init__(self, lines, start, end):
+        self.start = start
+        self.lines = lines[start:end]
+
+    def __getitem__(self, i):
+        if i < self.start:
+            raise IndexError(f'line {i} is before the span starting at {self.start}')
+        return self.lines[i - self.start]
+
+    def __len__(self):
+        return self.start + len(self.lines)
+
+def span_end(lines, end):
+    """Return the end of the lines a batch ending at end may read: the
+    lines up to and including the next verse reference, since the
+    columns of the last line of the batch may be continued on them."""
+    while end < len(lines) and not repatts.ref_string.match(lines[end]):
+        end += 1
+    return min(end + 1, len(lines))
+
+def _parse_verses(args):
+    """Parse a batch of verses of a book; used as the job of a worker process.
+
+    The grammars are compiled when this module is imported, i.e. once
+    per worker, and each worker reads a book only once for all of its batches.
+    The source of the book is its path, or a LineSpan of the lines of the
+    batch if they are in memory.
+
+    Returns:
+        tuple of a list of the results of parse_lines for each (start, end)
+        range, and the (hits, misses) of the column cache while parsing them
+    """
+    name, source, ranges, timeout = args
+    lines = read_lines(source) if isinstance(source, (str, Path)) else source
+    before = column_cache_info()
+    results = [parse_lines(name, lines, start, end, timeout) for start, end in ranges]
+    after = column_cache_info()
+    return results, (after.hits - before.hits, after.misses - before.misses)
+
+# bump when the format of the cached verses changes
+cache_version = 1
+
+# modules whose code shapes the cached verses besides the patterns: the
+# conversion of the transcriptions and the normalization of the refs
+cache_modules = (beta_code, transcription, references)
+
+def cache_functions():
+    """Return the functions of this module which shape the cached verses."""
+    return (
+        normalize_element, parse_context, line_is_continued, is_dataline,
+        get_continued_columns, convert_transcriptions, parse_column,
+        trace_columns, parse_lines, dump_verse, load_verse,
+    )
+
+def cache_key():
+    """Return the key which all cached verses of a book must share.
+
+    The key covers the patterns, the text patterns built from regex_patterns,
+    the code of cache_modules and of the parsing functions of this module,
+    and cache_version, so that cached verses are parsed again when any of
+    them changes.
+    """
+    code = hashlib.sha1()
+    for module in cache_modules:
+        code.update(Path(module.__file__).read_bytes())
+    for function in cache_functions():
+        code.update(inspect.getsource(function).encode('UTF8'))
+    for patt in (hb_patt, grk_patt, discard):
+        code.update(patt.pattern.encode('UTF8'))
+    return f'{pattern_hash("hebrew", "greek")} code {code.hexdigest()[:12]} version {cache_version}'
+
+def verse_hash(lines):
+    """Return the hash of the raw lines of a verse."""
+    return hashlib.sha1('\n'.join(lines).encode('UTF8')).hexdigest()
+
+def batch_ranges(ranges, chunk_size):
+    """Group (start, end) ranges into batches of about chunk_size lines."""
+    batches = []
+    size = 0
+    for start, end in ranges:
+        if not batches or chunk_size and size >= chunk_size:
+            batches.append([])
+            size = 0
+        batches[-1].append((start, end))
+        size += end - start
+    return batches
+
+def dump_verse(result, start):
+    """Make the parse of a verse JSON serializable, with positions relative to its start."""
+    verses, errors, n_parsed, messages = result
+    errors = [[e[0], str(int(e[1]) - start)] + e[2:] for e in errors]
+    return [list(verses), errors, n_parsed]
+
+def load_verse(data, start):
+    """Restore the parse of a verse from the cache, as returned by parse_lines."""
+    verses, errors, n_parsed = data
+    verses = [
+        [item if isinstance(item, str) else [
+            [e if isinstance(e, str) else (e[0], tuple(e[1])) for e in column]
+                for column in item
+        ] for item in verse]
+            for verse in verses
+    ]
+    errors = [[e[0], str(int(e[1]) + start)] + e[2:] for e in errors]
+    return verses, errors, n_parsed, []
+
+def parse_parallel(data_dir='source/patched', silent=False, timeout=None,
+                   processes=None, chunk_size=5000, cache_dir=None, metrics_dir=None,
+                   tags=None, patched=None, books=None):
+    """Parse the patched CATSS parallel files into nested lists
+
+    The parse of every verse is cached together with a hash of its raw
+    lines, so that a new run only reparses the verses which changed, or
+    all verses if the parsing patterns changed. The verses to parse are
+    batched into chunks which can be parsed by a pool of worker processes.
+    The verses are merged in their canonical order, so that the output is
+    identical to a serial run.
+
+    Args:
+        data_dir: directory containing the patched .par files
+        silent: boolean, False if you want to print status updates
+        timeout: optional number of seconds allowed for any single regex
+            match; lines which exceed it are logged and quarantined as
+            parsing errors rather than stalling the run
+        processes: number of worker processes to parse with;
+            None parses the books serially in this process
+        chunk_size: approximate number of lines per chunk, so that
+            big books like Psalms and Jeremiah are spread over the workers
+        cache_dir: directory for the cached verses of every book; None
+            (the default) uses data_dir/parse_cache, and False parses
+            every verse without a cache. Books given as patched aren't
+            cached unless a cache_dir is given.
+        metrics_dir: optional directory to write the metrics of the run to;
+            see metrics.py
+        tags: optional tag_registry.TagRegistry; if given, the tags of every
+            token are given as a code of the registry instead of a tuple.
+            The tokens are encoded in canonical order, so the codes don't
+            depend on the number of processes.
+        patched: optional dict of file name to lines, as returned by
+            patch_catss.patch_parallel, to parse instead of the files in
+            data_dir; e.g. for a run without a round trip to disk:
+
+                patched = patch_parallel('source', output_dir=None)
+                para_data, errors, book_errors = parse_parallel(patched=patched)
+
+        books: optional book code or list of codes, e.g. ['GEN', 'PSA'],
+            to parse only their files; see references.book_selection
+
+    Returns:
+        tuple of (para_data, errors, book_errors). para_data is a list of
+        books, each a list headed by the book name followed by verses.
+        errors is a list of debug traces for every line which failed to
+        parse, and book_errors is a Counter of errors per book.
+    """
+
+    def report(msg):
+        if not silent:
+            print(msg)
+
+    # finalized parallel data goes here
+    para_data = []
+    errors = []
+    book_errors = collections.Counter()
+    n_parsed = 0
+    metrics = StageMetrics('parse')
+
+    use_cache = cache_dir is not False and (patched is None or cache_dir is not None)
+    if use_cache:
+        cache_dir = Path(cache_dir or Path(data_dir).joinpath('parse_cache'))
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        key = cache_key()
+
+    # split the books into verses and batch the verses which aren't cached
+    files = []
+    jobs = []
+    if patched is None:
+        sources = [(file.name, file) for file in sorted(Path(data_dir).glob('*.par'))]
+    else:
+        sources = sorted((name, lines) for name, lines in patched.items() if name.endswith('.par'))
+
+    books = book_selection(books)
+    for name, source in sources:
+
+        if not selects(name, books):
+            continue
+
+        if name in non_canon:
+            report(f'skipping {name}')
+            continue
+
+        if patched is None:
+            lines = read_lines(source)
+            metrics.count('bytes_read_total', source.stat().st_size)
+        else:
+            lines = source
+        metrics.count('lines_processed_total', len(lines))
+
+        ranges = verse_chunks(lines, 1)
+        hashes = [verse_hash(lines[start:end]) for start, end in ranges]
+        cached = {}
+        cache_file = use_cache and cache_dir.joinpath(name + '.json')
+        if cache_file and cache_file.exists():
+            cache_data = json.loads(cache_file.read_text())
+            if cache_data['key'] == key:
+                cached = cache_data['verses']
+
+        changed = [r for r, h in zip(ranges, hashes) if h not in cached]
+        batches = batch_ranges(changed, chunk_size)
+        files.append((name, ranges, hashes, cached, len(batches)))
+        if patched is not None:
+            # send the workers only the lines of their batch, up to the
+            # next verse reference, which continued columns may reach
+            jobs.extend(
+                (name, LineSpan(lines, batch[0][0], span_end(lines, batch[-1][1])), batch, timeout)
+                    for batch in batches
+            )
+        else:
+            jobs.extend((name, source, batch, timeout) for batch in batches)
+        metrics.count('verses_reparsed_total', len(changed))
+
+    # process files
+    report(f'beginning analysis of books, {len(jobs)} chunks to parse\n')
+    if processes:
+        with Pool(processes) as pool:
+            results = pool.map(_parse_verses, jobs, chunksize=1)
+    else:
+        results = [_parse_verses(job) for job in jobs]
+    hits = sum(counts[0] for batch, counts in results)
+    misses = sum(counts[1] for batch, counts in results)
+    metrics.count('column_cache_hits_total', hits)
+    metrics.count('column_cache_misses_total', misses)
+    results = [batch for batch, counts in results]
+
+    # merge the parsed and cached verses in canonical order
+    results = iter(results)
+    for name, ranges, hashes, cached, n_batches in files:
+
+        report(f'parsing {name}...')
+
+        parsed = collections.deque()
+        for i in range(n_batches):
+            parsed.extend(next(results))
+
+        book_data = [normalize_ref(name)]
+        new_cache = {}
+        for i, ((start, end), digest) in enumerate(zip(ranges, hashes)):
+            if digest in cached:
+                result = load_verse(cached[digest], start)
+                new_cache[digest] = cached[digest]
+            else:
+                result = parsed.popleft()
+                # verses with timeouts are parsed again on the next run
+                if not result[3]:
+                    new_cache[digest] = dump_verse(result, start)
+
+            verses, verse_errors, verse_parsed, messages = result
+            for message in messages:
+                report(message)
+
+            # the open verse of a range is only kept at the end of
+            # the book, or if it has content
+            if i < len(ranges) - 1 and not verses[-1]:
+                verses.pop()
+            if tags is not None:
+                verses = encode_verses(verses, tags)
+            book_data.extend(verses)
+            if verse_errors:
+                errors.extend(verse_errors)
+                book_errors[name] += len(verse_errors)
+            n_parsed += verse_parsed
+
+        if use_cache and (n_batches or len(new_cache) != len(cached)):
+            cache_data = {'key': key, 'verses': new_cache}
+            cache_dir.joinpath(name + '.json').write_text(json.dumps(cache_data, ensure_ascii=False))
+
+        para_data.append(book_data)
+        metrics.count('verses_total', len(book_data) - 1)
+        metrics.count('parse_errors_total', book_errors[name], book=name)
+        report(f'\tbook parsed.')
+
+    report('DONE')
+    report(f'\tn-parsed: {n_parsed}')
+    report(f'\tn-errors: {len(errors)}')
+    if hits + misses:
+        report(f'\tcolumn cache hit rate: {hits / (hits + misses):.1%}')
+    report('Errors by book:')
+    for book, count in book_errors.items():
+        report(f'\t{book} - {count}')
+
+    if metrics_dir:
+        metrics.write(metrics_dir)
+
+    return para_data, errors, book_errors
+
+def show_errors(errors):
+    for error in errors:
+        print('\n'.join(error))
+        print()
+
+def export_parallel(para_data, output_dir='JSON/parallel', metrics_dir=None, tags=None):
+    """Write parsed parallel books to JSON, one file per book.
+
+    Metrics of the export are written to metrics_dir if it is given.
+    If the tags of the tokens are codes, give their TagRegistry as
+    tags to write them as tag names.
+    """
+    metrics = StageMetrics('export')
+    out_dir = Path(output_dir)
+    out_dir.mkdir(exist_ok=True)
+    for book_data in para_data:
+        file_name = out_dir.joinpath(Path(book_data[0] + '.json'))
+        file_data = book_data[1:]
+        if tags is not None:
+            file_data = decode_verses(file_data, tags)
+        with open(file_name, 'w', encoding='UTF8') as outfile:
+            json.dump(file_data, outfile, ensure_ascii=False)
+        metrics.count('verses_total', len(file_data))
+        metrics.count('bytes_written_total', file_name.stat().st_size)
+        metrics.count('files_written_total')
+    if metrics_dir:
+        metrics.write(metrics_dir)
@@ -1,13 +1,504 @@
-import re
+import regex
+import collections
 from pathlib import Path
 from regex_patterns import ref_string, hchars, gchars
 from datetime import datetime
+from provenance import build_provenance, write_provenance
+from pattern_registry import get_patterns
+from metrics import StageMetrics
+from references import book_selection, selects
+
+# -- Manual Edits --
+
+# manual corrections to the morphology files; see parallel_edits below
+# for a description of the format
+morpho_edits = [
+    ('01.Gen.1.mlxx', 12540, 'ADI2P', "KAQI/SATE                VA  AAD2P  I(/ZW            KATA"),
+    ('05.Num.mlxx', 24859, 'SONTAIVC', "SUGKATAKLHRONOMHQH/SONTAI VC  APS2S  KLHRONOME/W      SUN   KATA"),
+]
+
+# manual corrections loaded into tuples consisting of:
+# (file, line_number, regex condition, new line)
+# where line numbers refer to the original line numbers in the docs,
+# the regex condition is a pattern to search all in the line to confirm the
+# change (a safeguard for erroneous changes or for when the underlying data
+# changes). All of the changes are enacted in a large loop.
+# If filename is left empty, the previous filename is used
+# NB: linenumbers are given as 0-indexed
+parallel_edits = [
+    ('06.JoshB.par', 983, 'MRY KAI', 'W/)T H/GRG$Y ^ =W/)T W/H/)MRY\t KAI\\ TO\\N AMORRAI=ON '),
+    ('', 1366, '\.kb # KAI', 'W/H/KHNYM =W/H/)BNYM .m .kb #\t KAI\\ OI( LI/QOI '),
+    ('', 3737, '12 E', 'W/YC+YRW =;W/YC+YDW .rd <9.12>\t E)PESITI/SANTO {d} KAI\\ H(TOIMA/SANTO'),
+    ('', 9517, '<19.49> E', "--+ '' =;L/GBWLWT/YHM <19.49>\t E)N TOI=S O(RI/OIS AU)TW=N "),
+    ('', 2006, '\t<6.20>\t', '-+ =;H/(YR/H <6.20>\tEI)S TH\\N PO/LIN '),
+    ('', 9515, '\t<19\.49>\t', "--+ '' =;M/XLQ <19.49>\tDIAMERI/SAS "),
+    ('', 7104, 'RNA.*\t', 'W/DNH =:W/RNH .dr\tKAI\ RENNA'),
+    ('', 1659, '----', "M/MCRYM\t--- ''"),
+    ('', 4673, '{=51}', "W/YMYT/M\t--- <=51>"), # Normalize this to a note
+    ('', 10235, '{TOU', "--+\tSALAMIN {d} {...TOU= SWTHRI/OU}"),
+    ('', 11304, 'A\)PO\|', "M/CPWN\tA)PO\ BORRA= [31] "),
+    ('07.JoshA.par', 645, ' \)PO', "M/&M)L\tA)PO\ A)RISTERW=N"),
+    ('01.Genesis.par', 9550, "--\+ ' ", "--+ '' =;W/BH <24.14>\tKAI\ E)N TOU/TW|"),
+    ('', 9552, "--\+ ' ", "--+ '' =;KY <24.14>\tO(/TI"),
+    ('', 9557, '=:ABRHM', "--+ =:)BRHM\tABRAAM"),
+    ('', 2316, '--= ', "--+ '' =H/BHMH\tTW=N KTHNW=N"),
+    ('', 12939, '\.a', "B/GLL/K =?B/RGL/YK .s <^30.30\tTH=| SH=| ^ EI)SO/DW|"), # typo: .a for .s
+    ('', 10822, '}}', "NG(NW/K\t{...H(MEI=S} {...SE} ^ E)BDELUCA/MEQA"),
+    ('17.1Esdras.par', 477, 'CC35\.24', 'W/Y(BYR/HW\tKAI\\ {..^A)PE/STHSAN AU)TO\\N} [cc35.24]'),
+    ('', 6514, 'LI.*\t', ")L(ZR =:)LYW(NY\tE)LIWNA=S [e10.31]"),
+    ('', 2857, '\[e2 10', "$$ M)WT )RB(YM W/$NYM =+\tE(CAKO/SIOI TESSARA/KONTA O)KTW/ [e2.10]"),
+    ('', 772, 'SAS 3', ")$R H$BY(/W\t{...O(RKISQEI\S}{d} E)PIORKH/SAS #"),
+    ('', 4525, 'O.I\(', "BNY GLWT/)\tOI( E)K TH=S AI)XMALWSI/AS [e6.16]"), # remove unknown char
+    ('27.Sirach.par', 4843, '{\.\.}', '[..]\tA)PO\\'),
+    ('', 3697, '\s\s\s\s\s', "#\tA(MARTWLOU=} [7]}"),
+    ('', 16898, ' no id\.', "NSH[..] 4\t--- ''<c - no id.>"), # put weird note in brackets
+    ('', 14099, '{\.\.\.\)', "<<KY>> 12\t{...}"),
+    ('11.1Sam.par', 2096, 'O\t', "--+ '' =KPWT\tOI( KARPOI\\"),
+    ('', 2097, 'T\t', "--+ '' =;YD/YW\tTW=N XEIRW=N AU)TOU="),
+    ('12.2Sam.par', 8592, 'EI\)S\)', "H/&DH =;H/Y(R\t{..pEI)S} TO\\N DRUMO\\N"),
+    ('13.1Kings.par', 15936, 'EI\)S}\t', "W/YBW)\tKAI\ EI)SH=LQEN {...EI)S}"),
+    ('', 2987, 'GY', "MCRYM\tAI)GU/PTOU [2.46k,10.26a]"),
+    ('14.2Kings.par', 4735, '{c}\? ', "YNHG\tE)GE/NETO {c?H)=GEN}"),
+    ('40.Isaiah.par', 1855, 'E\t', "B/$LKT =;M$LKT <q1a>\tE)KPE/SH|"),
+    ('', 11657, '_', "B/M(LWT\t--- ?"),
+    ('', 18586, '\.\.\.TO', "W/L/QDW$\tTO\ A(/GION {d} {..^KAI\ DIA\}{..^TO|N"),
+    ('', 11769, '=XWHa,XYY', "YXYW =@XWHa =@XYY\tA)NHGGE/LH {d} {...KAI\ E)CHGEIRA/S}"),
+    ('26.Job.par', 2245, 'OU\)}\t', "W/L)\t{..^OU)}DE\\"),
+    ('', 2063, '=a', "$DY =@$/DYa\tO( TA\ PA/NTA POIH/SAS"),
+    ('', 7441, '{#}', "YMYN\tDECIW=N {---%}"),
+    ('', 7927, 'S\.\.\^', "W/T$Q\tEI) DE\ KAI\ {..^EPIQEI\S}{..^E)FI/LHSA}"),
+    ('', 7615, '{c\?}', "XMH =?@XSM,@ZMMa [[30:11]]\tFIMOU= {c?QUMOU=}"),
+    ('', 7535, 'KRATAI', "B/(CM\t{..^KRATAIA=|}"),
+    ('44.Ezekiel.par', 471, 'OU=} MDBR', "MDBR =v\t{...?AU)TOU=} LALOU=NTOS"),
+    ('', 18162, '<42\.9\)', "--+ =;L/HNH <42.9>\tDI' AU)TW=N"),
+    ('', 20424, '\s\s\s\s\s', "NTNW #\tDE/DONTAI #"),
+    ('', 16686, r'XEIR\\', "^^^ ^ =W/B/YD/W\tKAI\ E)N TH=| XEI\R AU)TOU="),
+    ('', 8218, '\+RAUS\+', "L/MWG =%vap\tQRAUSQH=|"),
+    ('16.2Chron.par', 10095, '\t---$', "MLK\t--- ''"),
+    ('', 10096, '\t---$', "B/YRW$LM\t--- ''"),
+    ('', 1522, 'W:', "L/YHWH\tTW=| KURI/W|"),
+    ('', 3575, '-\.-', ''), # erase redundant line
+    ('', 4093, '{TOU', "W/B/BNYMN\tKAI\ {cTOU=} BENIAMIN"),
+    ('02.Exodus.par', 18838, '<40\.9}', '--+ '' {x} =;B/W <40.9>\tAU)TH=S'),
+    ('', 3197, '\s\s\s\s\s', "--+ =HW) <sp>\tAU)TO\S"),
+    ('04.Num.par', 7479, '<de1\.39\)', "--+ '' =;)$R <de1.39>\tO(/SOI"),
+    ('20.Psalms.par', 21382, '{\.1\.d', "W/M/PZ\tKAI\ {..dU(PE\R} TOPA/ZION [118.127]"),
+    ('', 8991, '\*YCPYNW\*', "**YCPYNW *YCPWNW\tKAI\ KATAKRU/YOUSIN [55.7]"),
+    ('', 21484, 'Y\*', "CR/Y\tOI( E)XQROI/ MOU [118.139]"),
+    ('', 7997, 'PROS/', "W/)L\tKAI\ {..dPRO/S} [49.4]"),
+    ('', 8968, r'TOUS\\', "DBR/W\tTOU\S LO/GOUS MOU [55.5]"),
+    ('23.Prov.par', 89, 'c18\.7\s', 'W/(NQYM <ju8.26 ge41.42 c18.7>\tKAI\ KLOIO\\N XRU/SEON'),
+    ('', 3274, 'ER\t', "{...}\tW(/SPER"),
+    ('', 3317, '{c} ', "YQB/HW =?@$BQa\tU(POLI/POITO {cU(POLH/NION} AU)TO\\N"),
+    ('', 3482, '\^EN\)', "MCWD =MCWR .dr\t{..^E)N} O)XURW/MASIN}"),
+    ('', 7090, r'G\\AR', "KY\tGA\R"),
+    ('', 8517, r'A\|\(', "$)WL\tA(/|DHS"),
+    ('03.Lev.par', 6866, '<sp\^\s', "--+ '' =;B/W <nu19.13> <sp^> #\tE)N AU)TW=|"),
+    ('', 12382, '{\.\.\.L\)\t', "W/PSL {...L)}\tOU)DE\ GLUPTA\\"),
+    ('41.Jer.par', 4751, '--\t', "H(D {!}-\t--- ''"),
+    ('', 4752, '--\t', "H(DTY {!}-\t--- ''"),
+    ('05.Deut.par', 11173, 'KI.*\t', "--+ '' =;KY <24.22>\tO(/TI"),
+    ('', 13270, 'Deut 28:65', 'Deut 28:64'),
+    ('', 13293, '\s\*', "^ W/)BN\t^^^\n\nDeut 28:65"),
+    ('', 2297, 'Deut 4:26', 'Deut 4:25'),
+    ('', 2316, '\(YD', "\nDeut 4:26\nH(YDTY\tDIAMARTU/ROMAI"),
+    ('08.JudgesB.par', 8041, r'N\.\.\.\)T', 'W/TY$N/HW =W/TY$N {...)T $M$WN}\tKAI\ E)KOI/MISEN {...TO\\N SAMYWN}'),
+    ('', 7568, '=@a\+', "=@+R)a\tE)KRERIMME/NHN"),
+    ('', 8151, ' %vpa', "W/YCXQ =%vpa {d}\tKAI\ E)/PAIZEN {d} {...KAI\ E)RRA/PIZON}"),
+    ('30.Amos.par', 603, '\[c', "B/)RC\tTH=S ---  {cGH=S}"),
+    ('', 751, '\[c', ")$H\tGUMNAI\ {cGUNAI=KES}"),
+    ('18.Esther.par', 4779, 'TH=!', "--+ ''\tTH=| TESSARESKAIDEKA/TH|"),
+    ('19.Neh.par', 1663, 'MEneN', "K/H/YWM\tW(S SH/MERON"),
+    ('', 3198, '{c\?}', "$(R =?(YR\tTH=S PO/LEWS {c?PU/LHS}"),
+    ('', 166, '{\*\*\t', "*W/HBW)TY/M **W/HBY)WTY/M {**}\tKAI\ EI)SA/CW AU)TOU\S"),
+    ('45.DanielOG.par', 7333, '{\?}', "YMYM\t--- <?>"),
+    ('', 2883, 'Q/Q', "(L M$KB/Y ,,a\tE)KA/QEUDON [10]"),
+    ('43.Lam.par', 1587, 'A \)', "+M)\tA)KAQA/RTWN"),
+]
+
+# -- Structural Repairs --
+
+# repairs which change the number of lines in a file are loaded into tuples:
+# (file, line_number, regex condition, description, operations)
+# where the regex condition confirms the repair against the given line, as
+# for the manual edits above, and the operations are tuples of
+# (kind, line_number, argument) of the following kinds:
+# • delete - remove argument lines, starting at the line
+# • merge - join argument lines, starting at the line, into a single line
+# • replace - replace the line with the argument
+# all line numbers refer to the source files (0-indexed); the repairs are
+# applied in a single pass by repair_lines
+structural_repairs = [
 
-def patch_morpho(data_dir='source', output_dir='source/patched', silent=False, debug=False):
+    # there is a corruption in the lines for Exod 35:19:
+    #
+    #     16283 ^ ^^^ =L/$RT {...?H/&RD} #  {+} E)N AI(=S LEITOURGH/SOUSIN
+    #     16284
+    #     16285 Exod 1:10
+    #     16286     #
+    #     16287
+    #     16288 Exod 35:19
+    #     16289 --+ E)N AU)TAI=S
+    #
+    # the interposition of blank lines and the "Exod 1:10" string are not
+    # supposed to be there, and they interrupt the data-lines for Exod 35:19
+    # these incorrect lines will be removed; the extra Exod 35:19 heading will
+    # likewise become unnecessary
+    # NB that line numbers below will be 1 less due to zero-indexing of Python
+    ('02.Exodus.par', 16284, '^Exod 1:10$', 'corrupt lines 16283-16289 (Exod 35:19)', [
+        ('delete', 16283, 2),
+        ('delete', 16286, 2),
+    ]),
+
+    # orphaned lines are cases where parts of a line are inexplicably broken off
+    # these are handled in bulk by repair_lines; but Ps 68:31 contains a
+    # special case with 2 orphaned lines in a row
+    # to prevent need for recursive algorith, we just fix it manually
+    ('20.Psalms.par', 10848, '^MTR$', 'double-orphaned lines 10849-10851 (Ps 68:31)', [
+        ('merge', 10848, 3),
+    ]),
+
+    # An identical corruption to the one discussed above in Exodus 35:19
+    # likewise in 20.Psalms.par lines 2457-2461
+    ('20.Psalms.par', 2459, '^Ps 18:40$', 'corrupt lines 2457-2461 (Ps 18:40)', [
+        ('delete', 2456, 1),
+        ('delete', 2458, 2),
+    ]),
+
+    # There is repeated material in Ezek, lines 20600-20607 (Ezek 47:20)
+    ('44.Ezekiel.par', 20599, '     ', 'duplicate content in lines 20600-20607 (Ezek 47:20)', [
+        ('replace', 20599, "--+ =:XMT\tHMAQ"),
+        ('delete', 20600, 7),
+    ]),
+]
+
+# -- Bulk Normalizations --
+
+# changes which need to be effected systematically are loaded into tuples:
+# (regex, replace[, column])
+# the changes are enacted with regex substitutions; the optional column
+# ('heb' or 'grk') restricts a change to the Hebrew or Greek column of a
+# data-line, otherwise it is applied to the whole line (see normalize_line)
+# not all of these are stricly errors (though they may be), there
+# are numerous cases of normalizations applied to bring idiosyncratic
+# patterns in line with the majority
+
+# NB that the order of some changes matters, since some patterns are
+# dependent on other idiosyncracies being fixed already
+normalizations = [
+    ('~', '^'),
+    ('----\+---', "--- ''"), # see 2 Chr 27:8
+    ("---\+", "--+"),
+    ("<([^\s>]*)(\s)(?!.*[>#])", '<\g<1>>\g<2>'), # numerous unclosed brackets
+
+    # NB: on below, cases of `{..`; some cases may be ambiguous whether they should be
+    # {... or {..^ However, it is the stated preference of the docs that
+    # during encoding {... is to be preferred (1986:7.6)
+    # and it also seems that several of the examples have a majority
+    # preference of {... over {..^; thus we go with the former
+    ('{\.\.(?![.^a-z])', '{...'),
+    ('\.\.\.\.', '...'),
+    ('\(!\)', '{!}'), # (!) to {i}, inf. abs.
+    ('(?<![-*])\-\+', '--+'), # -+ to --+
+    ('A', '', 'heb'), # vowels in the Hebrew column, replace with nothing
+    ('=&p', '=%p'), # =&p typo for =%p, preposition differences
+    ('(?<!-)--(?![-+])', '---'), # -- to ---
+    ('=a', '=@a'),
+
+    # NB order of this block matters, to ensure space to left of =
+    ('=%p=', '=%p-'),
+    ('([:;])=', '=\g<1>'), # e.g. := to =:
+    ('([^A-Z\/()\s|{}])=', '\g<1> ='), # ensure space to left of = (col.B marker)
+
+    # this is case of ellision with interruption
+    # it would be more consistent to code it as a separate {...} remark
+    # so we close the previous brace and adda second
+    ('(?<![{\[])\.\.\.(?![}\]])', '}{...'),
+
+    ('=%pa', '=%vpa'),
+    ('-%vap', '=%vap'),
+    ('{\.\.\.r', '{..r'),
+    ('=p(?=[\s-])', '=%p'),
+    ('<Sp>', '<sp>'),
+    ('=vpa', '=%vpa'),
+    ('\{d\}%p(\+?)', '%p\g<1> {d}'),
+    ('\+;', '=;'),
+
+    ('=\?:', '=:?'),
+    ('=\{d\};', '=;{d}'),
+
+    ('=p%([-+\s])', '=%p\g<1>'),
+    ('\{d\t', '{d}\t'),
+    ('{15{', '{15}'),
+    ('\(\?5\)', '{?5}'),
+    ('\[\.\.\.\]', '[..]'),
+    ('{(\d+)(\s)', '{\g<1>}\g<2>'),
+    ('(\s)(\d+)}', '\g<1>{\g<2>}'),
+    ('=%\?p(-?)', '=%p\g<1>?'),
+    (' ([a-z][a-z]) ', ' .\g<1> ', 'heb'),
+    ('\(\.\.', '{..'),
+    (r'\\', '/', 'heb'),
+
+    # order of block matters here
+    ('\[([a-zA-Z])}', '{\g<1>}'),
+    ('\[([\d.a-z]+)(?!.*\])', '[\g<1>]'),
+
+    ('\s\s\s\s+', ' '),
+    ('{\.\.\.\^', '{..^'),
+    ('{\.\.\^\.', '{..^'),
+    ('{\.\.\.([a-z]+)', '{..\g<1>'),
+    ('{t\.}', '{t}'),
+    ('<t\?>', '{t?}'),
+    ('(\s)\?--\+(\s)', '\g<1>--+?\g<2>'),
+
+    # move question marks contained in brackets
+    # to the end of the brackets; this normalizes the `?`
+    # and allows us to treat them as external decorators
+    # rather than allowing them to interrupt a symbol
+    (r"{([^}]*)(\?\??)(.*?)}", "{\g<1>\g<3>}\g<2>"),
+
+    # normalize verse cross references in Hebrew portion
+    #('\[\[(.*[a-zA-Z]+.*\d\..*)\]\](?=.*\t)', '<\g<1>>'),
+    (r"\[\[(.+?)\]\]", "<\g<1>>", 'heb'),
+    (r"\{dt\}", "{d}{t}"),
+
+    # move `?` to end of etymological exegesis symbol
+    (r"=@\?(\S*)a", "=@\g<1>a?"),
+
+    # close up unclosed curly brackets
+    (r"{([^\[}#]+)( +|$)(?!.*[}#])", "{\g<1>}\g<2>"),
+
+    (r"\^\^\^ \^ ''", "^^^ ^"),
+    (r"=([A-Z()/&$+]+)a", "=@\g<1>a"),
+
+    # change brackets of cross references in Hebrew portion to <>
+    # where <...> represents a 'note'
+    ("\[([^\]]*?\d[\]]*?)\]", "<\g<1>>", 'heb'),
+
+    # patch misplaced accents
+    # NB: the greedy (.*) keeps to the last misplaced accent in the column
+    (r"^(.*)(\s)([()])(.)", "\g<1>\g<2>\g<4>\g<3>", 'grk'),
+    (r"^(.*)=\)", "\g<1>)=", 'grk'),
+    (r"\|=", "=|"),
+    (r"\|\)", ")|"),
+    (r"TO\|N", r"TO\\N"),
+    (r"KAI\|", r"KAI\\"),
+    (r"I\(MAT/TIA", "I(MA/TIA"),
+    (r"ZN=\|", "ZH=|"),
+    (r"H\)R=TAI", "H)=RTAI"),
+    (r"OY\)K", "OU)K"),
+    (r"EC/NOIS", "CE/NOIS"),
+    (r"TH=/S", "TH=S"),
+]
+
+def repair_lines(file, lines, operations, report=print):
+    """Apply structural repairs and merge orphaned lines in a single pass.
+
+    A search for lines without \\t reveals that numerous lines are
+    orphaned from their original line, for instance, see DanTh 6:17:
+    >>> 4132     L/DNY)L ,,a TO\\N
+    >>> 4133     DANIHL
+    here DANIHL should be a part of the previous line
+    this problem is found in Sirach, Psalms, Daniel, Chronicles, Ezekiel, Neh,
+    etc. and is correlated with the book names. For instance, in the Psalms,
+    the Hebrew column is affected anywhere the characters "PS" appear (פס)
+    In Deuteronomy, the Greek column is affected where DEUT appears in the text
+    This was probably caused by a bad export and regex pattern that inserted a
+    newline everywhere a book reference was found in the database, with the ill-effect
+    that text containing the first characters of the books were also cleft by the newline.
+    Since most book abbreviations contain vowels, the Greek column is primarily affected,
+    meaning that orphaned lines need to be shifted up and appended to the Greek column.
+    The one exception to this is Psalms with the "PS" string that is anywhere a
+    פס appears in the text. These cases need to be merged down to the BEGINNING of the
+    subsequent line, in the Hebrew column.
+
+    Args:
+        file: name of the file, for reporting
+        lines: list of source lines
+        operations: dict of line number to (kind, argument) for the
+            structural repairs of the file; see structural_repairs
+        report: function called with a report of every orphaned line
+
+    Returns:
+        tuple of (repaired lines, line map, orphan merges) where the line
+        map is a list giving for each source line the index of the repaired
+        line it ended up in, or None if the line was deleted, and the orphan
+        merges list the index of the repaired line of every orphaned line.
+    """
+    repaired = []
+    line_map = [None] * len(lines)
+    orphans = []
+    current_verse = ''
+
+    # state of the pass: lines still to delete, lines still to merge
+    # into the merged line, and an orphan waiting to be merged down
+    deleting = 0
+    merging = 0
+    merged = None
+    orphan = None
+
+    def emit(line, sources):
+        repaired.append(line)
+        for i in sources:
+            line_map[i] = len(repaired) - 1
+
+    for i, line in enumerate(lines):
+
+        # apply structural repairs
+        if deleting:
+            deleting -= 1
+            continue
+
+        kind, arg = operations.get(i, (None, None))
+        if kind == 'delete':
+            deleting = arg - 1
+            continue
+        elif kind == 'replace':
+            line = arg
+        elif kind == 'merge':
+            merging = arg
+            merged = ('', [])
+
+        if merging:
+            merged = (merged[0] + line, merged[1] + [i])
+            merging -= 1
+            if merging:
+                continue
+            line, sources = merged
+        else:
+            sources = [i]
+
+        # complete an orphan shifted down to the HB col of this line
+        if orphan is not None:
+            emit(orphan[0] + line, orphan[1] + sources)
+            orphans.append(len(repaired) - 1)
+            orphan = None
+
+        # track references and keep them
+        elif ref_string.match(line):
+            current_verse = line
+            emit(line, sources)
+
+        # apply corrections to orphaned lines
+        elif line and '\t' not in line:
+
+            # append to log and report which lines are involved
+            previous = lines[i-1] if i else ''
+            following = lines[i+1] if i+1 < len(lines) else ''
+            show = f'\n\t\t{previous}\n\t--> {line}\n\t\t{following}'
+            report(f'\tpatching {file} at line {i}, {current_verse}:{show}')
+
+            # shift line down to HB col if it's in Psalms
+            if current_verse.startswith('Ps'):
+                orphan = (line, sources)
+
+            # otherwise shift it up to GK col
+            else:
+                repaired[-1] += line
+                for j in sources:
+                    line_map[j] = len(repaired) - 1
+                orphans.append(len(repaired) - 1)
+
+        # keep everything else unchanged
+        else:
+            emit(line, sources)
+
+    # an orphan at the end of the file has no line to be merged down to,
+    # so it is appended to the last line instead; it always follows the
+    # reference of its Psalm
+    if orphan is not None:
+        report(f'\tno line follows the orphan at the end of {file}, appending it to the last line')
+        repaired[-1] += orphan[0]
+        for j in orphan[1]:
+            line_map[j] = len(repaired) - 1
+        orphans.append(len(repaired) - 1)
+
+    return repaired, line_map, orphans
+
+def normalize_line(search, replace, line, column=None, timeout=None):
+    """Apply a compiled normalization to a line, optionally within one column.
+
+    The Hebrew column is the text before the tab and the Greek column the
+    text after it. Scoped normalizations are run on that substring only, so
+    they need no lookahead to the end of the line. Lines which contain
+    newlines from manual edits are handled one segment at a time.
+
+    Returns:
+        tuple of the normalized line and the number of substitutions made
+    """
+    if column is None:
+        return search.subn(replace, line, timeout=timeout)
+
+    if '\n' in line:
+        segments = [normalize_line(search, replace, segment, column, timeout)
+                        for segment in line.split('\n')]
+        return '\n'.join(s for s, n in segments), sum(n for s, n in segments)
+
+    if column == 'heb':
+        heb_col, tab, grk_col = line.rpartition('\t')
+        if tab:
+            heb_col, n = search.subn(replace, heb_col, timeout=timeout)
+            return heb_col + tab + grk_col, n
+    elif column == 'grk':
+        heb_col, tab, grk_col = line.partition('\t')
+        if tab:
+            grk_col, n = search.subn(replace, grk_col, timeout=timeout)
+            return heb_col + tab + grk_col, n
+    else:
+        raise Exception(f'UNKNOWN COLUMN {column} for {search.pattern}')
+
+    # lines without a tab have no columns
+    return line, 0
+
+def write_patched(file2lines, output_dir, metrics, report=print):
+    """Join the patched lines of every file and write them to output_dir.
+
+    Some manual edits insert newlines into a line, so the lines are
+    split again, as they would be when the files are read back.
+
+    Args:
+        file2lines: dict of file name to patched lines
+        output_dir: directory to write the files to, or None to only
+            return them
+        metrics: StageMetrics of the run
+        report: function called with status updates
+
+    Returns:
+        dict of file name to the lines of the patched file
+    """
+    if output_dir is not None:
+        report(f'\nwriting patched data to {output_dir}')
+        output_dir = Path(output_dir)
+        if not output_dir.exists():
+            output_dir.mkdir()
+
+    patched = {}
+    for file, lines in file2lines.items():
+        text = '\n'.join(lines)
+        patched[file] = text.split('\n')
+        if output_dir is not None:
+            file_path = output_dir.joinpath(file)
+            file_path.write_text(text)
+            metrics.count('bytes_written_total', file_path.stat().st_size)
+            metrics.count('files_written_total')
+    return patched
+
+def patch_morpho(data_dir='source', output_dir='source/patched', silent=False, debug=False,
+                 metrics_dir=None, books=None):
+    """Corrects known errors in the CATSS morphology files.
+
+    The patched files are written to output_dir, unless it is None, and
+    returned as a dict of file name to lines, so that a run can hand them
+    to the next stage without reading them back from disk.
+
+    Only the files of books, e.g. ['GEN', 'PSA'], are patched if it is
+    given; see references.book_selection.
+    """
     log = ''
     log += datetime.now().__str__() + '\n'
 
     n_edits = 0
+    metrics = StageMetrics('patch_morpho')
 
     def report(msg):
         # give feedback
@@ -19,64 +510,87 @@ def patch_morpho(data_dir='source', output_dir='source/patched', silent=False, d
     data = Path(data_dir)
     file2lines = {}
 
+    books = book_selection(books)
     for file in data.glob('*.mlxx'):
+        if not selects(file.name, books):
+            continue
         file2lines[file.name] = file.read_text().split('\n')
+        metrics.count('bytes_read_total', file.stat().st_size)
+        metrics.count('lines_processed_total', len(file2lines[file.name]))
 
     # apply select changes 
-    edits = [
-        ('01.Gen.1.mlxx', 12540, 'ADI2P', "KAQI/SATE                VA  AAD2P  I(/ZW            KATA"),
-        ('05.Num.mlxx', 24859, 'SONTAIVC', "SUGKATAKLHRONOMHQH/SONTAI VC  APS2S  KLHRONOME/W      SUN   KATA"),
-    ]
     report('\napplying bulk manual edits...\n')
 
     file = ''
-    for edit in edits:
+    for edit in morpho_edits:
 
         # unpack data
         file = edit[0] or file
         ln, re_confirm, redaction = edit[1:]
+        if not selects(file, books):
+            continue
         old_line = file2lines[file][ln]
 
         # confirm and apply changes, give reports throughout
-        if re.findall(re_confirm, old_line):
+        if regex.findall(re_confirm, old_line):
             file2lines[file][ln] = redaction
             report(f'correction for {file} line {ln}:')
             report(f'\tOLD: {old_line}')
             report(f'\tNEW: {redaction}')
             n_edits += 1
+            metrics.count('rule_hits_total', rule='manual edit')
         else:
             if debug:
                 raise Exception(f'FOLLOWING EDIT UNCONFIRMED: {edit} at {old_line}')
+            metrics.count('edits_unconfirmed_total')
             report(f'**WARNING: THE FOLLOWING EDIT WAS NOT CONFIRMED**:')
             report(f'\tTARGET: {old_line}')
             report(f'\tEDIT: {edit}')
 
     # export the corrected files
-    report(f'\nwriting patched data to {output_dir}')
-    output_dir = Path(output_dir)
-    if not output_dir.exists():
-        output_dir.mkdir()
-
-    for file, lines in file2lines.items():
-        text = '\n'.join(lines)
-        file_path = output_dir.joinpath(file)
-        file_path.write_text(text)
+    patched = write_patched(file2lines, output_dir, metrics, report)
 
     # write changes to a log file
-    log_path = output_dir.joinpath('log.txt')
-    log_path.write_text(log)
+    if output_dir is not None:
+        Path(output_dir).joinpath('log.txt').write_text(log)
 
     report('\nDONE with all patches!')
     report(f'\ttotal edits: {n_edits}')
 
+    metrics.count('edits_applied_total', n_edits)
+    if metrics_dir:
+        metrics.write(metrics_dir)
+
+    return patched
+
+
+def patch_parallel(data_dir='source', output_dir='source/patched', silent=False, debug=False,
+                   timeout=None, metrics_dir=None, books=None):
+    """Corrects known errors in the CATSS database.
+
+    A timeout in seconds can be given to bound each normalization applied
+    to a single line. Lines where a pattern exceeds it are quarantined:
+    they are logged and left unchanged by the remaining normalizations.
 
-def patch_parallel(data_dir='source', output_dir='source/patched', silent=False, debug=False):
-    """Corrects known errors in the CATSS database."""
+    Metrics of the run are written to metrics_dir if it is given;
+    see metrics.py.
+
+    The patched files are written to output_dir together with their
+    provenance sidecars and a log, unless output_dir is None, and returned
+    as a dict of file name to lines, e.g. to pass to
+    parse_parallel.parse_parallel(patched=...) without a round trip to disk.
+
+    If books is given, e.g. ['GEN', 'PSA'], only their files are patched,
+    with the edits, repairs and normalizations which apply to them, and
+    the files of other books in output_dir are left as they are; see
+    references.book_selection.
+    """
 
     log = ''
     log += datetime.now().__str__() + '\n'
 
     n_edits = 0
+    metrics = StageMetrics('patch_parallel')
 
     def report(msg):
         # give feedback
@@ -88,407 +602,110 @@ def patch_parallel(data_dir='source', output_dir='source/patched', silent=False,
     data = Path(data_dir)
     file2lines = {}
 
+    books = book_selection(books)
     for file in data.glob('*.par'):
+        if not selects(file.name, books):
+            continue
         file2lines[file.name] = file.read_text().split('\n')
+        metrics.count('bytes_read_total', file.stat().st_size)
+        metrics.count('lines_processed_total', len(file2lines[file.name]))
 
-    # -- Manual Edits --
+    # record the rules which touch each line for the provenance sidecars;
+    # rules applied before the structural repairs are keyed by source line,
+    # rules applied afterwards by patched line
+    rules = []
+    source_rules = collections.defaultdict(lambda: collections.defaultdict(list))
+    patched_rules = collections.defaultdict(lambda: collections.defaultdict(list))
 
-    # manual corrections loaded into tuples consisting of:
-    # (file, line_number, regex condition, new line)
-    # where line numbers refer to the original line numbers in the docs,
-    # the regex condition is a pattern to search all in the line to confirm the 
-    # change (a safeguard for erroneous changes or for when the underlying data
-    # changes). All of the changes are enacted in a large loop.
-    # If filename is left empty, the previous filename is used
-    # NB: linenumbers are given as 0-indexed
-    edits = [
-        ('06.JoshB.par', 983, 'MRY KAI', 'W/)T H/GRG$Y ^ =W/)T W/H/)MRY\t KAI\\ TO\\N AMORRAI=ON '),
-        ('', 1366, '\.kb # KAI', 'W/H/KHNYM =W/H/)BNYM .m .kb #\t KAI\\ OI( LI/QOI '),
-        ('', 3737, '12 E', 'W/YC+YRW =;W/YC+YDW .rd <9.12>\t E)PESITI/SANTO {d} KAI\\ H(TOIMA/SANTO'), 
-        ('', 9517, '<19.49> E', "--+ '' =;L/GBWLWT/YHM <19.49>\t E)N TOI=S O(RI/OIS AU)TW=N "),
-        ('', 2006, '\t<6.20>\t', '-+ =;H/(YR/H <6.20>\tEI)S TH\\N PO/LIN '),
-        ('', 9515, '\t<19\.49>\t', "--+ '' =;M/XLQ <19.49>\tDIAMERI/SAS "),
-        ('', 7104, 'RNA.*\t', 'W/DNH =:W/RNH .dr\tKAI\ RENNA'),
-        ('', 1659, '----', "M/MCRYM\t--- ''"),
-        ('', 4673, '{=51}', "W/YMYT/M\t--- <=51>"), # Normalize this to a note
-        ('', 10235, '{TOU', "--+\tSALAMIN {d} {...TOU= SWTHRI/OU}"),
-        ('', 11304, 'A\)PO\|', "M/CPWN\tA)PO\ BORRA= [31] "),
-        ('07.JoshA.par', 645, ' \)PO', "M/&M)L\tA)PO\ A)RISTERW=N"),
-        ('01.Genesis.par', 9550, "--\+ ' ", "--+ '' =;W/BH <24.14>\tKAI\ E)N TOU/TW|"),
-        ('', 9552, "--\+ ' ", "--+ '' =;KY <24.14>\tO(/TI"),
-        ('', 9557, '=:ABRHM', "--+ =:)BRHM\tABRAAM"),
-        ('', 2316, '--= ', "--+ '' =H/BHMH\tTW=N KTHNW=N"),
-        ('', 12939, '\.a', "B/GLL/K =?B/RGL/YK .s <^30.30\tTH=| SH=| ^ EI)SO/DW|"), # typo: .a for .s
-        ('', 10822, '}}', "NG(NW/K\t{...H(MEI=S} {...SE} ^ E)BDELUCA/MEQA"),
-        ('17.1Esdras.par', 477, 'CC35\.24', 'W/Y(BYR/HW\tKAI\\ {..^A)PE/STHSAN AU)TO\\N} [cc35.24]'),
-        ('', 6514, 'LI.*\t', ")L(ZR =:)LYW(NY\tE)LIWNA=S [e10.31]"),
-        ('', 2857, '\[e2 10', "$$ M)WT )RB(YM W/$NYM =+\tE(CAKO/SIOI TESSARA/KONTA O)KTW/ [e2.10]"),
-        ('', 772, 'SAS 3', ")$R H$BY(/W\t{...O(RKISQEI\S}{d} E)PIORKH/SAS #"),
-        ('', 4525, 'O.I\(', "BNY GLWT/)\tOI( E)K TH=S AI)XMALWSI/AS [e6.16]"), # remove unknown char
-        ('27.Sirach.par', 4843, '{\.\.}', '[..]\tA)PO\\'),
-        ('', 3697, '\s\s\s\s\s', "#\tA(MARTWLOU=} [7]}"), 
-        ('', 16898, ' no id\.', "NSH[..] 4\t--- ''<c - no id.>"), # put weird note in brackets
-        ('', 14099, '{\.\.\.\)', "<<KY>> 12\t{...}"),
-        ('11.1Sam.par', 2096, 'O\t', "--+ '' =KPWT\tOI( KARPOI\\"),
-        ('', 2097, 'T\t', "--+ '' =;YD/YW\tTW=N XEIRW=N AU)TOU="),
-        ('12.2Sam.par', 8592, 'EI\)S\)', "H/&DH =;H/Y(R\t{..pEI)S} TO\\N DRUMO\\N"),
-        ('13.1Kings.par', 15936, 'EI\)S}\t', "W/YBW)\tKAI\ EI)SH=LQEN {...EI)S}"),
-        ('', 2987, 'GY', "MCRYM\tAI)GU/PTOU [2.46k,10.26a]"),
-        ('14.2Kings.par', 4735, '{c}\? ', "YNHG\tE)GE/NETO {c?H)=GEN}"),
-        ('40.Isaiah.par', 1855, 'E\t', "B/$LKT =;M$LKT <q1a>\tE)KPE/SH|"),
-        ('', 11657, '_', "B/M(LWT\t--- ?"),
-        ('', 18586, '\.\.\.TO', "W/L/QDW$\tTO\ A(/GION {d} {..^KAI\ DIA\}{..^TO|N"),
-        ('', 11769, '=XWHa,XYY', "YXYW =@XWHa =@XYY\tA)NHGGE/LH {d} {...KAI\ E)CHGEIRA/S}"),
-        ('26.Job.par', 2245, 'OU\)}\t', "W/L)\t{..^OU)}DE\\"),
-        ('', 2063, '=a', "$DY =@$/DYa\tO( TA\ PA/NTA POIH/SAS"),
-        ('', 7441, '{#}', "YMYN\tDECIW=N {---%}"),
-        ('', 7927, 'S\.\.\^', "W/T$Q\tEI) DE\ KAI\ {..^EPIQEI\S}{..^E)FI/LHSA}"),
-        ('', 7615, '{c\?}', "XMH =?@XSM,@ZMMa [[30:11]]\tFIMOU= {c?QUMOU=}"),
-        ('', 7535, 'KRATAI', "B/(CM\t{..^KRATAIA=|}"),
-        ('44.Ezekiel.par', 471, 'OU=} MDBR', "MDBR =v\t{...?AU)TOU=} LALOU=NTOS"),
-        ('', 18162, '<42\.9\)', "--+ =;L/HNH <42.9>\tDI' AU)TW=N"),
-        ('', 20424, '\s\s\s\s\s', "NTNW #\tDE/DONTAI #"),
-        ('', 16686, r'XEIR\\', "^^^ ^ =W/B/YD/W\tKAI\ E)N TH=| XEI\R AU)TOU="),
-        ('', 8218, '\+RAUS\+', "L/MWG =%vap\tQRAUSQH=|"),
-        ('16.2Chron.par', 10095, '\t---$', "MLK\t--- ''"),
-        ('', 10096, '\t---$', "B/YRW$LM\t--- ''"),
-        ('', 1522, 'W:', "L/YHWH\tTW=| KURI/W|"),
-        ('', 3575, '-\.-', ''), # erase redundant line
-        ('', 4093, '{TOU', "W/B/BNYMN\tKAI\ {cTOU=} BENIAMIN"),
-        ('02.Exodus.par', 18838, '<40\.9}', '--+ '' {x} =;B/W <40.9>\tAU)TH=S'), 
-        ('', 3197, '\s\s\s\s\s', "--+ =HW) <sp>\tAU)TO\S"), 
-        ('04.Num.par', 7479, '<de1\.39\)', "--+ '' =;)$R <de1.39>\tO(/SOI"),
-        ('20.Psalms.par', 21382, '{\.1\.d', "W/M/PZ\tKAI\ {..dU(PE\R} TOPA/ZION [118.127]"),
-        ('', 8991, '\*YCPYNW\*', "**YCPYNW *YCPWNW\tKAI\ KATAKRU/YOUSIN [55.7]"),
-        ('', 21484, 'Y\*', "CR/Y\tOI( E)XQROI/ MOU [118.139]"),
-        ('', 7997, 'PROS/', "W/)L\tKAI\ {..dPRO/S} [49.4]"),
-        ('', 8968, r'TOUS\\', "DBR/W\tTOU\S LO/GOUS MOU [55.5]"),
-        ('23.Prov.par', 89, 'c18\.7\s', 'W/(NQYM <ju8.26 ge41.42 c18.7>\tKAI\ KLOIO\\N XRU/SEON'),
-        ('', 3274, 'ER\t', "{...}\tW(/SPER"),
-        ('', 3317, '{c} ', "YQB/HW =?@$BQa\tU(POLI/POITO {cU(POLH/NION} AU)TO\\N"),
-        ('', 3482, '\^EN\)', "MCWD =MCWR .dr\t{..^E)N} O)XURW/MASIN}"),
-        ('', 7090, r'G\\AR', "KY\tGA\R"),
-        ('', 8517, r'A\|\(', "$)WL\tA(/|DHS"),
-        ('03.Lev.par', 6866, '<sp\^\s', "--+ '' =;B/W <nu19.13> <sp^> #\tE)N AU)TW=|"),
-        ('', 12382, '{\.\.\.L\)\t', "W/PSL {...L)}\tOU)DE\ GLUPTA\\"),
-        ('41.Jer.par', 4751, '--\t', "H(D {!}-\t--- ''"),
-        ('', 4752, '--\t', "H(DTY {!}-\t--- ''"),
-        ('05.Deut.par', 11173, 'KI.*\t', "--+ '' =;KY <24.22>\tO(/TI"),
-        ('', 13270, 'Deut 28:65', 'Deut 28:64'), 
-        ('', 13293, '\s\*', "^ W/)BN\t^^^\n\nDeut 28:65"),
-        ('', 2297, 'Deut 4:26', 'Deut 4:25'),
-        ('', 2316, '\(YD', "\nDeut 4:26\nH(YDTY\tDIAMARTU/ROMAI"),
-        ('08.JudgesB.par', 8041, r'N\.\.\.\)T', 'W/TY$N/HW =W/TY$N {...)T $M$WN}\tKAI\ E)KOI/MISEN {...TO\\N SAMYWN}'),
-        ('', 7568, '=@a\+', "=@+R)a\tE)KRERIMME/NHN"),
-        ('', 8151, ' %vpa', "W/YCXQ =%vpa {d}\tKAI\ E)/PAIZEN {d} {...KAI\ E)RRA/PIZON}"),
-        ('30.Amos.par', 603, '\[c', "B/)RC\tTH=S ---  {cGH=S}"),
-        ('', 751, '\[c', ")$H\tGUMNAI\ {cGUNAI=KES}"),
-        ('18.Esther.par', 4779, 'TH=!', "--+ ''\tTH=| TESSARESKAIDEKA/TH|"),
-        ('19.Neh.par', 1663, 'MEneN', "K/H/YWM\tW(S SH/MERON"),
-        ('', 3198, '{c\?}', "$(R =?(YR\tTH=S PO/LEWS {c?PU/LHS}"),
-        ('', 166, '{\*\*\t', "*W/HBW)TY/M **W/HBY)WTY/M {**}\tKAI\ EI)SA/CW AU)TOU\S"),
-        ('45.DanielOG.par', 7333, '{\?}', "YMYM\t--- <?>"),
-        ('', 2883, 'Q/Q', "(L M$KB/Y ,,a\tE)KA/QEUDON [10]"),
-        ('43.Lam.par', 1587, 'A \)', "+M)\tA)KAQA/RTWN"),
-    ]
+    def add_rule(description):
+        rules.append(description)
+        return len(rules) - 1
+
+    # -- Manual Edits --
 
     report('\napplying bulk manual edits...\n')
 
     file = ''
-    for edit in edits:
+    for edit in parallel_edits:
 
         # unpack data
         file = edit[0] or file
         ln, re_confirm, redaction = edit[1:]
+        if not selects(file, books):
+            continue
         old_line = file2lines[file][ln]
 
         # confirm and apply changes, give reports throughout
-        if re.findall(re_confirm, old_line):
+        if regex.findall(re_confirm, old_line):
             file2lines[file][ln] = redaction
+            source_rules[file][ln].append(add_rule(f'manual edit: {file} line {ln}'))
             report(f'correction for {file} line {ln}:')
             report(f'\tOLD: {old_line}')
             report(f'\tNEW: {redaction}')
             n_edits += 1
+            metrics.count('rule_hits_total', rule='manual edit')
         else:
             if debug:
                 raise Exception(f'FOLLOWING EDIT UNCONFIRMED: {edit} at {old_line}')
+            metrics.count('edits_unconfirmed_total')
             report(f'**WARNING: THE FOLLOWING EDIT WAS NOT CONFIRMED**:')
             report(f'\tTARGET: {old_line}')
             report(f'\tEDIT: {edit}')
 
-    # -- Other Edits --
+    # -- Structural Repairs --
 
     report('\nApplying corrections to orphaned / corrupt lines...\n')
 
-    # there is a corruption in the lines for Exod 35:19:
-    # 
-    #     16283 ^ ^^^ =L/$RT {...?H/&RD} #  {+} E)N AI(=S LEITOURGH/SOUSIN
-    #     16284 
-    #     16285 Exod 1:10
-    #     16286     #
-    #     16287 
-    #     16288 Exod 35:19
-    #     16289 --+ E)N AU)TAI=S 
-    #
-    # the interposition of blank lines and the "Exod 1:10" string are not
-    # supposed to be there, and they interrupt the data-lines for Exod 35:19
-    # these incorrect lines will be removed; the extra Exod 35:19 heading will
-    # likewise become unnecessary
-    # NB that line numbers below will be 1 less due to zero-indexing of Python
-    
-    # first check that the edit still applies to current file
-    exod = file2lines['02.Exodus.par']
-    if exod[16284] == 'Exod 1:10':
-        report('patching corrupt lines 16283-16289 in 02.Exodus.par...')
-        fixed_lines = exod[:16283] + [exod[16285]] + exod[16288:]
-        file2lines['02.Exodus.par'] = fixed_lines
-        report('\tdone')
-        n_edits += 1
-    else:
-        if debug:
-            raise Exception('EXODUS CORRUPTION REPAIR SKIPPED!')
-        report('**WARNING: SKIPPING EXODUS CORRUPTION REPAIR DUE TO CHANGED LINE NUMBERS; see code')
-
-    # orphaned lines are cases where parts of a line are inexplicably broken off
-    # these are handled in bulk in a loop further below; but Ps 68:31 contains a 
-    # special case with 2 orphaned lines in a row
-    # to prevent need for recursive algorith, we just fix it manually
-    # we do it here to avoid needed to adjust indices after the correction
-    # listed subsequent to this one
-    pss = file2lines['20.Psalms.par']
-    if pss[10848] == 'MTR':
-        report('patching double-orphaned lines in lines 10849-10851 of 20.Psalms.par (Ps 68:31)')
-        ps68_31_patch = [pss[10848] + pss[10849] + pss[10850]]
-        file2lines['20.Psalms.par'] = pss[:10848] + ps68_31_patch + pss[10851:] 
-        report('\tdone')
-        n_edits += 1
-    else:
-        if debug:
-            raise Exception('PSALMS ORPHAN REPAIR SKIPPED!')
-        report('**WARNING: SKIPPING PSALMS ORPHAN REPAIR DUE TO CHANGED LINE NUMBERS; see code')
-
-    # An identical corruption to the one discussed above in Exodus 35:15
-    # likewise in 20.Psalms.par lines 2455-2459
-    pss = file2lines['20.Psalms.par'] # rename to resume corrected data
-    if pss[2459] == 'Ps 18:40':
-        report('patching corrupt lines 2457-2461 in 20.Psalms.par...')
-        fixed_lines = pss[:2456] + [pss[2457]] + pss[2460:]
-        file2lines['20.Psalms.par'] = fixed_lines
-        report('\tdone')
-        n_edits += 1
-    else:
-        if debug:
-            raise Exception('PSALMS ORPHAN REPAIR 2 SKIPPED!')
-        report('**WARNING: SKIPPING PSALMS ORPHAN REPAIR #2 DUE TO CHANGED LINE NUMBERS; see code')
-
-    # There is repeated material in Ezek, lines 20600-20607 (Ezek 47:20)
-    # We repair that here
-    ezek = file2lines['44.Ezekiel.par']
-    if '     ' in ezek[20599]:
-        ezek[20599] = "--+ =:XMT\tHMAQ"
-        fix = ezek[:20600] + ezek[20607:]
-        file2lines['44.Ezekiel.par'] = fix
-        n_edits += 1
-    else:
-        if debug:
-            raise Exception('EZEKIEL DUPLICATE CONTENT REPAIR SKIPPED!')
-        report('**WARNING: EZEKIEL DUPLICATE CONTENT REPAIR SKIPPED; see code') 
-
-    # -- Repair Orphaned Lines --
-
-    # a search for lines without \t reveals that numerous lines are 
-    # orphaned from their original line, for instance, see DanTh 6:17:
-    # >>> 4132     L/DNY)L ,,a TO\N
-    # >>> 4133     DANIHL
-    # here DANIHL should be a part of the previous line
-    # this problem is found in Sirach, Psalms, Daniel, Chronicles, Ezekiel, Neh,
-    # etc. and is correlated with the book names. For instance, in the Psalms,
-    # the Hebrew column is affected anywhere the characters "PS" appear (פס)
-    # In Deuteronomy, the Greek column is affected where DEUT appears in the text
-    # This was probably caused by a bad export and regex pattern that inserted a 
-    # newline everywhere a book reference was found in the database, with the ill-effect
-    # that text containing the first characters of the books were also cleft by the newline. 
-    # Since most book abbreviations contain vowels, the Greek column is primarily affected,
-    # meaning that orphaned lines need to be shifted up and appended to the Greek column.
-    # The one exception to this is Psalms with the "PS" string that is anywhere a 
-    # פס appears in the text. These cases need to be merged down to the BEGINNING of the 
-    # subsequent line, in the Hebrew column.
-    # This script will provide a detailed report in the log about which passages are affected,
-    # as well as how these effects are corrected (either shift up or shift down).
-
-    # TODO: This could be better patched by doing a simple search/replace in the text 
-    # for all text beginning with book names and preceded by a newline
-    # will need a regex pattern that can differentiate genuine booknames and text
+    # confirm the structural repairs and collect their operations per file
+    operations = collections.defaultdict(dict)
+    for file, ln, re_confirm, description, repair_ops in structural_repairs:
+        if not selects(file, books):
+            continue
+        if regex.findall(re_confirm, file2lines[file][ln]):
+            report(f'patching {description} in {file}...')
+            rule = add_rule(f'structural repair: {description} in {file}')
+            for kind, op_ln, arg in repair_ops:
+                operations[file][op_ln] = (kind, arg)
+                source_rules[file][op_ln].append(rule)
+            n_edits += 1
+            metrics.count('rule_hits_total', rule=rules[rule])
+        else:
+            if debug:
+                raise Exception(f'STRUCTURAL REPAIR SKIPPED: {description} in {file}')
+            metrics.count('edits_unconfirmed_total')
+            report(f'**WARNING: SKIPPING REPAIR OF {description} IN {file} DUE TO CHANGED LINE NUMBERS; see code')
 
+    # apply the repairs together with the orphaned line merges in one pass
+    # per file; see repair_lines for a description of orphaned lines
     report('patching orphaned lines (see code for description)...')
 
-    current_verse = None
+    orphan_rule = add_rule('orphaned line merge')
+    line_maps = {}
     for file, lines in file2lines.items():
-
-        filtered_lines = []
-
-        i = 0
-        while i < len(lines):
-
-            line = lines[i]
-
-            # track references and keep them
-            if ref_string.match(line):
-                current_verse = line
-                filtered_lines.append(line)
-            
-            # apply corrections to relevant lines
-            elif line and '\t' not in line:
-                
-                # append to log and report which lines are involved
-                show = f'\n\t\t{lines[i-1]}\n\t--> {line}\n\t\t{lines[i+1]}'
-                report(f'\tpatching {file} at line {i}, {current_verse}:{show}')
-                n_edits += 1
-
-                # shift line down to HB col if it's in Psalms
-                if current_verse.startswith('Ps'):
-                    filtered_lines.append(line+lines[i+1])
-                    i += 1 # shift forward 1 extra to skip already-covered line
-
-                # otherwise shift it up to GK col
-                else:
-                    filtered_lines[-1] = filtered_lines[-1] + line
-
-            # keep everything else unchanged            
-            else:
-                filtered_lines.append(line) 
-
-            # advance the position 
-            i += 1
-
-        # reassign to new lines
-        file2lines[file] = filtered_lines
+        repaired, line_map, orphans = repair_lines(file, lines, operations[file], report)
+        file2lines[file] = repaired
+        line_maps[file] = line_map
+        for i in orphans:
+            patched_rules[file][i].append(orphan_rule)
+        n_edits += len(orphans)
+        metrics.count('rule_hits_total', len(orphans), rule=rules[orphan_rule])
 
     report('\tdone')
 
-    # -- Bulk Normalizations -- 
-    
-    # changes which need to be effected systematically are loaded into tuples:
-    # (regex, replace)
-    # the changes are enacted with regex substitutions
-    # not all of these are stricly errors (though they may be), there 
-    # are numerous cases of normalizations applied to bring idiosyncratic
-    # patterns in line with the majority
-
-    # NB that the order of some changes matters, since some patterns are 
-    # dependent on other idiosyncracies being fixed already
-    normalizations = [
-        ('~', '^'),
-        ('----\+---', "--- ''"), # see 2 Chr 27:8
-        ("---\+", "--+"),
-        ("<([^\s>]*)(\s)(?!.*[>#])", '<\g<1>>\g<2>'), # numerous unclosed brackets
-
-        # NB: on below, cases of `{..`; some cases may be ambiguous whether they should be 
-        # {... or {..^ However, it is the stated preference of the docs that 
-        # during encoding {... is to be preferred (1986:7.6)
-        # and it also seems that several of the examples have a majority 
-        # preference of {... over {..^; thus we go with the former
-        ('{\.\.(?![.^a-z])', '{...'),
-        ('\.\.\.\.', '...'),
-        ('\(!\)', '{!}'), # (!) to {i}, inf. abs.
-        ('(?<![-*])\-\+', '--+'), # -+ to --+
-        ('A(?=.*\t)', ''), # vowels in the Hebrew column, replace with nothing
-        ('=&p', '=%p'), # =&p typo for =%p, preposition differences
-        ('(?<!-)--(?![-+])', '---'), # -- to ---
-        ('=a', '=@a'),
-
-        # NB order of this block matters, to ensure space to left of =
-        ('=%p=', '=%p-'),
-        ('([:;])=', '=\g<1>'), # e.g. := to =:
-        ('([^A-Z\/()\s|{}])=', '\g<1> ='), # ensure space to left of = (col.B marker)
-    
-        # this is case of ellision with interruption
-        # it would be more consistent to code it as a separate {...} remark
-        # so we close the previous brace and adda second
-        ('(?<![{\[])\.\.\.(?![}\]])', '}{...'),
-        
-        ('=%pa', '=%vpa'),
-        ('-%vap', '=%vap'),
-        ('{\.\.\.r', '{..r'),
-        ('=p(?=[\s-])', '=%p'),
-        ('<Sp>', '<sp>'),
-        ('=vpa', '=%vpa'),
-        ('{d}%p(\+?)', '%p\g<1> {d}'),
-        ('\+;', '=;'),
-        
-        ('=\?:', '=:?'),
-        ('={d};', '=;{d}'),
-
-        ('=p%([-+\s])', '=%p\g<1>'),
-        ('{d\t', '{d}\t'),
-        ('{15{', '{15}'),
-        ('\(\?5\)', '{?5}'), 
-        ('\[\.\.\.\]', '[..]'),
-        ('{(\d+)(\s)', '{\g<1>}\g<2>'),
-        ('(\s)(\d+)}', '\g<1>{\g<2>}'),
-        ('=%\?p(-?)', '=%p\g<1>?'),
-        (' ([a-z][a-z]) (?=.*\t)', ' .\g<1> '),
-        ('\(\.\.', '{..'),
-        (r'\\(?=.*\t)', '/'),
-
-        # order of block matters here
-        ('\[([a-zA-Z])}', '{\g<1>}'),
-        ('\[([\d.a-z]+)(?!.*\])', '[\g<1>]'),
-          
-        ('\s\s\s\s+', ' '),
-        ('{\.\.\.\^', '{..^'),
-        ('{\.\.\^\.', '{..^'),
-        ('{\.\.\.([a-z]+)', '{..\g<1>'),
-        ('{t\.}', '{t}'),
-        ('<t\?>', '{t?}'),
-        ('(\s)\?--\+(\s)', '\g<1>--+?\g<2>'),
-
-        # move question marks contained in brackets
-        # to the end of the brackets; this normalizes the `?`
-        # and allows us to treat them as external decorators
-        # rather than allowing them to interrupt a symbol
-        (r"{([^}]*)(\?\??)(.*?)}", "{\g<1>\g<3>}\g<2>"),
-
-        # normalize verse cross references in Hebrew portion
-        #('\[\[(.*[a-zA-Z]+.*\d\..*)\]\](?=.*\t)', '<\g<1>>'),
-        (r"\[\[(.+?)\]\](?=.*\t)", "<\g<1>>"),
-        (r"{dt}", "{d}{t}"),
-    
-        # move `?` to end of etymological exegesis symbol
-        (r"=@\?(\S*)a", "=@\g<1>a?"),
-
-        # close up unclosed curly brackets
-        (r"{([^\[}#]+)( +|$)(?!.*[}#])", "{\g<1>}\g<2>"),
-
-        (r"\^\^\^ \^ ''", "^^^ ^"),
-        (r"=([A-Z()/&$+]+)a", "=@\g<1>a"),
-    
-        # change brackets of cross references in Hebrew portion to <>
-        # where <...> represents a 'note'
-        ("\[([^\]]*?\d[\]]*?)\](?=.*\t)", "<\g<1>>"),
-
-        # patch misplaced accents
-        (r"(\t.*)(\s)([()])(.)", "\g<1>\g<2>\g<4>\g<3>"),
-        (r"(\t.*)=\)", "\g<1>)="),
-        (r"\|=", "=|"),
-        (r"\|\)", ")|"),
-        (r"TO\|N", r"TO\\N"),
-        (r"KAI\|", r"KAI\\"),
-        (r"I\(MAT/TIA", "I(MA/TIA"),
-        (r"ZN=\|", "ZH=|"),
-        (r"H\)R=TAI", "H)=RTAI"),
-        (r"OY\)K", "OU)K"),
-        (r"EC/NOIS", "CE/NOIS"),
-        (r"TH=/S", "TH=S"),
-    ]
-
     report('\nMaking various bulk regex normalizations...\n')
 
-    for search, replace in normalizations:
+    # lines where a pattern exceeds the timeout are quarantined: they are
+    # left as they are for all remaining normalizations and listed in the log
+    quarantine = {}
+
+    for search, replace, *column in get_patterns('normalizations'):
 
-        report(f'---- applying pattern `{search}` with replace `{replace}` ----')
-        search = re.compile(search) # compile for efficiency
+        column = column[0] if column else None
+        in_column = f' in the {column} column' if column else ''
+        report(f'---- applying pattern `{search.pattern}` with replace `{replace}`{in_column} ----')
+        rule = add_rule(f'normalization: `{search.pattern}` -> `{replace}`{in_column}')
         pattern_successful = False
+        metrics.count('rule_hits_total', 0, rule=rules[rule])
 
         for file, lines in file2lines.items():
         
@@ -501,15 +718,32 @@ def patch_parallel(data_dir='source', output_dir='source/patched', silent=False,
                 if ref_string.match(line):
                     curr_verse = line
 
+                # skip lines which have been quarantined
+                if (file, i) in quarantine:
+                    new_lines.append(line)
+                    continue
+
                 # apply substitutions
-                if search.findall(line):
-                    redaction = search.sub(replace, line)
+                try:
+                    redaction, found = normalize_line(search, replace, line, column, timeout)
+                except TimeoutError:
+                    quarantine[(file, i)] = search.pattern
+                    metrics.count('lines_quarantined_total')
+                    report(f'**WARNING: QUARANTINING LINE {i} IN {file} AFTER TIMEOUT**:')
+                    report(f'\tPATTERN: {search.pattern}')
+                    report(f'\tLINE: {line}')
+                    new_lines.append(line)
+                    continue
+
+                if found:
                     new_lines.append(redaction)
+                    patched_rules[file][i].append(rule)
                     report(f'  in {file} in {curr_verse}:')
                     report(f'\tOLD: {line}')
                     report(f'\tNEW: {redaction}')
                     pattern_successful = True   
                     n_edits += 1    
+                    metrics.count('rule_hits_total', rule=rules[rule])
                 
                 # else keep line the same
                 else:
@@ -518,25 +752,39 @@ def patch_parallel(data_dir='source', output_dir='source/patched', silent=False,
             file2lines[file] = new_lines
 
         if not pattern_successful:
-            if debug:
+            metrics.count('patterns_not_found_total')
+            # a selection of books need not contain every pattern
+            if debug and books is None:
                 raise Exception(f'PATTERN NOT FOUND: {search}')
             else:
                 report(f'WARNING, PATTERN NOT FOUND: {search}')
 
+    if quarantine:
+        report(f'\n{len(quarantine)} lines quarantined after timeouts:')
+        for (file, i), pattern in quarantine.items():
+            report(f'\t{file} line {i}: `{pattern}`')
+
     # export the corrected files
-    report(f'\nwriting patched data to {output_dir}')
-    output_dir = Path(output_dir)
-    if not output_dir.exists():
-        output_dir.mkdir()
+    patched = write_patched(file2lines, output_dir, metrics, report)
 
-    for file, lines in file2lines.items():
-        text = '\n'.join(lines)
-        file_path = output_dir.joinpath(file)
-        file_path.write_text(text)
+    if output_dir is not None:
 
-    # write changes to a log file
-    log_path = output_dir.joinpath('log.txt')
-    log_path.write_text(log)
+        # write the provenance sidecars, so that patched lines can be
+        # traced back to the source; see provenance.trace
+        file2provenance = {
+            file: build_provenance(line_maps[file], lines, source_rules[file], patched_rules[file])
+                for file, lines in file2lines.items()
+        }
+        write_provenance(output_dir, file2provenance, rules, merge=books is not None)
+
+        # write changes to a log file
+        Path(output_dir).joinpath('log.txt').write_text(log)
 
     report('\nDONE with all patches!')
     report(f'\ttotal edits: {n_edits}')
+
+    metrics.count('edits_applied_total', n_edits)
+    if metrics_dir:
+        metrics.write(metrics_dir)
+
+    return patched
@@ -0,0 +1,195 @@
+"""
+Use the pattern_coverage function to measure how the text-critical
+patterns in regex_patterns.py cover the patched CATSS parallel files.
+
+The corpus is read once and every pattern is evaluated against the
+column it is applied to by the parser: common patterns against the
+whole line, Hebrew patterns against the Hebrew column, and Greek
+patterns against the Greek column. Books can optionally be scanned
+in parallel with a process pool.
+"""
+
+import collections
+import random
+from multiprocessing import Pool
+from pathlib import Path
+from regex_patterns import ref_string
+from pattern_registry import get_patterns
+
+# pattern sets are given as (name, registry set, column) where the column
+# is the slice of the data-line the patterns are run against
+pattern_sets = [
+    ('common', 'common_tc', 'line'),
+    ('hebrew', 'heb_tc', 'heb'),
+    ('greek', 'greek_tc', 'grk'),
+]
+
+# index of the columns in the rows returned by load_corpus
+columns = {'line': 0, 'heb': 1, 'grk': 2}
+
+def compile_patterns():
+    """Compile all pattern sets, raising on any malformed pattern.
+
+    The sets are compiled once per process by the pattern registry,
+    so that pool workers only compile them once.
+    """
+    return [
+        ((name, i), pattern[0], columns[column])
+            for name, registry_set, column in pattern_sets
+            for i, pattern in enumerate(get_patterns(registry_set))
+    ]
+
+def load_corpus(data_dir='source/patched', patched=None):
+    """Read all .par files once and split their data-lines into columns.
+
+    Args:
+        data_dir: directory containing the patched .par files
+        patched: optional dict of file name to lines, as returned by
+            patch_catss.patch_parallel, to use instead of the files
+
+    Returns:
+        dict of filename to a list of (line, heb_col, grk_col) tuples;
+        reference strings and blank lines are skipped.
+    """
+    if patched is None:
+        patched = {file.name: file.read_text().split('\n') for file in Path(data_dir).glob('*.par')}
+    corpus = {}
+    for file in sorted(name for name in patched if name.endswith('.par')):
+        rows = []
+        for line in patched[file]:
+
+            # skip reference string lines
+            if not line or ref_string.match(line):
+                continue
+
+            try:
+                heb_col, grk_col = line.split('\t')
+            except ValueError:
+                raise Exception(file, line)
+
+            rows.append((line, heb_col, grk_col))
+        corpus[file] = rows
+    return corpus
+
+def scan_book(book, rows, sample_size=5, seed=0):
+    """Count the matches of every pattern in a single book.
+
+    Examples are kept in a reservoir sample of sample_size per pattern,
+    so that each match in the book has an equal chance of being shown.
+
+    Returns:
+        tuple of (book, counts, samples) where counts maps a pattern key
+        to its number of matches and samples maps a pattern key to a list
+        of (string, match) examples.
+    """
+    rng = random.Random(f'{seed}:{book}')
+    counts = collections.Counter()
+    samples = collections.defaultdict(list)
+
+    for key, pattern, column in compile_patterns():
+        n = 0
+        reservoir = samples[key]
+        for row in rows:
+            string = row[column]
+            for match in pattern.finditer(string):
+                n += 1
+                example = (string, match.group(0))
+                if len(reservoir) < sample_size:
+                    reservoir.append(example)
+                else:
+                    j = rng.randrange(n)
+                    if j < sample_size:
+                        reservoir[j] = example
+        if n:
+            counts[key] = n
+
+    return book, counts, dict(samples)
+
+def _scan_book(args):
+    return scan_book(*args)
+
+def merge_samples(sample_a, n_a, sample_b, n_b, sample_size, rng):
+    """Merge two reservoir samples drawn from populations of n_a and n_b."""
+    sample_a = list(sample_a)
+    sample_b = list(sample_b)
+    rng.shuffle(sample_a)
+    rng.shuffle(sample_b)
+    merged = []
+    while len(merged) < sample_size and (sample_a or sample_b):
+        if sample_b and (not sample_a or rng.randrange(n_a + n_b) >= n_a):
+            merged.append(sample_b.pop())
+            n_b -= 1
+        else:
+            merged.append(sample_a.pop())
+            n_a -= 1
+    return merged
+
+def pattern_coverage(data_dir='source/patched', corpus=None, processes=None,
+                     sample_size=5, seed=0):
+    """Measure the coverage of all text-critical patterns over the corpus
+
+    Args:
+        data_dir: directory containing the patched .par files
+        corpus: optional output of load_corpus, to avoid re-reading the data
+        processes: number of worker processes to scan books with;
+            None scans the books serially in this process
+        sample_size: maximum number of examples kept per pattern
+        seed: seed for the reservoir sampling of the examples
+
+    Returns:
+        dict with the following keys:
+            counts: Counter of (set name, pattern index) to n matches
+            book_counts: dict of pattern key to a Counter of book to n matches
+            examples: dict of pattern key to a list of (string, match)
+            unmatched: list of pattern keys that never match
+    """
+    if corpus is None:
+        corpus = load_corpus(data_dir)
+    compile_patterns()
+
+    jobs = [(book, rows, sample_size, seed) for book, rows in corpus.items()]
+    if processes:
+        with Pool(processes) as pool:
+            results = pool.map(_scan_book, jobs)
+    else:
+        results = [_scan_book(job) for job in jobs]
+
+    # merge book results in canonical order
+    rng = random.Random(seed)
+    counts = collections.Counter()
+    book_counts = collections.defaultdict(collections.Counter)
+    examples = collections.defaultdict(list)
+    for book, book_count, book_samples in sorted(results):
+        for key, n in book_count.items():
+            examples[key] = merge_samples(
+                examples[key], counts[key], book_samples[key], n, sample_size, rng
+            )
+            counts[key] += n
+            book_counts[key][book] = n
+
+    unmatched = [key for key, pattern, column in compile_patterns()
+                    if not counts[key]]
+
+    return {
+        'counts': counts,
+        'book_counts': dict(book_counts),
+        'examples': dict(examples),
+        'unmatched': unmatched,
+    }
+
+def show_coverage(coverage):
+    """Print a coverage report with examples for each pattern."""
+    current_set = None
+    for key, pattern, column in compile_patterns():
+        name, i = key
+        if name != current_set:
+            current_set = name
+            print()
+            print(f'------ {name} set -----')
+            print()
+        n = coverage['counts'][key]
+        n_books = len(coverage['book_counts'].get(key, {}))
+        print(i, pattern.pattern, f'({n} matches in {n_books} books)')
+        for ex in coverage['examples'].get(key, []):
+            print(f'\t{ex}')
+        print()
@@ -0,0 +1,88 @@
+"""
+Use get_patterns to retrieve the compiled pattern sets of the pipeline.
+
+Every set is compiled on first use and shared by all consumers within
+the process (the parser, patch_parallel, the coverage and lint tools),
+so that no tool compiles the raw tables of regex_patterns.py itself.
+Besides the raw sets, merged sets with all markup patterns of the
+Hebrew and the Greek column are available.
+
+pattern_hash gives a content hash of one or more sets, which changes
+whenever a pattern changes and can be used as a cache key for results
+that depend on the patterns.
+"""
+
+import hashlib
+import functools
+import regex
+import regex_patterns as repatts
+
+# bump to invalidate all pattern hashes, e.g. when the way the
+# patterns are applied changes while the patterns stay the same
+version = 1
+
+def _normalizations():
+    # imported here since patch_catss compiles its patterns from the registry
+    from patch_catss import normalizations
+    return normalizations
+
+# raw pattern sets by name; the loaders return lists of pattern tuples
+# whose first element is the regex
+loaders = {
+    'common_tc': lambda: repatts.common_tc,
+    'heb_tc': lambda: repatts.heb_tc,
+    'greek_tc': lambda: repatts.greek_tc,
+    'extra_bib_tc': lambda: repatts.extra_bib_tc,
+    'normalizations': _normalizations,
+}
+
+# merged sets, given as the raw sets they consist of in order of application
+merged_sets = {
+    'hebrew': ('common_tc', 'heb_tc'),
+    'greek': ('common_tc', 'greek_tc'),
+}
+
+def set_names(name):
+    """Return the raw sets a pattern set consists of."""
+    if name in merged_sets:
+        return merged_sets[name]
+    elif name in loaders:
+        return (name,)
+    else:
+        raise Exception(f'NO PATTERN SET NAMED {name}')
+
+def raw_patterns(name):
+    """Return the raw pattern tuples of a set."""
+    return [pattern for raw in set_names(name) for pattern in loaders[raw]()]
+
+@functools.lru_cache(maxsize=None)
+def compile_set(name):
+    patterns = []
+    for i, pattern in enumerate(loaders[name]()):
+        try:
+            patterns.append((regex.compile(pattern[0]),) + tuple(pattern[1:]))
+        except regex.error:
+            raise Exception(f'Problem in pattern {i} of {name} set: {pattern}')
+    return tuple(patterns)
+
+@functools.lru_cache(maxsize=None)
+def get_patterns(name):
+    """Return a pattern set with its regexes compiled.
+
+    Args:
+        name: name of a raw set (common_tc, heb_tc, greek_tc, extra_bib_tc,
+            normalizations) or of a merged set (hebrew, greek)
+
+    Returns:
+        tuple of the pattern tuples of the set with the regex compiled
+    """
+    return tuple(pattern for raw in set_names(name) for pattern in compile_set(raw))
+
+@functools.lru_cache(maxsize=None)
+def pattern_hash(*names):
+    """Return a hex digest of the content of the given sets, defaulting to all sets."""
+    names = names or tuple(loaders)
+    digest = hashlib.sha1(f'version {version}'.encode())
+    for name in names:
+        digest.update(repr((name, raw_patterns(name))).encode())
+    return digest.hexdigest()
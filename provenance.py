@@ -0,0 +1,193 @@
+"""
+Map patched lines of the parallel files back to the source lines.
+
+patch_parallel writes a compact binary sidecar for every patched book to
+<output_dir>/provenance/<file>.prov, together with a rules.json listing
+the rules (manual edits, structural repairs, orphan merges and bulk
+normalizations) which can touch a line. A sidecar is a flat array of
+unsigned 32 bit integers (little-endian):
+
+    n_lines, n_sources, n_rules
+    source offsets  (n_lines + 1)
+    source lines    (n_sources)
+    rule offsets    (n_lines + 1)
+    rule ids        (n_rules)
+
+i.e. the source lines of patched line i are
+sources[source_offsets[i]:source_offsets[i+1]], and likewise for the ids
+of the rules which touched it. Use trace to look up a patched line, for
+instance one reported in the errors of parse_parallel:
+
+>>> trace('20.Psalms.par', 10848)
+([10848, 10849, 10850], ['structural repair: double-orphaned lines ...'])
+"""
+
+import sys
+import json
+import functools
+from array import array
+from pathlib import Path
+
+def pack_rows(rows):
+    """Pack a list of integer lists into arrays of offsets and values."""
+    offsets = array('I', [0])
+    values = array('I')
+    for row in rows:
+        values.extend(row)
+        offsets.append(len(values))
+    return offsets, values
+
+def build_provenance(line_map, lines, source_rules=None, patched_rules=None):
+    """Invert a line map into the source lines and rules of every patched line.
+
+    Patched lines which contain newlines (some manual edits insert
+    them) span several lines of the written file; each of these lines
+    is given the provenance of the whole patched line. The rules of
+    source lines which were deleted are given to the preceding patched
+    line, or to the first one if no line precedes them, so that they
+    can still be traced.
+
+    Args:
+        line_map: list giving for each source line the index of the
+            patched line it ended up in, or None if it was deleted
+        lines: list of patched lines
+        source_rules: dict of source line number to the ids of the rules
+            applied to it before the lines were repaired
+        patched_rules: dict of patched line number to the ids of the
+            rules applied to it after the lines were repaired
+
+    Returns:
+        tuple of arrays (source offsets, source lines, rule offsets, rule ids)
+    """
+    source_rules = source_rules or {}
+    patched_rules = patched_rules or {}
+    sources = [[] for _ in lines]
+    rules = [set() for _ in lines]
+    previous = None     # patched line of the last source line which survived
+    orphaned = set()    # rules of deleted lines before the first survivor
+    for source, patched in enumerate(line_map):
+        if patched is not None:
+            sources[patched].append(source)
+            rules[patched].update(source_rules.get(source, ()))
+            if previous is None:
+                rules[patched].update(orphaned)
+            previous = patched
+        elif previous is not None:
+            rules[previous].update(source_rules.get(source, ()))
+        else:
+            orphaned.update(source_rules.get(source, ()))
+    for patched, ids in patched_rules.items():
+        rules[patched].update(ids)
+
+    # expand to the lines of the written file
+    spans = [line.count('\n') + 1 for line in lines]
+    sources = [row for row, span in zip(sources, spans) for _ in range(span)]
+    rules = [sorted(ids) for ids, span in zip(rules, spans) for _ in range(span)]
+    return pack_rows(sources) + pack_rows(rules)
+
+def write_sidecar(path, provenance):
+    """Write the arrays of build_provenance to a binary sidecar."""
+    source_offsets, sources, rule_offsets, rule_ids = provenance
+    data = array('I', [len(source_offsets) - 1, len(sources), len(rule_ids)])
+    for part in provenance:
+        data.extend(part)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    Path(path).write_bytes(data.tobytes())
+
+def read_sidecar(path):
+    """Read a binary sidecar into the arrays of build_provenance."""
+    data = array('I')
+    data.frombytes(Path(path).read_bytes())
+    if sys.byteorder == 'big':
+        data.byteswap()
+    n_lines, n_sources, n_rules = data[:3]
+    sizes = [n_lines + 1, n_sources, n_lines + 1, n_rules]
+    parts = []
+    start = 3
+    for size in sizes:
+        parts.append(data[start:start+size])
+        start += size
+    return tuple(parts)
+
+def remap_rules(provenance, id_map):
+    """Return the arrays of build_provenance with the rule ids mapped to new ids."""
+    source_offsets, sources, rule_offsets, rule_ids = provenance
+    rows = [
+        sorted(id_map[i] for i in rule_ids[rule_offsets[j]:rule_offsets[j+1]])
+            for j in range(len(rule_offsets) - 1)
+    ]
+    return (source_offsets, sources) + pack_rows(rows)
+
+def write_provenance(output_dir, file2provenance, rules, merge=False):
+    """Write the sidecars of all files and the rule table to output_dir/provenance.
+
+    Args:
+        output_dir: directory of the patched files
+        file2provenance: dict of file name to the arrays of build_provenance
+        rules: list of rule descriptions, indexed by rule id
+        merge: if True, add the rules to the existing rule table rather
+            than replacing it, so that the sidecars of files which aren't
+            rewritten stay valid; for runs over a selection of books
+    """
+    prov_dir = Path(output_dir).joinpath('provenance')
+    prov_dir.mkdir(parents=True, exist_ok=True)
+    rules_path = prov_dir.joinpath('rules.json')
+    if merge and rules_path.exists():
+        merged = json.loads(rules_path.read_text())
+        index = {rule: i for i, rule in enumerate(merged)}
+        id_map = []
+        for rule in rules:
+            if rule not in index:
+                index[rule] = len(merged)
+                merged.append(rule)
+            id_map.append(index[rule])
+        file2provenance = {
+            file: remap_rules(provenance, id_map) for file, provenance in file2provenance.items()
+        }
+        rules = merged
+    for file, provenance in file2provenance.items():
+        write_sidecar(prov_dir.joinpath(file + '.prov'), provenance)
+    rules_path.write_text(json.dumps(rules, indent=1))
+
+def load_sidecar(book, patched_dir='source/patched'):
+    """Read the sidecar of a book, cached until the file changes."""
+    if not book.endswith('.par'):
+        book += '.par'
+    path = Path(patched_dir).joinpath('provenance', book + '.prov')
+    stat = path.stat()
+    return _load_sidecar(str(path), stat.st_mtime_ns, stat.st_size)
+
+@functools.lru_cache(maxsize=128)
+def _load_sidecar(path, mtime, size):
+    return read_sidecar(path)
+
+def load_rules(patched_dir='source/patched'):
+    """Read the rule table, cached until the file changes."""
+    path = Path(patched_dir).joinpath('provenance', 'rules.json')
+    stat = path.stat()
+    return _load_rules(str(path), stat.st_mtime_ns, stat.st_size)
+
+@functools.lru_cache(maxsize=4)
+def _load_rules(path, mtime, size):
+    return json.loads(Path(path).read_text())
+
+def trace(book, patched_line, patched_dir='source/patched'):
+    """Trace a patched line back to its source lines and the rules applied to it.
+
+    Sidecars are loaded once and cached until they change, so that
+    every further lookup takes constant time.
+
+    Args:
+        book: name of the patched file, e.g. 20.Psalms.par (the .par is optional)
+        patched_line: line number (0-indexed) in the patched file
+        patched_dir: directory of the patched files
+
+    Returns:
+        tuple of (list of source line numbers, list of rule descriptions)
+    """
+    source_offsets, sources, rule_offsets, rule_ids = load_sidecar(book, patched_dir)
+    rules = load_rules(patched_dir)
+    source_lines = sources[source_offsets[patched_line]:source_offsets[patched_line+1]]
+    ids = rule_ids[rule_offsets[patched_line]:rule_offsets[patched_line+1]]
+    return list(source_lines), [rules[i] for i in ids]
@@ -0,0 +1,266 @@
+"""
+Use run_service to serve the converted corpus over a local HTTP/JSON
+service, so that frontends and tools don't each load the JSON exports.
+
+The parallel and morphology exports are loaded once. All requests are
+GET requests with a ref parameter (e.g. /verse?ref=GEN%201:1):
+
+    /verse        parallel columns and morphology of a verse
+    /parallel     aligned parallel columns of a verse
+    /morphology   morphology of a verse
+    /range        parallel columns and morphology of a range of verses,
+                  e.g. GEN 1:1-2:3 or GEN 1:1-5
+    /crosswalk    MT and LXX verses of a verse, if crosswalk.json was
+                  saved with the exports; see crosswalk.py
+    /stats        request, latency and cache counters
+
+Responses are kept in an LRU cache and requests are handled by a pool of
+threads. The service binds to localhost only and is read-only.
+"""
+
+import json
+import time
+import regex
+import bisect
+import argparse
+import threading
+import functools
+import collections
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from references import ref_key
+from crosswalk import load_crosswalk
+
+# e.g. GEN 1:1, GEN 1:1-5, GEN 1:1-2:3
+range_string = regex.compile(r'^(\S+) (\d+:\d+)(?:-((?:\d+:)?\d+))?$')
+
+# upper bounds of the latency histogram in milliseconds
+latency_buckets = (1, 5, 10, 50, 100, 500, 1000, float('inf'))
+
+def load_exports(json_dir='JSON'):
+    """Load the parallel and morphology exports.
+
+    Returns:
+        tuple of (verses, book_refs) where verses is a dict of ref to a
+        dict with the parallel and/or morphology data of the verse, and
+        book_refs is a dict of book to its refs in the order of the exports
+    """
+    verses = collections.defaultdict(dict)
+    book_refs = collections.defaultdict(list)
+    for kind, glob in (('parallel', '*.par.json'), ('morphology', '*.mlxx.json')):
+        for file in sorted(Path(json_dir).joinpath(kind).glob(glob)):
+            with open(file, encoding='UTF8') as infile:
+                book_data = json.load(infile)
+            for verse in book_data:
+                ref, data = verse[0], verse[1:]
+                if ref not in verses:
+                    book_refs[ref.split()[0]].append(ref)
+                verses[ref][kind] = data
+    return dict(verses), dict(book_refs)
+
+class QueryService:
+    """Answers queries on the loaded exports, with a response cache and counters."""
+
+    def __init__(self, json_dir='JSON', cache_size=1024):
+        self.verses, self.book_refs = load_exports(json_dir)
+        # integer keys of the refs of every book, sorted, for range queries
+        self.book_keys = collections.defaultdict(list)
+        for book, refs in self.book_refs.items():
+            for ref in refs:
+                try:
+                    self.book_keys[book].append((ref_key(ref), ref))
+                except ValueError:
+                    continue
+            self.book_keys[book].sort()
+        crosswalk_path = Path(json_dir).joinpath('crosswalk.json')
+        self.crosswalk = load_crosswalk(crosswalk_path) if crosswalk_path.exists() else None
+        self.respond = functools.lru_cache(maxsize=cache_size)(self._respond)
+        self.endpoints = {
+            '/verse': self.verse,
+            '/parallel': lambda ref: self.verse(ref, 'parallel'),
+            '/morphology': lambda ref: self.verse(ref, 'morphology'),
+            '/range': self.verse_range,
+            '/crosswalk': self.crosswalk_lookup,
+        }
+
+        # counters
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.n_requests = collections.Counter()
+        self.n_errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_histogram = collections.Counter()
+
+    def verse(self, ref, kind=None):
+        if ref not in self.verses:
+            raise KeyError(f'unknown verse {ref}')
+        data = self.verses[ref]
+        if kind:
+            if kind not in data:
+                raise KeyError(f'no {kind} data for {ref}')
+            return {'ref': ref, kind: data[kind]}
+        return dict(ref=ref, **data)
+
+    def verse_range(self, ref):
+        match = range_string.match(ref)
+        if not match:
+            raise ValueError(f'malformed range {ref}')
+        book, start, end = match.groups()
+        end = end or start
+        if ':' not in end:
+            end = start.split(':')[0] + ':' + end
+        start, end = f'{book} {start}', f'{book} {end}'
+        for verse in (start, end):
+            if verse not in self.verses:
+                raise KeyError(f'unknown verse {verse}')
+        keys = self.book_keys[book]
+        first = bisect.bisect_left(keys, (ref_key(start), ''))
+        last = bisect.bisect_right(keys, (ref_key(end), chr(0x10FFFF)))
+        refs = [ref for key, ref in keys[first:last]]
+        if not refs:
+            raise ValueError(f'{end} precedes {start}')
+        return {'ref': ref, 'verses': [self.verse(r) for r in refs]}
+
+    def crosswalk_lookup(self, ref):
+        if self.crosswalk is None:
+            raise KeyError('no crosswalk.json was saved with the exports')
+        return self.crosswalk.lookup(ref)
+
+    def _respond(self, endpoint, ref):
+        """Return the (status, JSON body) of a query; cached by self.respond."""
+        if endpoint not in self.endpoints:
+            status, data = 404, {'error': f'unknown endpoint {endpoint}'}
+        elif ref is None:
+            status, data = 400, {'error': 'missing ref parameter'}
+        else:
+            try:
+                status, data = 200, self.endpoints[endpoint](ref)
+            except KeyError as error:
+                status, data = 404, {'error': error.args[0]}
+            except ValueError as error:
+                status, data = 400, {'error': error.args[0]}
+        return status, json.dumps(data, ensure_ascii=False).encode('UTF8')
+
+    def record(self, endpoint, status, latency):
+        """Update the counters with a handled request."""
+        with self.lock:
+            self.n_requests[endpoint] += 1
+            self.n_errors += status >= 400
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            bucket = next(b for b in latency_buckets if latency * 1000 <= b)
+            self.latency_histogram[bucket] += 1
+
+    def stats(self):
+        """Return the request, latency and cache counters."""
+        with self.lock:
+            uptime = time.time() - self.started
+            n_requests = sum(self.n_requests.values())
+            cache = self.respond.cache_info()
+            return {
+                'uptime': uptime,
+                'requests': n_requests,
+                'requests_by_endpoint': dict(self.n_requests),
+                'errors': self.n_errors,
+                'throughput': n_requests / uptime if uptime else 0.0,
+                'latency_mean_ms': 1000 * self.latency_total / n_requests if n_requests else 0.0,
+                'latency_max_ms': 1000 * self.latency_max,
+                'latency_histogram_ms': {
+                    f'<={b}': self.latency_histogram[b] for b in latency_buckets
+                },
+                'cache': {
+                    'hits': cache.hits,
+                    'misses': cache.misses,
+                    'size': cache.currsize,
+                    'maxsize': cache.maxsize,
+                },
+            }
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        start = time.perf_counter()
+        service = self.server.service
+        url = urlparse(self.path)
+        ref = parse_qs(url.query).get('ref', [None])[0]
+        if url.path == '/stats':
+            status = 200
+            body = json.dumps(service.stats()).encode('UTF8')
+        else:
+            status, body = service.respond(url.path, ref)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+        service.record(url.path, status, time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        if not self.server.silent:
+            super().log_message(format, *args)
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server which handles requests in a pool of threads."""
+
+    def __init__(self, address, service, workers=8, silent=False):
+        super().__init__(address, QueryHandler)
+        self.service = service
+        self.silent = silent
+        self.executor = ThreadPoolExecutor(workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+def make_server(json_dir='JSON', port=8000, workers=8, cache_size=1024, silent=False):
+    """Load the exports and return a server bound to localhost.
+
+    Args:
+        json_dir: directory with the parallel and morphology exports
+        port: port to listen on
+        workers: number of threads handling requests
+        cache_size: maximum number of cached responses
+        silent: boolean, False if you want to log every request
+
+    Returns:
+        PooledHTTPServer; call serve_forever on it to start serving
+    """
+    service = QueryService(json_dir, cache_size)
+    return PooledHTTPServer(('127.0.0.1', port), service, workers, silent)
+
+def run_service(json_dir='JSON', port=8000, workers=8, cache_size=1024, silent=False):
+    """Serve the exports until interrupted; see make_server for the arguments."""
+    server = make_server(json_dir, port, workers, cache_size, silent)
+    print(f'serving {len(server.service.verses)} verses at http://127.0.0.1:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='serve the converted CATSS corpus')
+    parser.add_argument('--json-dir', default='JSON')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument('--silent', action='store_true')
+    args = parser.parse_args()
+    run_service(args.json_dir, args.port, args.workers, args.cache_size, args.silent)
@@ -0,0 +1,260 @@
+"""
+Use normalize_ref to convert CATSS references and file names to USX-style
+book codes, e.g. Gen 1:1 to GEN 1:1, and ref_key to get a sortable integer
+key of a reference.
+
+References are parsed with one anchored pattern and their books are
+looked up in a dictionary of all spellings of the .par and .mlxx files,
+so that no order of patterns needs to be kept. Both functions are
+memoized, since every reference occurs many times across the stages.
+"""
+
+import regex
+import functools
+
+# books in canonical (LXX) order as (code, spellings); the id of a book is
+# its index + 1. The spellings are those of the references and file names
+# of the .par and .mlxx files, e.g. 01.Gen.1.mlxx, 20.Psalms.par or Ps 1:1
+books = (
+    ('GEN', ('Genesis', 'Gen')),
+    ('EXO', ('Exodus', 'Exod')),
+    ('LEV', ('Leviticus', 'Lev')),
+    ('NUM', ('Numbers', 'Num')),
+    ('DEU', ('Deuteronomy', 'Deut')),
+    ('JOS_B', ('JoshuaA', 'JoshB')),
+    ('JOS_A', ('JoshuaB', 'JoshA')),
+    ('JDG_B', ('JudgesB', 'JudgB')),
+    ('JDG_A', ('JudgesA', 'JudgA')),
+    ('RUT', ('Ruth',)),
+    ('1SA', ('1Sam/K', '1Sam')),
+    ('2SA', ('2Sam/K', '2Sam')),
+    ('1KI', ('1Kings', '1/3Kgs')),
+    ('2KI', ('2Kings', '2/4Kgs')),
+    ('1CH', ('1Chron', '1Chr')),
+    ('2CH', ('2Chron', '2Chr')),
+    ('1ES', ('1Esdras', '1Esdr')),
+    ('2ES', ('2Esdras',)),
+    ('EZR', ('Ezra', 'Ezr')),
+    ('NEH', ('Neh',)),
+    ('EST', ('Esther', 'Esth')),
+    ('ESG', ()),
+    ('JDT', ('Judith',)),
+    ('TOB_BA', ('TobitBA',)),
+    ('TOB_S', ('TobitS',)),
+    ('1MA', ('1Macc',)),
+    ('2MA', ('2Macc',)),
+    ('3MA', ('3Macc',)),
+    ('4MA', ('4Macc',)),
+    ('PSA', ('Psalms', 'Ps', 'Psalms1', 'Psalms2')),
+    ('PS151', ('Ps151',)),
+    ('ODA', ('Odes',)),
+    ('PRO', ('Prov', 'Proverbs')),
+    ('ECC', ('Qoh', 'Qoheleth')),
+    ('SNG', ('Song', 'Cant', 'Canticles')),
+    ('JOB', ('Job',)),
+    ('WIS', ('Wisdom',)),
+    ('SIR', ('Sirach', 'Sir')),
+    ('PSS', ('PsSol',)),
+    ('HOS', ('Hosea', 'Hos')),
+    ('MIC', ('Micah', 'Mic')),
+    ('AMO', ('Amos',)),
+    ('JOL', ('Joel',)),
+    ('JON', ('Jonah',)),
+    ('OBA', ('Obadiah', 'Obad')),
+    ('NAM', ('Nahum', 'Nah')),
+    ('HAB', ('Hab', 'Habakkuk')),
+    ('ZEP', ('Zeph',)),
+    ('HAG', ('Haggai', 'Hag')),
+    ('ZEC', ('Zech',)),
+    ('MAL', ('Malachi', 'Mal')),
+    ('ISA', ('Isaiah', 'Isa', 'Isaiah1', 'Isaiah2')),
+    ('JER', ('Jer', 'Jer1', 'Jer2')),
+    ('BAR', ('Baruch', 'Bar')),
+    ('LJE', ('EpJer',)),
+    ('LAM', ('Lam',)),
+    ('EZE', ('Ezekiel', 'Ezek', 'Ezek1', 'Ezek2')),
+    ('BEL_OG', ('BelOG',)),
+    ('BEL_TH', ('BelTh',)),
+    ('DAN', ('DanielOG', 'Dan')),
+    ('DAN_TH', ('DanielTh', 'DanTh')),
+    ('DAG', ()),
+    ('DAG_TH', ()),
+    ('SUS_OG', ('SusOG',)),
+    ('SUS_TH', ('SusTh',)),
+)
+
+# the morphology has the Greek Esther and Daniel where the
+# parallel files have the books aligned with the Hebrew
+mlxx_codes = {'EST': 'ESG', 'DAN': 'DAG', 'DAN_TH': 'DAG_TH'}
+
+book_ids = {code: i + 1 for i, (code, spellings) in enumerate(books)}
+book_codes = {
+    spelling: code for code, spellings in books
+        for spelling in spellings + (code,)
+}
+
+# e.g. Gen 1:1, Ps 151, 01.Genesis.par or 01.Gen.1.mlxx
+ref_pattern = regex.compile(r'^([A-Za-z1-9/]+) (\d+)(:?)(\d*)$')
+file_pattern = regex.compile(r'^(\d+)\.([^.]+)((?:\.\d+)?\.(?:par|mlxx))$')
+
+# the former regex normalizations; only used for spellings which are
+# missing from the books above
+legacy_ref_norms = [
+    (regex.compile(search), replace) for search, replace in (
+        ('Genesis|Gen', 'GEN'),
+        ('Exodus|Exod', 'EXO'),
+        ('Leviticus|Lev', 'LEV'),
+        ('Numbers|Num', 'NUM'),
+        ('Deuteronomy|Deut', 'DEU'),
+        ('JoshuaA|JoshB', 'JOS_B'),
+        ('JoshuaB|JoshA', 'JOS_A'),
+        ('JudgesB|JudgB', 'JDG_B'),
+        ('JudgesA|JudgA', 'JDG_A'),
+        ('Ruth', 'RUT'),
+        ('1Sam/K|1Sam', '1SA'),
+        ('2Sam/K|2Sam', '2SA'),
+        ('1Kings|1/3Kgs', '1KI'),
+        ('2Kings|2/4Kgs', '2KI'),
+        ('1Chron|1Chr', '1CH'),
+        ('2Chron|2Chr', '2CH'),
+        ('1Esdras|1Esdr', '1ES'),
+        ('Esther|Esth', 'EST'),
+        ('Ezra|Ezr', 'EZR'),
+        ('Neh', 'NEH'),
+        ('Ps151', 'PS151'),
+        ('Psalms|Ps', 'PSA'),
+        ('Prov', 'PRO'),
+        ('Qoh', 'ECC'),
+        ('Song|Cant', 'SNG'),
+        ('Job', 'JOB'),
+        ('Sirach|Sir', 'SIR'),
+        ('Hosea|Hos', 'HOS'),
+        ('Micah|Mic', 'MIC'),
+        ('Amos', 'AMO'),
+        ('Joel', 'JOL'),
+        ('Jonah', 'JON'),
+        ('Obadiah|Obad', 'OBA'),
+        ('Nahum|Nah', 'NAM'),
+        ('Hab', 'HAB'),
+        ('Zeph', 'ZEP'),
+        ('Haggai|Hag', 'HAG'),
+        ('Zech', 'ZEC'),
+        ('Malachi|Mal', 'MAL'),
+        ('Isaiah|Isa', 'ISA'),
+        ('Jer', 'JER'),
+        ('Baruch|Bar', 'BAR'),
+        ('Lam', 'LAM'),
+        ('Ezekiel|Ezek', 'EZE'),
+        ('DanielOG', 'DAN'),
+        ('DanielTh|DanTh', 'DAN_TH'),
+        ('Dan', 'DAN'),
+    )
+]
+
+def book_code(spelling, kind='par'):
+    """Return the code of a book spelling, or None if it is unknown.
+
+    Args:
+        spelling: e.g. Gen, Genesis or GEN
+        kind: 'par' or 'mlxx', the dataset the spelling comes from
+    """
+    code = book_codes.get(spelling)
+    if code and kind == 'mlxx':
+        code = mlxx_codes.get(code, code)
+    return code
+
+@functools.lru_cache(maxsize=None)
+def normalize_ref(ref_string, kind='par'):
+    """Convert the book of a reference or file name to its code.
+
+    E.g. Gen 1:1 to GEN 1:1, or 01.Genesis.par to 01.GEN.par
+
+    Raises:
+        Exception if the book is unknown
+    """
+    match = ref_pattern.match(ref_string) or file_pattern.match(ref_string)
+    if match:
+        code = book_code(match.group(2) if match.re is file_pattern else match.group(1), kind)
+        if code and match.re is file_pattern:
+            return f'{match.group(1)}.{code}{match.group(3)}'
+        elif code:
+            return code + ref_string[match.end(1):]
+
+    for search, replace in legacy_ref_norms:
+        if search.search(ref_string):
+            return search.sub(replace, ref_string)
+    # don't allow ref strings to stay the same
+    raise Exception(f'{ref_string} remains unchanged!')
+
+@functools.lru_cache(maxsize=None)
+def parse_ref(ref_string, kind='par'):
+    """Parse a reference into (book_id, chapter, verse).
+
+    A reference without a verse, e.g. Ps 151, has verse 0.
+
+    Raises:
+        ValueError if the reference is malformed or its book unknown
+    """
+    match = ref_pattern.match(ref_string)
+    code = match and book_code(match.group(1), kind)
+    if not code:
+        raise ValueError(f'cannot parse reference {ref_string}')
+    book, chapter, colon, verse = match.groups()
+    return book_ids[code], int(chapter), int(verse or 0)
+
+def pack_key(book_id, chapter, verse):
+    """Pack (book_id, chapter, verse) into an integer with the same sort order."""
+    return (book_id * 1000 + chapter) * 1000 + verse
+
+def unpack_key(key):
+    book_chapter, verse = divmod(key, 1000)
+    book_id, chapter = divmod(book_chapter, 1000)
+    return book_id, chapter, verse
+
+@functools.lru_cache(maxsize=None)
+def ref_key(ref_string, kind='par'):
+    """Return the integer key of a reference; see parse_ref and pack_key."""
+    return pack_key(*parse_ref(ref_string, kind))
+
+def key_ref(key):
+    """Return the normalized reference of an integer key, e.g. GEN 1:1.
+
+    A verse of 0 is left out, as in normalize_ref, e.g. PS151 151.
+    """
+    book_id, chapter, verse = unpack_key(key)
+    if not verse:
+        return f'{books[book_id-1][0]} {chapter}'
+    return f'{books[book_id-1][0]} {chapter}:{verse}'
+
+def file_book(file_name, kind='par'):
+    """Return the code of the book of a .par or .mlxx file name, or None."""
+    match = file_pattern.match(file_name)
+    return match and book_code(match.group(2), kind)
+
+def book_selection(books):
+    """Validate a selection of books, e.g. GEN or [GEN, PSA].
+
+    Returns:
+        frozenset of book codes, or None (all books) if books is None
+
+    Raises:
+        ValueError if a code is unknown
+    """
+    if books is None:
+        return None
+    if isinstance(books, str):
+        books = (books,)
+    unknown = [book for book in books if book not in book_ids]
+    if unknown:
+        raise ValueError(f'unknown book codes: {", ".join(unknown)}')
+    return frozenset(books)
+
+def selects(file_name, books):
+    """Return whether a file belongs to a selection of books; see book_selection.
+
+    The files of Esther and Daniel are selected by the codes of both
+    datasets, e.g. by EST as well as ESG; see mlxx_codes.
+    """
+    if books is None:
+        return True
+    return file_book(file_name, 'par') in books or file_book(file_name, 'mlxx') in books
@@ -0,0 +1,146 @@
+"""
+Use the lint_patterns function to stress-test the regex patterns of the
+pipeline against adversarial inputs of growing length.
+
+Every pattern in regex_patterns.py and the bulk normalizations of
+patch_catss.py is timed on inputs which are doubled in length several
+times. A pattern whose running time grows faster than the input (e.g.
+because of backtracking or end-of-line lookaheads which rescan the rest
+of the line at every position) is reported, so that a single pathological
+line cannot stall a whole run unnoticed.
+"""
+
+import math
+import time
+from pattern_registry import get_patterns
+
+# all pattern sets, given as (name, registry set); the compiled regex
+# is always the first element of a pattern tuple
+pattern_sets = [
+    ('common', 'common_tc'),
+    ('hebrew', 'heb_tc'),
+    ('greek', 'greek_tc'),
+    ('extra_bib', 'extra_bib_tc'),
+    ('normalization', 'normalizations'),
+]
+
+# units which are repeated to build adversarial inputs; most of them are
+# unclosed or unbalanced markup, which forces lazy quantifiers and
+# negative lookaheads to scan to the end of the line at every position
+seeds = [
+    'W/)RC ',
+    'KAI\\ TH\\N ',
+    'W/)RC\tKAI\\ ',
+    '{',
+    '{...',
+    '{..^',
+    '{d} ',
+    '<',
+    '< ',
+    '[',
+    '[[',
+    '?',
+    '^ ',
+    '=',
+    '=@',
+    '.',
+    '-',
+    ' ',
+    '\t',
+    'A',
+    ' (',
+]
+
+def time_pattern(pattern, string, repeats=2, timeout=None):
+    """Return the best time of scanning a string for all pattern matches."""
+    best = math.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        pattern.findall(string, timeout=timeout)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def grow_inputs(seed, sizes):
+    """Repeat a seed to build inputs of roughly the given lengths."""
+    return [seed * max(1, size // len(seed)) for size in sizes]
+
+def lint_pattern(pattern, sizes=(100, 200, 400, 800, 1600), repeats=2, timeout=5, budget=0.05):
+    """Measure how the scanning time of a pattern grows for every seed.
+
+    Inputs stop growing once a single scan takes longer than budget
+    seconds, so that badly behaved patterns don't dominate the run.
+
+    Returns:
+        list of (seed, exponent, times) where the exponent is the growth
+        order of the running time between the smallest and largest input,
+        i.e. ~1 for linear patterns and ~2 for quadratic patterns. A
+        pattern which exceeds the timeout has an infinite exponent.
+    """
+    results = []
+    for seed in seeds:
+        inputs = grow_inputs(seed, sizes)
+        times = []
+        try:
+            for string in inputs:
+                times.append(time_pattern(pattern, string, repeats, timeout))
+                if len(times) > 1 and times[-1] > budget:
+                    break
+        except TimeoutError:
+            results.append((seed, math.inf, times))
+            continue
+        first, last = max(times[0], 1e-7), max(times[-1], 1e-7)
+        ratio = len(inputs[len(times)-1]) / len(inputs[0])
+        exponent = math.log(last / first) / math.log(ratio)
+        results.append((seed, exponent, times))
+    return results
+
+def lint_patterns(sizes=(100, 200, 400, 800, 1600), threshold=1.5, min_time=1e-3,
+                  repeats=2, timeout=5, budget=0.05, silent=False):
+    """Stress-test all patterns of the pipeline for super-linear behaviour
+
+    Args:
+        sizes: lengths of the inputs each seed is grown to
+        threshold: growth exponent above which a pattern is reported
+        min_time: minimum time in seconds on the largest input for a
+            pattern to be reported; this filters out timing noise
+        repeats: number of timings per input, of which the best is kept
+        timeout: seconds allowed for a single scan before giving up
+        budget: seconds of a single scan after which inputs stop growing
+        silent: boolean, False if you want to print status updates
+
+    Returns:
+        list of (set name, pattern index, pattern, seed, exponent, times)
+        for the worst seed of every super-linear pattern, sorted from
+        the worst pattern downward.
+    """
+    findings = []
+    for name, registry_set in pattern_sets:
+        patterns = get_patterns(registry_set)
+        if not silent:
+            print(f'linting {len(patterns)} patterns of the {name} set...')
+        for i, pattern in enumerate(patterns):
+            results = lint_pattern(pattern[0], sizes, repeats, timeout, budget)
+            flagged = [
+                (seed, exponent, times) for seed, exponent, times in results
+                    if exponent > threshold and (not times or times[-1] >= min_time
+                                                 or exponent == math.inf)
+            ]
+            if flagged:
+                seed, exponent, times = max(flagged, key=lambda r: r[1])
+                findings.append((name, i, pattern[0].pattern, seed, exponent, times))
+
+    findings.sort(key=lambda f: f[4], reverse=True)
+    return findings
+
+def show_lint(findings):
+    """Print a report of super-linear patterns."""
+    if not findings:
+        print('no super-linear patterns found')
+    for name, i, pattern, seed, exponent, times in findings:
+        growth = 'TIMEOUT' if exponent == math.inf else f'O(n^{exponent:.1f})'
+        print(f'{name} {i}: `{pattern}`')
+        print(f'\t{growth} on repeated {seed!r}')
+        print('\ttimes: ' + ', '.join(f'{t*1000:.2f}ms' for t in times))
+
+if __name__ == '__main__':
+    show_lint(lint_patterns())
@@ -0,0 +1,220 @@
+"""
+Use take_snapshot to record a hash of every verse of a source or patched
+tree, diff_snapshots to compare two snapshots, and stale_anchors to find
+the manual edits and structural repairs of patch_catss whose lines fall
+in verses which changed, e.g. between two versions of the upstream files:
+
+    python snapshot.py source/ new_source/
+
+A snapshot keeps, for every file, the hash of the whole file and a list
+of (ref, first line, hash) of its verses, so that unchanged books are
+skipped with one comparison and changed books are compared verse by verse
+without diffing any text. A snapshot can be saved as JSON to compare
+against later, after the tree itself has been replaced.
+
+The lines of the edits refer to the source files, so stale_anchors is only
+meaningful for snapshots of source trees.
+"""
+
+import json
+import hashlib
+import argparse
+import collections
+from pathlib import Path
+from regex_patterns import ref_string
+
+# bump when the format of saved snapshots changes
+version = 1
+
+file_patterns = ('*.par', '*.mlxx')
+
+def digest(text):
+    return hashlib.blake2b(text.encode('UTF8'), digest_size=8).hexdigest()
+
+def verse_spans(lines):
+    """Return (ref, start, end) of the verses of a file.
+
+    Lines before the first reference are a verse with an empty ref.
+    """
+    starts = [i for i, line in enumerate(lines) if ref_string.match(line)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    ends = starts[1:] + [len(lines)]
+    return [
+        (lines[start] if ref_string.match(lines[start]) else '', start, end)
+            for start, end in zip(starts, ends)
+    ]
+
+def book_snapshot(text):
+    """Return the snapshot of the text of a single file."""
+    lines = text.split('\n')
+    return {
+        'hash': digest(text),
+        'lines': len(lines),
+        'verses': [
+            [ref, start, digest('\n'.join(lines[start:end]))]
+                for ref, start, end in verse_spans(lines)
+        ],
+    }
+
+def take_snapshot(data_dir, patterns=file_patterns):
+    """Hash the verses of all files of a tree.
+
+    Args:
+        data_dir: directory of the .par and .mlxx files
+        patterns: glob patterns of the files to include
+
+    Returns:
+        dict with the version and a dict of file name to its snapshot
+    """
+    books = {}
+    for pattern in patterns:
+        for file in sorted(Path(data_dir).glob(pattern)):
+            books[file.name] = book_snapshot(file.read_text())
+    return {'version': version, 'books': books}
+
+def save_snapshot(snapshot, path):
+    with open(path, 'w', encoding='UTF8') as outfile:
+        json.dump(snapshot, outfile)
+
+def load_snapshot(path):
+    with open(path, encoding='UTF8') as infile:
+        snapshot = json.load(infile)
+    if snapshot['version'] != version:
+        raise Exception(f'{path} has version {snapshot["version"]}; take a new snapshot')
+    return snapshot
+
+def get_snapshot(source):
+    """Return the snapshot of a tree, or load it if source is a saved snapshot."""
+    return take_snapshot(source) if Path(source).is_dir() else load_snapshot(source)
+
+def verse_keys(verses):
+    """Key the verses of a book snapshot by (ref, occurrence), since a few
+    refs occur more than once in a file."""
+    seen = collections.Counter()
+    keyed = {}
+    for ref, start, verse_digest in verses:
+        keyed[(ref, seen[ref])] = (start, verse_digest)
+        seen[ref] += 1
+    return keyed
+
+def diff_books(old, new):
+    """Compare the snapshots of two versions of a book.
+
+    Returns:
+        dict of lists of the added, removed and changed refs, and of the
+        moved refs: unchanged verses which start at another line
+    """
+    old_verses, new_verses = verse_keys(old['verses']), verse_keys(new['verses'])
+    diff = {'added': [], 'removed': [], 'changed': [], 'moved': []}
+    for key, (start, verse_digest) in old_verses.items():
+        if key not in new_verses:
+            diff['removed'].append(key[0])
+        elif new_verses[key][1] != verse_digest:
+            diff['changed'].append(key[0])
+        elif new_verses[key][0] != start:
+            diff['moved'].append(key[0])
+    diff['added'] = [key[0] for key in new_verses if key not in old_verses]
+    return diff
+
+def diff_snapshots(old, new):
+    """Compare two snapshots book by book.
+
+    Returns:
+        dict with the lists of books_added and books_removed, and a dict
+        of books, giving the diff of every changed book; see diff_books
+    """
+    old_books, new_books = old['books'], new['books']
+    return {
+        'books_added': [book for book in new_books if book not in old_books],
+        'books_removed': [book for book in old_books if book not in new_books],
+        'books': {
+            book: diff_books(snapshot, new_books[book])
+                for book, snapshot in old_books.items()
+                    if book in new_books and new_books[book]['hash'] != snapshot['hash']
+        },
+    }
+
+def edit_anchors():
+    """Return (kind, file, line, description) of the lines which the manual
+    edits and structural repairs of patch_catss depend on."""
+    from patch_catss import morpho_edits, parallel_edits, structural_repairs
+    anchors = []
+    for edits in (morpho_edits, parallel_edits):
+        file = ''
+        for edit in edits:
+            file = edit[0] or file
+            anchors.append(('manual edit', file, edit[1], f'manual edit: {file} line {edit[1]}'))
+    for file, ln, re_confirm, description, repair_ops in structural_repairs:
+        lines = {ln}
+        for kind, op_ln, arg in repair_ops:
+            # deletes and merges span arg lines
+            lines.update(range(op_ln, op_ln + (arg if kind != 'replace' else 1)))
+        for line in sorted(lines):
+            anchors.append(('structural repair', file, line, f'structural repair: {description}'))
+    return anchors
+
+def stale_anchors(old, diff, anchors=None):
+    """Find the edits and repairs whose lines fall in verses which changed.
+
+    Args:
+        old: snapshot of the source tree the edits were written for
+        diff: result of diff_snapshots of old and a new snapshot
+        anchors: list of (kind, file, line, description); see edit_anchors
+
+    Returns:
+        list of (kind, file, line, description, ref, status) where the status
+        is removed, changed or moved (the verse is the same, but its lines
+        have been shifted), or 'book removed'
+    """
+    anchors = edit_anchors() if anchors is None else anchors
+    stale = []
+    for kind, file, line, description in anchors:
+        if file in diff['books_removed']:
+            stale.append((kind, file, line, description, '', 'book removed'))
+            continue
+        book_diff = diff['books'].get(file)
+        if not book_diff or file not in old['books']:
+            continue
+        # find the verse of the line
+        verse = None
+        for ref, start, verse_digest in old['books'][file]['verses']:
+            if start > line:
+                break
+            verse = ref
+        if verse is None:
+            continue
+        for status in ('removed', 'changed', 'moved'):
+            if verse in book_diff[status]:
+                stale.append((kind, file, line, description, verse, status))
+                break
+    return stale
+
+def show_diff(diff, stale=()):
+    """Print a report of a diff and of the stale edits."""
+    for book in diff['books_added']:
+        print(f'added book {book}')
+    for book in diff['books_removed']:
+        print(f'removed book {book}')
+    for book, book_diff in diff['books'].items():
+        counts = ', '.join(f'{len(refs)} {status}' for status, refs in book_diff.items())
+        print(f'{book}: {counts}')
+        for status in ('added', 'removed', 'changed'):
+            for ref in book_diff[status]:
+                print(f'\t{status} {ref}')
+    if stale:
+        print(f'\n{len(stale)} edit lines fall in changed verses:')
+        for kind, file, line, description, ref, status in stale:
+            print(f'\t{file} line {line} ({ref or "-"}, {status}): {description}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compare two versions of the CATSS files')
+    parser.add_argument('old', help='directory or saved snapshot of the old version')
+    parser.add_argument('new', help='directory or saved snapshot of the new version')
+    parser.add_argument('--save', metavar='PATH', help='save the snapshot of the new version')
+    args = parser.parse_args()
+    old, new = get_snapshot(args.old), get_snapshot(args.new)
+    if args.save:
+        save_snapshot(new, args.save)
+    diff = diff_snapshots(old, new)
+    show_diff(diff, stale_anchors(old, diff))
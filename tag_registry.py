@@ -0,0 +1,204 @@
+"""
+Use TagRegistry to encode the text-critical tags of parsed tokens as
+integer codes, and to decode the codes back to tag names.
+
+Every bit of a 64-bit mask stands for one of the fixed tags of the
+common_tc, heb_tc and greek_tc patterns, in the order of the patterns,
+or for one of the tag_families of the tags which are formatted from a
+match, e.g. the chapter and verse of [118.127]. The formatted values
+themselves are kept in a side table, so that the thousands of distinct
+notes don't widen the masks.
+
+The code of a token is the index of its combination of tags, which is
+interned when it is first encoded; the registry keeps the mask and the
+formatted values of every combination. Encoding the tokens in the same
+order therefore always gives the same codes; see parse_parallel.
+
+Filtering tokens by combinations of tags becomes bitwise arithmetic on a
+uint64 array of their masks, see token_masks and select.
+"""
+
+import json
+import regex
+import string
+from array import array
+from pathlib import Path
+from pattern_registry import raw_patterns
+
+tag_sets = ('common_tc', 'heb_tc', 'greek_tc')
+
+# families of the formatted tags as (name, pattern of the values, description);
+# a value belongs to the first family whose pattern matches its beginning
+tag_families = (
+    ('doubt', r'\?+$', 'doubt on the word or the translation strategy'),
+    ('plus', r'--\+', 'element added in the Greek'),
+    ('minus', r'---', 'apparent minus in the MT'),
+    ('elsewhere', r'\^\^\^|\^ \^\^\^', 'equivalent occurs elsewhere in the verse'),
+    ('prep', r'prep', 'difference of a preposition or particle'),
+    ('infa', r'infa\.', 'infinitive absolute with additional data'),
+    ('int', r'int\.', 'interchange of cited letters'),
+    ('note', r'', 'notes <...> and verse differences [...] and [[...]]'),
+)
+
+# number of bits of a mask
+mask_bits = 64
+
+def fixed_tags(set_names=tag_sets):
+    """Return the tags of the patterns which aren't formatted from their match."""
+    tags = []
+    for name in set_names:
+        for pattern in raw_patterns(name):
+            template = pattern[2]
+            fields = [field for text, field, spec, conv in string.Formatter().parse(template) if field]
+            if not fields and template.format() not in tags:
+                tags.append(template.format())
+    return tags
+
+class TagRegistry:
+    """Interned tag names, their bits and the combinations of the tokens."""
+
+    def __init__(self, names=()):
+        self.names = []             # fixed tag or family of every bit
+        self.bits = {}              # bit of every name
+        self.masks = array('Q')     # mask of every code
+        self.values = []            # formatted values of every code
+        self.codes = {}             # code of every combination of tags
+        self.families = []          # (pattern, bit) of the families
+        for name in names:
+            self.intern(name)
+        for name, pattern, description in tag_families:
+            self.families.append((regex.compile(pattern), self.intern(name)))
+        self.family_mask = self.mask(*(name for name, pattern, description in tag_families))
+
+    @classmethod
+    def from_patterns(cls, set_names=tag_sets):
+        return cls(fixed_tags(set_names))
+
+    def intern(self, name):
+        """Return the bit of a fixed tag or family, adding it if it is new.
+
+        Raises:
+            ValueError if all bits of the masks are taken
+        """
+        bit = self.bits.get(name)
+        if bit is None:
+            if len(self.names) == mask_bits:
+                raise ValueError(f'no bit left for tag {name}')
+            bit = self.bits[name] = len(self.names)
+            self.names.append(name)
+        return bit
+
+    def family(self, value):
+        """Return the bit of the family of a formatted tag."""
+        for pattern, bit in self.families:
+            if pattern.match(value):
+                return bit
+
+    def encode(self, tags):
+        """Return the code of an iterable of tag names."""
+        key = frozenset(tags)
+        code = self.codes.get(key)
+        if code is None:
+            mask = 0
+            values = []
+            for tag in key:
+                bit = self.bits.get(tag)
+                # formatted values may coincide with the name of a family
+                if bit is None or self.family_mask >> bit & 1:
+                    bit = self.family(tag)
+                    values.append(tag)
+                mask |= 1 << bit
+            code = self.codes[key] = len(self.masks)
+            self.masks.append(mask)
+            self.values.append(tuple(sorted(values)))
+        return code
+
+    def decode(self, code):
+        """Return the sorted tag names of a code."""
+        mask = self.masks[code] & ~self.family_mask
+        names = []
+        while mask:
+            low = mask & -mask
+            names.append(self.names[low.bit_length() - 1])
+            mask ^= low
+        return tuple(sorted(names + list(self.values[code])))
+
+    def mask(self, *names):
+        """Return the mask of known tags or families, e.g. to filter with.
+
+        Raises:
+            KeyError if a name is unknown
+        """
+        mask = 0
+        for name in names:
+            mask |= 1 << self.bits[name]
+        return mask
+
+    def value_codes(self, value):
+        """Return the codes whose formatted values include value."""
+        return [code for code, values in enumerate(self.values) if value in values]
+
+    def token_masks(self, codes):
+        """Return a numpy uint64 array of the masks of a sequence of codes."""
+        import numpy
+        masks = numpy.frombuffer(self.masks, dtype=numpy.uint64)
+        return masks[numpy.asarray(codes, dtype=numpy.intp)]
+
+    def save(self, path):
+        data = {'names': self.names, 'masks': list(self.masks), 'values': self.values}
+        Path(path).write_text(json.dumps(data, ensure_ascii=False), encoding='UTF8')
+
+    @classmethod
+    def load(cls, path):
+        data = json.loads(Path(path).read_text(encoding='UTF8'))
+        registry = cls(data['names'])
+        for mask, values in zip(data['masks'], data['values']):
+            registry.masks.append(mask)
+            registry.values.append(tuple(values))
+        for code in range(len(registry.masks)):
+            registry.codes[frozenset(registry.decode(code))] = code
+        return registry
+
+def encode_verses(verses, registry):
+    """Return a copy of parsed verses with the tags of the tokens encoded as bitmasks."""
+    return [
+        [row if isinstance(row, str) else [
+            # lines with parsing errors have no tokens
+            [e if isinstance(e, str) else (e[0], registry.encode(e[1])) for e in column]
+                for column in row
+        ] for row in verse]
+            for verse in verses
+    ]
+
+def decode_verses(verses, registry):
+    """Return a copy of parsed verses with the bitmasks of the tokens decoded to tags."""
+    return [
+        [row if isinstance(row, str) else [
+            [e if isinstance(e, str) else (e[0], registry.decode(e[1])) for e in column]
+                for column in row
+        ] for row in verse]
+            for verse in verses
+    ]
+
+def select(masks, all_of=0, any_of=0, none_of=0):
+    """Return the indices of the masks with all tags of all_of, any tag
+    of any_of (if given) and no tag of none_of; see TagRegistry.mask
+
+    The masks are filtered at once with bitwise operations on a uint64
+    array; numpy (pip install numpy) is only needed here and in
+    TagRegistry.token_masks.
+
+    Args:
+        masks: uint64 array or sequence of masks, e.g. of token_masks
+
+    Returns:
+        numpy array of the indices
+    """
+    import numpy
+    masks = numpy.asarray(masks, dtype=numpy.uint64)
+    all_of, any_of, none_of = (numpy.uint64(mask) for mask in (all_of, any_of, none_of))
+    keep = (~masks & all_of) == 0
+    if any_of:
+        keep &= (masks & any_of) != 0
+    keep &= (masks & none_of) == 0
+    return numpy.flatnonzero(keep)
@@ -0,0 +1,197 @@
+"""
+Use tc_stats to count the text-critical tags of the patched parallel
+files, e.g. doublets, transpositions or retroversions, per book and
+chapter, and show_stats to print a summary.
+
+The statistics are computed map-reduce style: the tags of every book
+are counted (map), and the per-book Counters are merged in canonical book
+order (reduce). The books are taken from the output of parse_parallel,
+either given as para_data or parsed with its workers and verse cache. The
+counts of every book are cached together with a key made from the content
+of the file and the cache key of the parser, so that a new run only
+counts the books which changed.
+"""
+
+import json
+import hashlib
+import itertools
+import collections
+from pathlib import Path
+from parse_parallel import parse_parallel, non_canon
+from parse_parallel import cache_key as parser_key
+from references import normalize_ref, file_book
+
+# bump when the counts below change, to invalidate all cached results
+version = 1
+
+column_names = ('heb_a', 'heb_b', 'grk')
+
+# the statistics which are counted per book; the keys of all Counters
+# are tuples ending with the tag
+# • rows - alignment rows (data-lines) in which a tag occurs
+# • elements - elements of the columns which carry a tag
+# • columns - elements which carry a tag, per column
+# • chapters - rows in which a tag occurs, per chapter
+# • cooccurrences - rows in which two tags occur together
+stat_names = ('rows', 'elements', 'columns', 'chapters', 'cooccurrences')
+
+def book_stats(verses):
+    """Count the tags of the parsed verses of a book (the map step).
+
+    Args:
+        verses: parsed verses of a book, as returned by parse_parallel,
+            without tag codes
+
+    Returns:
+        dict of statistic name to Counter; see stat_names
+    """
+    stats = {name: collections.Counter() for name in stat_names}
+    for verse in verses:
+
+        # verses start with their ref, unless there is text before
+        # the first ref of a book
+        if verse and isinstance(verse[0], str):
+            chapter = verse[0].split(':')[0]
+            rows = verse[1:]
+        else:
+            chapter = ''
+            rows = verse
+
+        for row in rows:
+            row_tags = set()
+            for column_name, column in zip(column_names, row):
+                for element in column:
+                    # lines with parsing errors have no elements
+                    if isinstance(element, str):
+                        continue
+                    for tag in element[1]:
+                        stats['elements'][(tag,)] += 1
+                        stats['columns'][(column_name, tag)] += 1
+                        row_tags.add(tag)
+            for tag in row_tags:
+                stats['rows'][(tag,)] += 1
+                stats['chapters'][(chapter, tag)] += 1
+            for pair in itertools.combinations(sorted(row_tags), 2):
+                stats['cooccurrences'][pair] += 1
+    return stats
+
+def cache_key(path, parser=None):
+    """Return the key of the cached statistics of a file.
+
+    Args:
+        path: path of the .par file
+        parser: parse_parallel.cache_key(), which covers the patterns and
+            the code of the parser; computed if not given
+    """
+    digest = hashlib.sha1(Path(path).read_bytes())
+    digest.update(f'{parser or parser_key()} version {version}'.encode())
+    return digest.hexdigest()
+
+def dump_stats(stats):
+    """Make the statistics of a book JSON serializable."""
+    return {
+        name: [list(key) + [n] for key, n in counter.items()]
+            for name, counter in stats.items()
+    }
+
+def load_stats(data):
+    return {
+        name: collections.Counter({tuple(item[:-1]): item[-1] for item in items})
+            for name, items in data.items()
+    }
+
+def merge_stats(book_results):
+    """Merge the statistics of the books (the reduce step).
+
+    Args:
+        book_results: list of (book, stats) in canonical order
+
+    Returns:
+        dict of the merged Counters of every statistic, plus 'books',
+        a dict of book to a Counter of the rows in which each tag occurs
+    """
+    merged = {name: collections.Counter() for name in stat_names}
+    merged['books'] = {}
+    for book, stats in book_results:
+        for name in stat_names:
+            merged[name].update(stats[name])
+        merged['books'][book] = collections.Counter({
+            key[0]: n for key, n in stats['rows'].items()
+        })
+    return merged
+
+def tc_stats(data_dir='source/patched', cache_dir=None, processes=None, timeout=None,
+             silent=False, para_data=None):
+    """Count the text-critical tags of all parallel files.
+
+    Args:
+        data_dir: directory containing the patched .par files
+        cache_dir: directory for the cached statistics of every book,
+            defaults to data_dir/tc_stats
+        processes: number of worker processes to parse with; None parses
+            the books serially in this process; see parse_parallel
+        timeout: optional number of seconds allowed for any single regex
+            match when parsing; see parse_parallel
+        silent: boolean, False if you want to print status updates
+        para_data: optional books as returned by parse_parallel for the
+            files of data_dir, without tag codes, to count without parsing
+
+    Returns:
+        dict of Counters; see merge_stats
+    """
+
+    def report(msg):
+        if not silent:
+            print(msg)
+
+    cache_dir = Path(cache_dir or Path(data_dir).joinpath('tc_stats'))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # load the books which haven't changed from the cache
+    files = [f for f in sorted(Path(data_dir).glob('*.par')) if f.name not in non_canon]
+    results = {}
+    keys = {}
+    parser = parser_key()
+    for file in files:
+        keys[file] = cache_key(file, parser)
+        cache_file = cache_dir.joinpath(file.name + '.json')
+        if cache_file.exists():
+            cached = json.loads(cache_file.read_text())
+            if cached['key'] == keys[file]:
+                results[file] = load_stats(cached['stats'])
+
+    # count the books which have changed
+    changed = [file for file in files if file not in results]
+    report(f'{len(files) - len(changed)} books cached, counting {len(changed)} books...')
+    if changed and para_data is None:
+        # parse only the changed books, reusing the verse cache of the parser
+        books = [file_book(file.name) for file in changed]
+        para_data, errors, book_errors = parse_parallel(
+            data_dir, silent=True, timeout=timeout, processes=processes,
+            books=None if None in books else books,
+        )
+    parsed = {book_data[0]: book_data[1:] for book_data in para_data or ()}
+
+    for file in changed:
+        stats = results[file] = book_stats(parsed.get(normalize_ref(file.name), []))
+        cache_data = {'key': keys[file], 'stats': dump_stats(stats)}
+        cache_dir.joinpath(file.name + '.json').write_text(json.dumps(cache_data, ensure_ascii=False))
+
+    # merge the books in canonical order
+    return merge_stats([(normalize_ref(file.name), results[file]) for file in files])
+
+def show_stats(stats, top=20):
+    """Print the most frequent tags with their books and co-occurring tags."""
+    for (tag,), n in stats['rows'].most_common(top):
+        books = sorted(
+            ((book, counts[tag]) for book, counts in stats['books'].items() if counts[tag]),
+            key=lambda b: b[1], reverse=True
+        )
+        print(f'{tag}: {n} rows, {stats["elements"][(tag,)]} elements')
+        print('\tbooks: ' + ', '.join(f'{book} {count}' for book, count in books[:5]))
+        pairs = [
+            (b if a == tag else a, count) for (a, b), count in stats['cooccurrences'].most_common()
+                if tag in (a, b)
+        ]
+        if pairs:
+            print('\twith: ' + ', '.join(f'{other} {count}' for other, count in pairs[:5]))
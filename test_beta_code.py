@@ -0,0 +1,32 @@
+import pytest
+from beta_code import beta2unicode, beta2unicode_batch
+
+# the accents are those of greekutils, i.e. the oxia forms
+qeos = 'θε\u1f79ς'
+
+def test_letters_and_diacritics():
+    assert beta2unicode('A)/NQRWPOS') == 'ἄνθρωπος'
+    assert beta2unicode('KAI\\') == 'καὶ'
+    assert beta2unicode('A)RXH=|') == 'ἀρχῇ'
+
+def test_capitals_take_their_diacritics_before_or_after():
+    assert beta2unicode('*)ABRAA/M') == 'Ἀβρα\u1f71μ'
+    assert beta2unicode('*A)BRAA/M') == 'Ἀβρα\u1f71μ'
+
+def test_final_sigma():
+    assert beta2unicode('QEO/S') == qeos
+    # as in greekutils, a final sigma swallows the space after it
+    assert beta2unicode('QEO/S KAI\\') == qeos + 'καὶ'
+    assert beta2unicode('QEO/S,') == qeos + ','
+
+def test_primes():
+    assert beta2unicode('B/') == 'β\u0374'
+    with pytest.raises(KeyError):
+        beta2unicode('B/', primes=False)
+
+def test_unknown_sequence():
+    with pytest.raises(KeyError):
+        beta2unicode('A%')
+
+def test_batch():
+    assert beta2unicode_batch(['QEO/S', 'KAI\\', 'QEO/S']) == [qeos, 'καὶ', qeos]
@@ -0,0 +1,21 @@
+from divergence import alignment, compress_ops
+
+def test_identical():
+    assert alignment([1, 2, 3], [1, 2, 3]) == (0, ['=', '=', '='])
+
+def test_operations():
+    assert alignment([1, 2, 3], [1, 4, 3]) == (1, ['=', 'X', '='])
+    assert alignment([1, 2, 3], [1, 3]) == (1, ['=', 'D', '='])
+    assert alignment([1, 3], [1, 2, 3]) == (1, ['=', 'I', '='])
+
+def test_transposition_counts_once():
+    assert alignment([1, 2, 3, 4], [1, 3, 2, 4]) == (1, ['=', 'T', '='])
+
+def test_band_is_widened():
+    a = list(range(1, 11))
+    distance, ops = alignment(a, a[::-1])
+    assert distance == 9
+    assert sum(2 if op == 'T' else 0 if op == 'I' else 1 for op in ops) == len(a)
+
+def test_compress_ops():
+    assert compress_ops(['=', '=', '=', 'X', '=', '=', 'T']) == '3=1X2=1T'
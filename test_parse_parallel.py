@@ -0,0 +1,45 @@
+import json
+from parse_parallel import parse_parallel
+
+book = 'Gen 1:1\nW/)RC\tKAI\\ TH\\N GH=N\n\nGen 1:2\nBR)\tE)POI/HSEN\n'
+
+def reparsed(metrics_dir):
+    metrics = json.loads(metrics_dir.joinpath('catss_parse.json').read_text())
+    return metrics['verses_reparsed_total']
+
+def run(data_dir, **kwargs):
+    metrics_dir = data_dir.joinpath('metrics')
+    para_data, errors, book_errors = parse_parallel(
+        data_dir, silent=True, metrics_dir=metrics_dir, **kwargs
+    )
+    return para_data, reparsed(metrics_dir)
+
+def test_cache_hit_and_miss(tmp_path):
+    tmp_path.joinpath('01.Genesis.par').write_text(book)
+    first, n = run(tmp_path)
+    assert n == 2
+    assert tmp_path.joinpath('parse_cache', '01.Genesis.par.json').exists()
+
+    second, n = run(tmp_path)
+    assert n == 0
+    assert second == first
+
+    tmp_path.joinpath('01.Genesis.par').write_text(book.replace('BR)', 'BR)$YT'))
+    third, n = run(tmp_path)
+    assert n == 1
+    assert third[0][1] == first[0][1]
+    assert third[0][2] != first[0][2]
+
+def test_cache_can_be_turned_off(tmp_path):
+    tmp_path.joinpath('01.Genesis.par').write_text(book)
+    run(tmp_path, cache_dir=False)
+    _, n = run(tmp_path, cache_dir=False)
+    assert n == 2
+    assert not tmp_path.joinpath('parse_cache').exists()
+
+def test_patched_books_in_memory(tmp_path):
+    tmp_path.joinpath('01.Genesis.par').write_text(book)
+    from_disk, n = run(tmp_path, cache_dir=False)
+    patched = {'01.Genesis.par': book.split('\n')}
+    in_memory = parse_parallel(patched=patched, silent=True, chunk_size=1)[0]
+    assert in_memory == from_disk
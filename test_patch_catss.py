@@ -0,0 +1,47 @@
+import regex
+from patch_catss import repair_lines, normalize_line
+
+def repair(file, lines, operations=None):
+    return repair_lines(file, lines, operations or {}, report=lambda msg: None)
+
+def test_orphan_is_merged_up_to_the_greek_column():
+    lines = ['Dan 6:17', 'L/DNY)L\tTO\\N', 'DANIHL', 'W/\tKAI\\']
+    repaired, line_map, orphans = repair('DanTh.par', lines)
+    assert repaired == ['Dan 6:17', 'L/DNY)L\tTO\\NDANIHL', 'W/\tKAI\\']
+    assert line_map == [0, 1, 1, 2]
+    assert orphans == [1]
+
+def test_psalms_orphan_is_merged_down_to_the_hebrew_column():
+    lines = ['Ps 1:1', 'A\tB', 'PS', 'YM\tC']
+    repaired, line_map, orphans = repair('20.Psalms.par', lines)
+    assert repaired == ['Ps 1:1', 'A\tB', 'PSYM\tC']
+    assert line_map == [0, 1, 2, 2]
+    assert orphans == [2]
+
+def test_psalms_orphan_at_the_end_of_the_file_is_kept():
+    reports = []
+    lines = ['Ps 1:1', 'A\tB', 'PS']
+    repaired, line_map, orphans = repair_lines('20.Psalms.par', lines, {}, report=reports.append)
+    assert repaired == ['Ps 1:1', 'A\tBPS']
+    assert line_map == [0, 1, 1]
+    assert orphans == [1]
+    assert 'no line follows the orphan' in reports[-1]
+
+def test_structural_repairs():
+    lines = ['Gen 1:1', 'A\tB', 'x', 'y', 'C\t', 'D', 'E\tF']
+    operations = {1: ('replace', 'A\tb'), 2: ('delete', 2), 4: ('merge', 2)}
+    repaired, line_map, orphans = repair('01.Genesis.par', lines, operations)
+    assert repaired == ['Gen 1:1', 'A\tb', 'C\tD', 'E\tF']
+    assert line_map == [0, 1, None, None, 2, 2, 3]
+    assert orphans == []
+
+def test_normalize_line_in_one_column():
+    search = regex.compile('A')
+    assert normalize_line(search, 'X', 'A\tA') == ('X\tX', 2)
+    assert normalize_line(search, 'X', 'A\tA', 'heb') == ('X\tA', 1)
+    assert normalize_line(search, 'X', 'A\tA', 'grk') == ('A\tX', 1)
+
+def test_normalize_line_without_columns_or_with_newlines():
+    search = regex.compile('A')
+    assert normalize_line(search, 'X', 'A', 'heb') == ('A', 0)
+    assert normalize_line(search, 'X', 'A\tA\nA\tA', 'grk') == ('A\tX\nA\tX', 2)
@@ -0,0 +1,39 @@
+import os
+from provenance import build_provenance, write_provenance, read_sidecar, trace
+
+def test_round_trip(tmp_path):
+    provenance = build_provenance([0, 0, 1], ['ab', 'c'], {1: [0]}, {1: [1]})
+    write_provenance(tmp_path, {'01.Genesis.par': provenance}, ['edit', 'merge'])
+    sidecar = read_sidecar(tmp_path.joinpath('provenance', '01.Genesis.par.prov'))
+    assert [list(part) for part in sidecar] == [list(part) for part in provenance]
+    assert trace('01.Genesis', 0, tmp_path) == ([0, 1], ['edit'])
+    assert trace('01.Genesis.par', 1, tmp_path) == ([2], ['merge'])
+
+def test_lines_with_newlines_share_their_provenance(tmp_path):
+    provenance = build_provenance([0, 1], ['a\nb', 'c'], {0: [0]})
+    write_provenance(tmp_path, {'x.par': provenance}, ['edit'])
+    assert trace('x', 0, tmp_path) == ([0], ['edit'])
+    assert trace('x', 1, tmp_path) == ([0], ['edit'])
+    assert trace('x', 2, tmp_path) == ([1], [])
+
+def test_rules_of_deleted_lines_are_kept(tmp_path):
+    line_map = [None, 0, None, 1]
+    provenance = build_provenance(line_map, ['a', 'b'], {0: [0], 2: [1]})
+    write_provenance(tmp_path, {'x.par': provenance}, ['first', 'second'])
+    assert trace('x', 0, tmp_path) == ([1], ['first', 'second'])
+
+def test_trace_sees_a_rewritten_sidecar(tmp_path):
+    write_provenance(tmp_path, {'x.par': build_provenance([0], ['a'], {0: [0]})}, ['old'])
+    assert trace('x', 0, tmp_path) == ([0], ['old'])
+    write_provenance(tmp_path, {'x.par': build_provenance([0, 0], ['ab'])}, ['new'])
+    path = tmp_path.joinpath('provenance', 'x.par.prov')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert trace('x', 0, tmp_path) == ([0, 1], [])
+
+def test_merged_rule_tables(tmp_path):
+    write_provenance(tmp_path, {'x.par': build_provenance([0], ['a'], {0: [0]})}, ['a rule'])
+    write_provenance(tmp_path, {'y.par': build_provenance([0], ['b'], {0: [1]})},
+                     ['other', 'a rule'], merge=True)
+    assert trace('x', 0, tmp_path) == ([0], ['a rule'])
+    assert trace('y', 0, tmp_path) == ([0], ['a rule'])
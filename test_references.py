@@ -0,0 +1,35 @@
+import pytest
+from references import normalize_ref, ref_key, key_ref, book_selection, selects
+
+def test_normalize_ref():
+    assert normalize_ref('Gen 1:1') == 'GEN 1:1'
+    assert normalize_ref('1/3Kgs 2:46') == '1KI 2:46'
+    assert normalize_ref('Ps151 151') == 'PS151 151'
+    assert normalize_ref('01.Genesis.par') == '01.GEN.par'
+    assert normalize_ref('11.Ruth.mlxx', 'mlxx') == '11.RUT.mlxx'
+
+def test_normalize_ref_of_unknown_book():
+    with pytest.raises(Exception):
+        normalize_ref('Xyz 1:1')
+
+def test_ref_key_sorts_canonically():
+    refs = ['GEN 1:1', 'Gen 1:2', 'Gen 2:1', 'Exod 1:1']
+    assert sorted(refs, key=ref_key) == refs
+    assert ref_key('Gen 10:1') > ref_key('Gen 9:30')
+
+def test_key_ref_round_trip():
+    assert key_ref(ref_key('Gen 1:1')) == 'GEN 1:1'
+    assert key_ref(ref_key('Ps151 151')) == 'PS151 151'
+
+def test_ref_key_of_malformed_ref():
+    with pytest.raises(ValueError):
+        ref_key('Gen')
+
+def test_book_selection():
+    books = book_selection(['GEN', 'EST'])
+    assert selects('01.Genesis.par', books)
+    assert not selects('05.Deut.par', books)
+    assert selects('20.Esther.mlxx', books)
+    assert selects('01.Genesis.par', None)
+    with pytest.raises(ValueError):
+        book_selection('XYZ')
@@ -1,76 +1,24 @@
-from regex_patterns import *
-import collections
-from pathlib import Path
+import argparse
+from pattern_coverage import compile_patterns, pattern_coverage, show_coverage
 
-data = Path('source/patched')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='check that all text-critical patterns match')
+    parser.add_argument('--data-dir', default='source/patched', help='directory of the patched .par files')
+    parser.add_argument('--processes', type=int, help='number of worker processes; serial by default')
+    args = parser.parse_args()
 
-re_sets = [
-    ('common', common_tc),
-    ('hebrew', heb_tc),
-    ('greek', greek_tc),
-]
+    # make sure all patterns compile without error
+    print('compiling patterns')
+    compile_patterns()
 
-comps = collections.defaultdict(list)
+    # test that all patterns work as expected and
+    # are able to retrieve at least some matches
+    print('gathering examples...')
+    coverage = pattern_coverage(args.data_dir, processes=args.processes)
 
-# make sure all patterns compile without error
-for name, patterns in re_sets:
-    print(f'compiling {name}')
-    for i, pattern in enumerate(patterns):
-        try:
-            comps[name].append(regex.compile(pattern[0]))
-        except:
-            raise Exception(f'Problem in pattern {i} of {name} set: {pattern}')
-
-# test that all patterns work as expected and
-# are able to retrieve at least some matches
-examples = collections.defaultdict(lambda: collections.defaultdict(list))
-
-def add_ex(set, pattern, string):
-    test = pattern.search(string)
-    if test:
-        examples[set][pattern.pattern].append((string, test.group(0)))
-
-print('gathering examples...')
-for set, patterns in comps.items():
-    print(f'\tgathering examples in set {set}')
-    for pattern in patterns:
-        done = False
-        for file in sorted(data.glob('*.par')):
-            if done:
-                break
-            for line in file.read_text().split('\n'):
-
-                # skip reference string lines
-                if ref_string.match(line) or not line:
-                    continue
-
-                try:
-                    heb_col, grk_col = line.split('\t')
-                except:
-                    raise Exception(file, line)
-    
-                if set == "common":
-                    add_ex(set, pattern, line)
-                elif set == "hebrew":
-                    add_ex(set, pattern, heb_col)
-                elif set == "greek":
-                    add_ex(set, pattern, grk_col)
-
-                if len(examples[set][pattern.pattern]) > 5:
-                    done = True
-                    break
-
-# show all matched patterns
-for set, patterns in examples.items():
+    # show all matched patterns
     print('showing examples')
-    print()
-    print(f'------ {set} set -----')
-    print()
-    for i, pattern in enumerate(patterns):
-        exs = patterns[pattern]
-        print(i, pattern)
-        if len(exs) == 0:
-            raise Exception(f'pattern has no matches!')
-        for ex in exs:
-            print(f'\t{ex}')
-        print()
+    show_coverage(coverage)
+
+    if coverage['unmatched']:
+        raise Exception(f'patterns have no matches! {coverage["unmatched"]}')
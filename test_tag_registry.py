@@ -0,0 +1,38 @@
+import pytest
+from tag_registry import TagRegistry, select, mask_bits
+
+@pytest.fixture
+def registry():
+    return TagRegistry.from_patterns()
+
+def test_masks_fit_in_64_bits(registry):
+    assert len(registry.names) <= mask_bits
+    for i in range(1000):
+        registry.encode(['ARA', f'{i}.{i}'])
+    assert max(registry.masks).bit_length() <= mask_bits
+
+def test_round_trip(registry, tmp_path):
+    code = registry.encode(['ARA', '118.127', '?'])
+    assert registry.encode(('?', 'ARA', '118.127')) == code
+    assert registry.decode(code) == ('118.127', '?', 'ARA')
+    registry.save(tmp_path.joinpath('tags.json'))
+    loaded = TagRegistry.load(tmp_path.joinpath('tags.json'))
+    assert loaded.decode(code) == ('118.127', '?', 'ARA')
+    assert loaded.encode(['ARA', '118.127', '?']) == code
+
+def test_select(registry):
+    pytest.importorskip('numpy')
+    codes = [registry.encode(tags) for tags in (
+        ['ARA'], ['ARA', '118.127'], [], ['trans', '?'], ['prep'],
+    )]
+    masks = registry.token_masks(codes)
+    assert str(masks.dtype) == 'uint64'
+    assert list(select(masks, all_of=registry.mask('ARA'))) == [0, 1]
+    assert list(select(masks, all_of=registry.mask('ARA', 'note'))) == [1]
+    assert list(select(masks, any_of=registry.mask('doubt', 'prep'))) == [3, 4]
+    assert list(select(masks, none_of=registry.mask('ARA'))) == [2, 3, 4]
+    assert registry.value_codes('118.127') == [codes[1]]
+
+def test_unknown_tag(registry):
+    with pytest.raises(KeyError):
+        registry.mask('no such tag')
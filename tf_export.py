@@ -0,0 +1,259 @@
+"""
+Use export_tf to convert the morphology exports in JSON/morphology to
+Text-Fabric (.tf) feature files, and load_feature to read a single
+feature back without loading the rest of the corpus.
+
+Every word is a slot, numbered 1 to max_slot in the order of the exports.
+Books, chapters and verses get the following node numbers, in that order,
+and the words they contain are given by the oslots edge feature; the type
+of every node is given by otype. Each feature is a separate file, with
+one line per node:
+
+    [node spec<tab>]value
+
+The node spec is left out when a node follows the node of the previous
+line, and nodes without a value are skipped by giving the spec of the
+next node. A run of nodes with the same value is a single line with a
+range, e.g. 12-57<tab>aorist. The conversion of the words themselves is
+that of dev/generate_morph.ipynb, which writes the exports.
+"""
+
+import json
+from pathlib import Path
+from datetime import datetime
+
+# features of the words as (name, value type, description);
+# the keys of the words of the morphology exports
+word_features = (
+    ('utf8', 'str', 'word in Greek characters'),
+    ('trans', 'str', 'word in the Beta Code transcription of CATSS'),
+    ('lexeme', 'str', 'lexeme in transcription'),
+    ('typ', 'str', 'part of speech, e.g. noun or verb'),
+    ('styp', 'str', 'CATSS code of the part of speech, e.g. N1 or VA'),
+    ('case', 'str', 'case of nominals and participles'),
+    ('number', 'str', 'number'),
+    ('gender', 'str', 'gender'),
+    ('degree', 'str', 'degree of adjectives'),
+    ('tense', 'str', 'tense of verbs'),
+    ('voice', 'str', 'voice of verbs'),
+    ('mood', 'str', 'mood of verbs'),
+    ('person', 'str', 'person of verbs'),
+    ('morph_code', 'str', 'CATSS morphology code'),
+)
+
+# features of the section nodes, see build_nodes
+section_features = (
+    ('book', 'str', 'book code, on book nodes'),
+    ('chapter', 'int', 'chapter number, on chapter nodes'),
+    ('verse', 'int', 'verse number, on verse nodes'),
+)
+
+# the node types from big to small; words are the slots
+node_types = ('book', 'chapter', 'verse')
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+def unescape(value):
+    chars = []
+    i = 0
+    while i < len(value):
+        if value[i] == '\\' and i + 1 < len(value):
+            chars.append({'t': '\t', 'n': '\n'}.get(value[i+1], value[i+1]))
+            i += 2
+        else:
+            chars.append(value[i])
+            i += 1
+    return ''.join(chars)
+
+def spec(start, end):
+    return str(start) if start == end else f'{start}-{end}'
+
+def node_lines(values):
+    """Encode a dict of node to value as the lines of a node feature.
+
+    Runs of consecutive nodes with the same value become a range.
+    """
+    lines = []
+    previous = 0
+    nodes = sorted(values)
+    i = 0
+    while i < len(nodes):
+        start = end = nodes[i]
+        while i + 1 < len(nodes) and nodes[i+1] == end + 1 and values[nodes[i+1]] == values[start]:
+            i += 1
+            end = nodes[i]
+        value = escape(values[start])
+        if start == previous + 1 and start == end:
+            lines.append(value)
+        else:
+            lines.append(f'{spec(start, end)}\t{value}')
+        previous = end
+        i += 1
+    return lines
+
+def write_tf(path, kind, metadata, lines):
+    """Write a .tf file of kind node, edge or config."""
+    head = [f'@{kind}'] + [f'@{key}={value}' for key, value in metadata.items()]
+    with open(path, 'w', encoding='UTF8') as outfile:
+        outfile.write('\n'.join(head + [''] + lines) + '\n')
+
+def build_nodes(json_dir='JSON'):
+    """Number the words and section nodes of the morphology exports.
+
+    Returns:
+        tuple of (words, sections, features) where words is the list of
+        word dicts, sections is a list of (type, first slot, last slot) of
+        the section nodes in node order, and features is a dict of the
+        section features to a dict of node to value
+    """
+    words = []
+    verses = []     # (book, chapter, verse, first slot, last slot)
+    for file in sorted(Path(json_dir).joinpath('morphology').glob('*.json')):
+        with open(file, encoding='UTF8') as infile:
+            book_data = json.load(infile)
+        for ref, *verse_words in book_data:
+            if not verse_words:
+                continue
+            book, chapter_verse = ref.split(' ', 1)
+            chapter, verse = (chapter_verse.split(':') + ['0'])[:2]
+            first = len(words) + 1
+            words.extend(verse_words)
+            verses.append((book, int(chapter), int(verse or 0), first, len(words)))
+
+    # the books and chapters are runs of consecutive verses
+    runs = {'book': [], 'chapter': [], 'verse': []}
+    for book, chapter, verse, first, last in verses:
+        for node_type, key in (('book', (book,)), ('chapter', (book, chapter)), ('verse', None)):
+            run = runs[node_type]
+            if key is not None and run and run[-1][0] == key:
+                run[-1][2] = last
+            else:
+                run.append([key, first, last])
+
+    sections = []
+    features = {name: {} for name, value_type, description in section_features}
+    node = len(words)
+    verse_info = iter(verses)
+    for node_type in node_types:
+        for key, first, last in runs[node_type]:
+            node += 1
+            sections.append((node_type, first, last))
+            if node_type == 'book':
+                features['book'][node] = key[0]
+            elif node_type == 'chapter':
+                features['chapter'][node] = key[1]
+            else:
+                features['verse'][node] = next(verse_info)[2]
+    return words, sections, features
+
+def export_tf(json_dir='JSON', output_dir='TF', silent=False):
+    """Export the morphology as Text-Fabric features.
+
+    Args:
+        json_dir: directory of the JSON exports
+        output_dir: directory to write the .tf files to
+        silent: boolean, False if you want to print status updates
+    """
+
+    def report(msg):
+        if not silent:
+            print(msg)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    words, sections, section_values = build_nodes(json_dir)
+    max_slot = len(words)
+    report(f'{max_slot} words and {len(sections)} section nodes')
+
+    common = {
+        'writtenBy': 'CATSS_parsers',
+        'dateWritten': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    # otype gives the types of node ranges
+    otype = [f'1-{max_slot}\tword']
+    node = max_slot
+    for node_type in node_types:
+        n = sum(1 for t, first, last in sections if t == node_type)
+        if n:
+            otype.append(f'{node + 1}-{node + n}\t{node_type}')
+            node += n
+    write_tf(output_dir.joinpath('otype.tf'), 'node', {'valueType': 'str', **common}, otype)
+
+    # oslots gives the slots of the nodes after the slots, in order
+    oslots = [spec(first, last) for t, first, last in sections]
+    write_tf(output_dir.joinpath('oslots.tf'), 'edge', {'valueType': 'str', **common}, oslots)
+
+    for name, value_type, description in word_features:
+        values = {i: word[name] for i, word in enumerate(words, 1) if word.get(name)}
+        metadata = {'valueType': value_type, 'description': description, **common}
+        write_tf(output_dir.joinpath(f'{name}.tf'), 'node', metadata, node_lines(values))
+        report(f'\twrote {name}.tf')
+
+    for name, value_type, description in section_features:
+        metadata = {'valueType': value_type, 'description': description, **common}
+        write_tf(output_dir.joinpath(f'{name}.tf'), 'node', metadata, node_lines(section_values[name]))
+
+    otext = {
+        'sectionTypes': ','.join(node_types),
+        'sectionFeatures': ','.join(name for name, value_type, description in section_features),
+        'fmt:text-orig-full': '{utf8} ',
+        'fmt:text-trans-full': '{trans} ',
+        **common,
+    }
+    write_tf(output_dir.joinpath('otext.tf'), 'config', otext, [])
+    report(f'DONE, features written to {output_dir}')
+
+def read_tf(path):
+    """Return the metadata and the data lines of a .tf file."""
+    metadata = {}
+    with open(path, encoding='UTF8') as infile:
+        lines = infile.read().split('\n')
+    i = 0
+    while i < len(lines) and lines[i].startswith('@'):
+        key, _, value = lines[i][1:].partition('=')
+        metadata[key] = value
+        i += 1
+    # the blank line after the metadata, and the final newline
+    data = lines[i+1:]
+    if data and data[-1] == '':
+        data.pop()
+    return metadata, data
+
+def parse_spec(node_spec):
+    """Return the nodes of a spec like 12, 12-57 or 3,5-7."""
+    nodes = []
+    for part in node_spec.split(','):
+        start, _, end = part.partition('-')
+        nodes.extend(range(int(start), int(end or start) + 1))
+    return nodes
+
+def load_feature(tf_dir, name):
+    """Read a single node feature into a dict of node to value."""
+    metadata, lines = read_tf(Path(tf_dir).joinpath(f'{name}.tf'))
+    convert = int if metadata.get('valueType') == 'int' else unescape
+    values = {}
+    node = 0
+    for line in lines:
+        node_spec, tab, value = line.partition('\t') if '\t' in line else ('', '', line)
+        nodes = parse_spec(node_spec) if node_spec else [node + 1]
+        value = convert(value)
+        for node in nodes:
+            values[node] = value
+    return values
+
+def load_otype(tf_dir):
+    """Read otype into a list of (first node, last node, type)."""
+    ranges = []
+    for line in read_tf(Path(tf_dir).joinpath('otype.tf'))[1]:
+        node_spec, node_type = line.split('\t')
+        first, _, last = node_spec.partition('-')
+        ranges.append((int(first), int(last or first), node_type))
+    return ranges
+
+def load_oslots(tf_dir):
+    """Read oslots into a dict of node to its list of slots."""
+    max_slot = max(last for first, last, node_type in load_otype(tf_dir) if node_type == 'word')
+    lines = read_tf(Path(tf_dir).joinpath('oslots.tf'))[1]
+    return {max_slot + i: parse_spec(line) for i, line in enumerate(lines, 1)}
@@ -0,0 +1,102 @@
+# convert CCAT transcriptions of Hebrew and Greek to UTF8
+
+import regex
+import functools
+import unicodedata
+from beta_code import beta2unicode
+
+# CCAT transcription to UTF8
+# Greek is handled by beta_code
+
+# Hebrew
+trans2utf8 = {
+    ')': 'א',
+    'B': 'ב',
+    'G': 'ג',
+    'D': 'ד',
+    'H': 'ה',
+    'W': 'ו',
+    'Z': 'ז',
+    'X': 'ח',
+    '+': 'ט',
+    'Y': 'י',
+    'K': 'כ',
+    'L': 'ל',
+    'M': 'מ',
+    'N': 'נ',
+    'S': 'ס',
+    '(': 'ע',
+    'P': 'פ',
+    'C': 'צ',
+    'Q': 'ק',
+    'R': 'ר',
+    '&': 'שׂ',
+    '$': 'שׁ',
+    'T': 'ת',
+    '-': '־',
+    '\\': '',
+    ' ': ' ',
+}
+
+final_letter = r'{}(?=\s|$)'
+final_heb = (
+    (final_letter.format('\u05DE'), 'ם'),
+    (final_letter.format('\u05DB'), 'ך'),
+    (final_letter.format('\u05E0'), 'ן'),
+    (final_letter.format('\u05E4'), 'ף'),
+    (final_letter.format('\u05E6'), 'ץ'),
+)
+final_heb = [(regex.compile(patt), repl) for patt,repl in final_heb]
+
+def sub_final(string, re_set):
+    """Substitute final letters in Hebrew"""
+    for patt, repl in re_set:
+        string = patt.sub(repl, string)
+    return string
+
+def utf8_hebrew(string):
+    """Convert transcribed Hebrew to UTF8"""
+    utf8_string = ''
+    for c in string:
+        utf8_string += trans2utf8.get(c, '')
+    utf8_string = sub_final(utf8_string, final_heb)
+    return utf8_string
+
+def utf8_greek(string):
+    """Convert transcribed Greek to UTF8, including primes and final sigma"""
+    return beta2unicode(string)
+
+# Search keys
+# folding removes the distinctions which users don't type when searching
+
+# final forms and shin / sin dots of Hebrew
+fold_heb = str.maketrans({
+    'ם': 'מ',
+    'ך': 'כ',
+    'ן': 'נ',
+    'ף': 'פ',
+    'ץ': 'צ',
+    '\u05C1': None, # shin dot
+    '\u05C2': None, # sin dot
+})
+
+# diacritics of Beta Code
+fold_beta_marks = str.maketrans('', '', ')(/\\=+|*')
+
+@functools.lru_cache(maxsize=None)
+def fold_greek(string):
+    """Fold UTF8 Greek to its search key: lower case without accents,
+    breathings, diaeresis or iota subscript, and with final sigma as σ"""
+    decomposed = unicodedata.normalize('NFD', string)
+    stripped = ''.join(c for c in decomposed if unicodedata.category(c) != 'Mn')
+    return unicodedata.normalize('NFC', stripped.lower().replace('ς', 'σ'))
+
+@functools.lru_cache(maxsize=None)
+def fold_hebrew(string):
+    """Fold UTF8 Hebrew to its search key: without final letters or shin / sin dots"""
+    return string.translate(fold_heb)
+
+@functools.lru_cache(maxsize=None)
+def fold_beta(string):
+    """Fold Beta Code, e.g. of lexemes, to its search key: without diacritics"""
+    return string.translate(fold_beta_marks)